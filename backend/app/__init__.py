@@ -8,6 +8,7 @@ import time
 import os
 from .config import Config
 from .extensions import db, socketio, cors, migrate
+from .utils.json_codec import PacketJSON
 try:
     from .config_modules.logging_config import LoggingConfig
 except ImportError:
@@ -215,7 +216,8 @@ def create_app(config_class=Config):
         max_http_buffer_size=socketio_config['max_http_buffer_size'],
         always_connect=socketio_config['always_connect'],
         allow_upgrades=socketio_config['allow_upgrades'],
-        transports=socketio_config['transports']
+        transports=socketio_config['transports'],
+        json=PacketJSON
     )
     
     # Add custom error handler for transport errors
@@ -1,6 +1,7 @@
 import os
 import logging
 from dotenv import load_dotenv
+from app.utils import json_codec
 
 load_dotenv()
 
@@ -8,6 +9,11 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # JSON columns (canvas object properties) encode/decode through the fast codec
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'json_serializer': json_codec.dumps,
+        'json_deserializer': json_codec.loads,
+    }
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
     # Firebase Configuration
@@ -1,6 +1,6 @@
-import uuid
 from datetime import datetime, timedelta
 from app.extensions import db
+from app.utils.ids import generate_uuid
 
 class AIJob(db.Model):
     """Model for tracking AI background jobs using PostgreSQL."""
@@ -8,7 +8,7 @@ class AIJob(db.Model):
     __tablename__ = 'ai_jobs'
     
     # Primary key
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     
     # Foreign keys (commented out for now to avoid table dependency issues)
     user_id = db.Column(db.String(36), nullable=False)  # db.ForeignKey('user.id')
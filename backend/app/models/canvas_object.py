@@ -1,5 +1,7 @@
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
 from app.extensions import db
+from app.utils import json_codec
 import json
 
 class CanvasObject(db.Model):
@@ -8,7 +10,7 @@ class CanvasObject(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     canvas_id = db.Column(db.String(36), db.ForeignKey('canvases.id'), nullable=False)
     object_type = db.Column(db.String(50), nullable=False)  # 'rectangle', 'circle', 'text'
-    properties = db.Column(db.Text, nullable=False)  # JSON string
+    properties = db.Column(db.JSON().with_variant(JSONB, 'postgresql'), nullable=False)  # JSONB on Postgres
     z_index = db.Column(db.Integer, default=0, nullable=False)  # Z-index for layering
     created_by = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -22,14 +24,17 @@ class CanvasObject(db.Model):
     
     def get_properties(self):
         """Get properties as a dictionary."""
+        if isinstance(self.properties, dict):
+            return self.properties
+        # Rows written before the JSONB migration may still hold a JSON string
         try:
-            return json.loads(self.properties)
+            return json_codec.loads(self.properties)
         except (json.JSONDecodeError, TypeError):
             return {}
     
     def set_properties(self, properties_dict):
         """Set properties from a dictionary."""
-        self.properties = json.dumps(properties_dict)
+        self.properties = properties_dict
     
     def to_dict(self):
         return {
@@ -3,7 +3,7 @@ from flask_cors import cross_origin
 from datetime import datetime, timezone
 import os
 from marshmallow import ValidationError
-from app.services.ai_agent_service import AIAgentService
+from app.services.ai_agent_service import AIAgentService, get_ai_agent_service
 from app.services.ai_agent_simple import SimpleAIAgentService
 from app.services.auth_service import require_auth
 from app.services.prompt_service import PromptService
@@ -21,6 +21,10 @@ from app.utils.logger import SmartLogger
 ai_agent_bp = Blueprint('ai_agent', __name__, url_prefix='/api/ai-agent')
 logger = SmartLogger('ai_agent_routes', 'WARNING')
 
+# Stateless services, shared by every request
+job_service = AIJobService()
+prompt_service = PromptService()
+
 @ai_agent_bp.route('/create-canvas', methods=['POST', 'OPTIONS'])
 @cross_origin(origins=['*'], supports_credentials=True)
 @require_auth
@@ -57,6 +61,11 @@ def create_canvas_with_ai(current_user):
               enum: [pastel, vibrant, monochrome, default]
               default: default
               description: Color scheme for the canvas
+            quality:
+              type: string
+              enum: [fast, high]
+              default: fast
+              description: Model tier; high uses the slower, more capable model
             canvas_id:
               type: string
               description: Optional existing canvas ID to add objects to
@@ -91,7 +100,6 @@ def create_canvas_with_ai(current_user):
         data = schema.load(request.json)
         
         # Create background job
-        job_service = AIJobService()
         job_id = job_service.create_canvas_job(
             user_id=current_user.id,
             request_data=data,
@@ -137,50 +145,54 @@ def create_canvas_with_ai(current_user):
 def _create_emergency_canvas(data, current_user):
         """Emergency fallback when all AI services fail."""
         try:
-            import uuid
             from app.models.canvas import Canvas
             from app.models.canvas_object import CanvasObject
             from app.extensions import db
+            from app.utils.ids import generate_uuids
             
             # Create a simple canvas with basic objects
-            canvas = Canvas(
-                id=str(uuid.uuid4()),
-                title=f"Canvas: {data['instructions'][:50]}...",
-                owner_id=current_user.id,
-                is_public=False
-            )
-            db.session.add(canvas)
-            db.session.commit()
+            canvas_id, object_id = generate_uuids(2)
+            title = f"Canvas: {data['instructions'][:50]}..."
+            properties = {
+                'fill': '#3B82F6',
+                'stroke': '#1E40AF',
+                'text': 'Canvas Object',
+                'fontSize': 14,
+                'x': 100,
+                'y': 100,
+                'width': 200,
+                'height': 100
+            }
             
-            # Create a simple rectangle object
-            canvas_object = CanvasObject(
-                id=str(uuid.uuid4()),
-                canvas_id=canvas.id,
-                object_type='rectangle',
-                properties=json.dumps({
-                    'fill': '#3B82F6',
-                    'stroke': '#1E40AF',
-                    'text': 'Canvas Object',
-                    'fontSize': 14,
-                    'x': 100,
-                    'y': 100,
-                    'width': 200,
-                    'height': 100
-                }),
-                created_by=current_user.id
-            )
-            db.session.add(canvas_object)
+            # One commit; the flush inserts the canvas before its object
+            db.session.add_all([
+                Canvas(
+                    id=canvas_id,
+                    title=title,
+                    owner_id=current_user.id,
+                    is_public=False
+                ),
+                CanvasObject(
+                    id=object_id,
+                    canvas_id=canvas_id,
+                    object_type='rectangle',
+                    properties=properties,
+                    created_by=current_user.id
+                )
+            ])
             db.session.commit()
             
+            # Built from local values; reading the committed (expired) instances
+            # would cost a SELECT each
             return jsonify({
                 'success': True,
                 'canvas': {
-                    'id': canvas.id,
-                    'title': canvas.title,
+                    'id': canvas_id,
+                    'title': title,
                     'objects': [{
-                        'id': canvas_object.id,
-                        'type': canvas_object.object_type,
-                        'properties': json.loads(canvas_object.properties)
+                        'id': object_id,
+                        'type': 'rectangle',
+                        'properties': properties
                     }]
                 },
                 'message': 'Canvas created with emergency fallback (AI services unavailable)'
@@ -201,7 +213,6 @@ def _create_emergency_canvas(data, current_user):
 def get_job_status(current_user, job_id):
     """Get status of AI job."""
     try:
-        job_service = AIJobService()
         job = job_service.get_job(job_id, current_user.id)
         
         if not job:
@@ -222,7 +233,6 @@ def get_job_status(current_user, job_id):
 def get_job_result(current_user, job_id):
     """Get result of completed AI job."""
     try:
-        job_service = AIJobService()
         job = job_service.get_job(job_id, current_user.id)
         
         if not job:
@@ -246,7 +256,6 @@ def get_job_result(current_user, job_id):
 def cancel_job(current_user, job_id):
     """Cancel an AI job."""
     try:
-        job_service = AIJobService()
         success = job_service.cancel_job(job_id, current_user.id)
         
         if not success:
@@ -267,7 +276,6 @@ def cancel_job(current_user, job_id):
 def retry_job(current_user, job_id):
     """Retry a failed AI job."""
     try:
-        job_service = AIJobService()
         success = job_service.retry_failed_job(job_id, current_user.id)
         
         if not success:
@@ -312,7 +320,6 @@ def get_user_jobs(current_user):
 def get_job_statistics(current_user):
     """Get job processing statistics."""
     try:
-        job_service = AIJobService()
         stats = job_service.get_job_statistics()
         
         return jsonify({
@@ -408,7 +415,7 @@ def list_available_models(current_user):
         description: Internal server error
     """
     try:
-        ai_service = AIAgentService()
+        ai_service = get_ai_agent_service()
         models = ai_service.openai_client.models.list()
         
         # Filter for chat completion models
@@ -425,7 +432,7 @@ def list_available_models(current_user):
         return jsonify({
             'success': True,
             'models': chat_models,
-            'current_model': os.environ.get('OPENAI_MODEL', 'gpt-4')
+            'current_model': os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
         }), 200
         
     except Exception as e:
@@ -477,7 +484,7 @@ def get_performance_metrics(current_user):
         description: Internal server error
     """
     try:
-        ai_service = AIAgentService()
+        ai_service = get_ai_agent_service()
         metrics = ai_service.performance_service.get_performance_metrics()
         
         return jsonify({
@@ -530,7 +537,7 @@ def get_security_metrics(current_user):
         description: Internal server error
     """
     try:
-        ai_service = AIAgentService()
+        ai_service = get_ai_agent_service()
         security_metrics = ai_service.security_service.get_security_metrics()
         
         return jsonify({
@@ -583,7 +590,6 @@ def get_user_prompts(current_user):
         description: Internal server error
     """
     try:
-        prompt_service = PromptService()
         
         # Get query parameters
         limit = min(int(request.args.get('limit', 50)), 100)
@@ -640,7 +646,6 @@ def get_prompt_by_id(current_user, prompt_id):
         description: Internal server error
     """
     try:
-        prompt_service = PromptService()
         prompt = prompt_service.get_prompt_with_canvases(prompt_id)
         
         if not prompt:
@@ -709,7 +714,6 @@ def delete_prompt(current_user, prompt_id):
         description: Internal server error
     """
     try:
-        prompt_service = PromptService()
         prompt = prompt_service.get_prompt_by_id(prompt_id)
         
         if not prompt:
@@ -769,7 +773,6 @@ def get_prompt_stats(current_user):
         description: Internal server error
     """
     try:
-        prompt_service = PromptService()
         stats = prompt_service.get_prompts_stats(current_user.id)
 
         return jsonify({
@@ -823,7 +826,7 @@ def debug_environment():
         api_key_length = len(api_key) if api_key else 0
 
         # Check model configuration
-        model = os.environ.get('OPENAI_MODEL', 'gpt-4')
+        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
 
         # Check Flask environment
         flask_env = os.environ.get('FLASK_ENV', 'production')
@@ -7,7 +7,6 @@ from app.schemas.validation_schemas import CanvasObjectSchema
 from app.middleware.rate_limiting import object_rate_limit
 from app.utils.validators import ValidationError
 from app.services.sanitization_service import SanitizationService
-import json
 
 objects_bp = Blueprint('objects', __name__)
 canvas_service = CanvasService()
@@ -164,13 +163,10 @@ def create_object(current_user):
         # Sanitize object properties
         sanitized_properties = SanitizationService.sanitize_object_properties(validated_properties)
         
-        # Convert properties to JSON string
-        properties_json = json.dumps(sanitized_properties)
-        
         canvas_object = canvas_service.create_canvas_object(
             canvas_id=canvas_id,
             object_type=object_type,
-            properties=properties_json,
+            properties=sanitized_properties,
             created_by=current_user.id,
             z_index_behavior=z_index_behavior
         )
@@ -262,8 +258,7 @@ def update_object(current_user, object_id):
                 )
                 # Sanitize object properties
                 sanitized_properties = SanitizationService.sanitize_object_properties(validated_properties)
-                # Convert properties to JSON string
-                data['properties'] = json.dumps(sanitized_properties)
+                data['properties'] = sanitized_properties
             except ValidationError as e:
                 return jsonify({'error': f'Invalid object properties: {str(e)}'}), 400
         
@@ -18,6 +18,11 @@ class CanvasCreationRequestSchema(Schema):
         validate=validate.OneOf(['pastel', 'vibrant', 'monochrome', 'default']),
         error_messages={'validator_failed': 'Invalid color scheme option'}
     )
+    quality = fields.Str(
+        load_default='fast',
+        validate=validate.OneOf(['fast', 'high']),
+        error_messages={'validator_failed': 'Invalid quality option'}
+    )
     canvas_id = fields.Str(
         load_default=None,
         validate=validate.Length(min=1, max=100),
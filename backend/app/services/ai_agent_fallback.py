@@ -4,20 +4,103 @@ Provides a completely fallback implementation that doesn't rely on OpenAI
 when all other AI services fail.
 """
 
-import json
-import uuid
-from typing import Dict, List, Any, Optional
+import functools
+import re
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import insert
 from app.models.canvas_object import CanvasObject
 from app.models.canvas import Canvas
 from app.utils.logger import SmartLogger
 from app.extensions import db
+from app.utils.ids import generate_uuids
+
+logger = SmartLogger('fallback_ai_agent_service', 'WARNING')
+
+# Template objects are written once; insert them with a single Core statement
+_INSERT_CANVAS_OBJECT = insert(CanvasObject.__table__)
+
+
+# Template categories in priority order, with the keywords that select them.
+_FALLBACK_CATEGORIES = (
+    ('flowchart', ('flowchart', 'flow', 'process', 'workflow', 'diagram')),
+    ('mindmap', ('mindmap', 'mind map', 'brainstorm', 'ideas')),
+    ('wireframe', ('wireframe', 'layout', 'mockup', 'design')),
+    ('chart', ('chart', 'graph', 'data', 'analytics')),
+    ('calendar', ('calendar', 'schedule', 'timeline', 'events')),
+)
+
+# One anchored alternation of lookaheads: the regex engine tries the categories
+# in priority order and ``lastgroup`` names the first one with a keyword hit.
+_CATEGORY_RE = re.compile(
+    '|'.join(
+        f"(?P<{name}>(?=.*?(?:{'|'.join(map(re.escape, keywords))})))"
+        for name, keywords in _FALLBACK_CATEGORIES
+    ),
+    re.IGNORECASE | re.DOTALL
+)
+
+_COLOR_SCHEMES = {
+    'pastel': {
+        'primary': '#A8E6CF',
+        'primary_dark': '#7FCDCD',
+        'secondary': '#FFD3A5',
+        'secondary_dark': '#FD9853',
+        'accent': '#FFA8B6',
+        'accent_dark': '#FF6B9D',
+        'neutral': '#E8E8E8',
+        'neutral_dark': '#B8B8B8',
+        'light': '#F8F8F8',
+        'text': '#4A4A4A'
+    },
+    'vibrant': {
+        'primary': '#FF6B6B',
+        'primary_dark': '#E55353',
+        'secondary': '#4ECDC4',
+        'secondary_dark': '#45B7B8',
+        'accent': '#45B7D1',
+        'accent_dark': '#3A9BC1',
+        'neutral': '#96CEB4',
+        'neutral_dark': '#7FB069',
+        'light': '#FFEAA7',
+        'text': '#2D3436'
+    },
+    'monochrome': {
+        'primary': '#636E72',
+        'primary_dark': '#2D3436',
+        'secondary': '#74B9FF',
+        'secondary_dark': '#0984E3',
+        'accent': '#A29BFE',
+        'accent_dark': '#6C5CE7',
+        'neutral': '#DDD6FE',
+        'neutral_dark': '#A29BFE',
+        'light': '#F8F9FA',
+        'text': '#2D3436'
+    },
+    'default': {
+        'primary': '#3B82F6',
+        'primary_dark': '#1E40AF',
+        'secondary': '#10B981',
+        'secondary_dark': '#059669',
+        'accent': '#F59E0B',
+        'accent_dark': '#D97706',
+        'neutral': '#6B7280',
+        'neutral_dark': '#374151',
+        'light': '#F3F4F6',
+        'text': '#111827'
+    }
+}
+
+
+def _color_palette(color_scheme: str) -> Dict[str, str]:
+    """Return the palette for a color scheme, defaulting to the default palette."""
+    return _COLOR_SCHEMES.get(color_scheme, _COLOR_SCHEMES['default'])
 
 
 class FallbackAIAgentService:
     """Fallback service that creates canvas objects without AI when all else fails."""
     
     def __init__(self):
-        self.logger = SmartLogger('fallback_ai_agent_service', 'WARNING')
+        self.logger = logger
         self.logger.log_info("Fallback AI Agent Service initialized - no OpenAI dependency")
     
     def create_canvas_from_query(
@@ -44,61 +127,74 @@ class FallbackAIAgentService:
         try:
             self.logger.log_info(f"Creating fallback canvas for user {user_id} with query: {query[:100]}...")
             
-            # Validate input parameters
-            if not query or not query.strip():
+            # Validate input parameters, stripping and truncating the query once
+            sanitized_query = query.strip()[:500] if query else ''
+            if not sanitized_query:
                 raise ValueError("Query cannot be empty")
-            if not user_id or not user_id.strip():
+            if not user_id or user_id.isspace():
                 raise ValueError("User ID cannot be empty")
             
-            # Sanitize query
-            sanitized_query = query.strip()[:500]
-            
-            # Create or get canvas
+            # Get existing canvas
+            canvas = None
             if canvas_id:
                 canvas = Canvas.query.get(canvas_id)
                 if not canvas:
                     raise ValueError("Canvas not found")
-            else:
+            
+            # Generate fallback objects based on query keywords
+            objects_data = self._generate_fallback_objects(sanitized_query, style, color_scheme)
+            
+            # One urandom read covers the canvas and every object id
+            canvas_uuid, *object_ids = generate_uuids(len(objects_data) + 1)
+            
+            # Build the canvas if one wasn't given; it's written together with its objects below
+            new_canvas = canvas is None
+            if new_canvas:
                 canvas = Canvas(
-                    id=str(uuid.uuid4()),
+                    id=canvas_uuid,
                     title=f"Canvas: {sanitized_query[:50]}...",
-                    user_id=user_id,
+                    owner_id=user_id,
                     is_public=False
                 )
-                db.session.add(canvas)
-                db.session.commit()
-            
-            # Generate fallback objects based on query keywords
-            objects_data = self._generate_fallback_objects(sanitized_query, style, color_scheme)
             
-            # Create canvas objects
+            # Build the object rows and the response from the same in-memory data,
+            # so nothing is re-read or re-parsed after commit
+            canvas_id = canvas.id
+            canvas_title = canvas.title
+            object_rows = []
             created_objects = []
-            for obj_data in objects_data:
-                canvas_object = CanvasObject(
-                    id=str(uuid.uuid4()),
-                    canvas_id=canvas.id,
-                    object_type=obj_data.get('type', 'rectangle'),
-                    properties=json.dumps(obj_data.get('properties', {})),
-                    created_by=user_id
-                )
-                db.session.add(canvas_object)
-                created_objects.append(canvas_object)
+            for object_id, obj_data in zip(object_ids, objects_data):
+                object_type = obj_data.get('type', 'rectangle')
+                properties = obj_data.get('properties', {})
+                object_rows.append({
+                    'id': object_id,
+                    'canvas_id': canvas_id,
+                    'object_type': object_type,
+                    'properties': properties,
+                    'created_by': user_id
+                })
+                created_objects.append({
+                    'id': object_id,
+                    'type': object_type,
+                    'properties': properties
+                })
             
+            # Canvas and objects share one SAVEPOINT and a single commit, so a failed
+            # insert can't leave an empty canvas behind
+            with db.session.begin_nested():
+                if new_canvas:
+                    db.session.add(canvas)
+                    db.session.flush()
+                if object_rows:
+                    db.session.execute(_INSERT_CANVAS_OBJECT, object_rows)
             db.session.commit()
             
             # Prepare response
             result = {
                 'success': True,
-                'canvas_id': canvas.id,
-                'title': canvas.title,
-                'objects': [
-                    {
-                        'id': obj.id,
-                        'type': obj.object_type,
-                        'properties': json.loads(obj.properties) if obj.properties else {}
-                    }
-                    for obj in created_objects
-                ],
+                'canvas_id': canvas_id,
+                'title': canvas_title,
+                'objects': created_objects,
                 'message': f"Created {len(created_objects)} objects using fallback templates"
             }
             
@@ -112,27 +208,24 @@ class FallbackAIAgentService:
     
     def _generate_fallback_objects(self, query: str, style: str, color_scheme: str) -> List[Dict[str, Any]]:
         """Generate fallback objects based on query keywords."""
-        query_lower = query.lower()
-        
-        # Determine object type based on keywords
-        if any(keyword in query_lower for keyword in ['flowchart', 'flow', 'process', 'workflow', 'diagram']):
-            return self._create_flowchart_objects(style, color_scheme)
-        elif any(keyword in query_lower for keyword in ['mindmap', 'mind map', 'brainstorm', 'ideas']):
-            return self._create_mindmap_objects(style, color_scheme)
-        elif any(keyword in query_lower for keyword in ['wireframe', 'layout', 'mockup', 'design']):
-            return self._create_wireframe_objects(style, color_scheme)
-        elif any(keyword in query_lower for keyword in ['chart', 'graph', 'data', 'analytics']):
-            return self._create_chart_objects(style, color_scheme)
-        elif any(keyword in query_lower for keyword in ['calendar', 'schedule', 'timeline', 'events']):
-            return self._create_calendar_objects(style, color_scheme)
-        else:
-            return self._create_generic_objects(query, style, color_scheme)
+        match = _CATEGORY_RE.match(query)
+        if match:
+            # Keyword templates are memoized per (style, color_scheme); hand out
+            # copies so callers can't mutate the cached dicts.
+            builder = getattr(self, f'_create_{match.lastgroup}_objects')
+            return [
+                {**obj, 'properties': dict(obj['properties'])}
+                for obj in builder(style, color_scheme)
+            ]
+        return self._create_generic_objects(query, style, color_scheme)
     
-    def _create_flowchart_objects(self, style: str, color_scheme: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _create_flowchart_objects(style: str, color_scheme: str) -> Tuple[Dict[str, Any], ...]:
         """Create flowchart objects."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
-        return [
+        return (
             {
                 'type': 'rectangle',
                 'x': 200,
@@ -175,13 +268,15 @@ class FallbackAIAgentService:
                     'fontFamily': 'Arial'
                 }
             }
-        ]
+        )
     
-    def _create_mindmap_objects(self, style: str, color_scheme: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _create_mindmap_objects(style: str, color_scheme: str) -> Tuple[Dict[str, Any], ...]:
         """Create mindmap objects."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
-        return [
+        return (
             {
                 'type': 'circle',
                 'x': 300,
@@ -238,13 +333,15 @@ class FallbackAIAgentService:
                     'fontFamily': 'Arial'
                 }
             }
-        ]
+        )
     
-    def _create_wireframe_objects(self, style: str, color_scheme: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _create_wireframe_objects(style: str, color_scheme: str) -> Tuple[Dict[str, Any], ...]:
         """Create wireframe objects."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
-        return [
+        return (
             {
                 'type': 'rectangle',
                 'x': 50,
@@ -287,13 +384,15 @@ class FallbackAIAgentService:
                     'fontFamily': 'Arial'
                 }
             }
-        ]
+        )
     
-    def _create_chart_objects(self, style: str, color_scheme: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _create_chart_objects(style: str, color_scheme: str) -> Tuple[Dict[str, Any], ...]:
         """Create chart objects."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
-        return [
+        return (
             {
                 'type': 'rectangle',
                 'x': 100,
@@ -321,13 +420,15 @@ class FallbackAIAgentService:
                     'fontFamily': 'Arial'
                 }
             }
-        ]
+        )
     
-    def _create_calendar_objects(self, style: str, color_scheme: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _create_calendar_objects(style: str, color_scheme: str) -> Tuple[Dict[str, Any], ...]:
         """Create calendar objects."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
-        return [
+        return (
             {
                 'type': 'rectangle',
                 'x': 100,
@@ -355,11 +456,11 @@ class FallbackAIAgentService:
                     'fontFamily': 'Arial'
                 }
             }
-        ]
+        )
     
     def _create_generic_objects(self, query: str, style: str, color_scheme: str) -> List[Dict[str, Any]]:
         """Create generic objects for any query."""
-        colors = self._get_color_scheme(color_scheme)
+        colors = _color_palette(color_scheme)
         
         return [
             {
@@ -393,55 +494,4 @@ class FallbackAIAgentService:
     
     def _get_color_scheme(self, color_scheme: str) -> Dict[str, str]:
         """Get color scheme based on preference."""
-        schemes = {
-            'pastel': {
-                'primary': '#A8E6CF',
-                'primary_dark': '#7FCDCD',
-                'secondary': '#FFD3A5',
-                'secondary_dark': '#FD9853',
-                'accent': '#FFA8B6',
-                'accent_dark': '#FF6B9D',
-                'neutral': '#E8E8E8',
-                'neutral_dark': '#B8B8B8',
-                'light': '#F8F8F8',
-                'text': '#4A4A4A'
-            },
-            'vibrant': {
-                'primary': '#FF6B6B',
-                'primary_dark': '#E55353',
-                'secondary': '#4ECDC4',
-                'secondary_dark': '#45B7B8',
-                'accent': '#45B7D1',
-                'accent_dark': '#3A9BC1',
-                'neutral': '#96CEB4',
-                'neutral_dark': '#7FB069',
-                'light': '#FFEAA7',
-                'text': '#2D3436'
-            },
-            'monochrome': {
-                'primary': '#636E72',
-                'primary_dark': '#2D3436',
-                'secondary': '#74B9FF',
-                'secondary_dark': '#0984E3',
-                'accent': '#A29BFE',
-                'accent_dark': '#6C5CE7',
-                'neutral': '#DDD6FE',
-                'neutral_dark': '#A29BFE',
-                'light': '#F8F9FA',
-                'text': '#2D3436'
-            },
-            'default': {
-                'primary': '#3B82F6',
-                'primary_dark': '#1E40AF',
-                'secondary': '#10B981',
-                'secondary_dark': '#059669',
-                'accent': '#F59E0B',
-                'accent_dark': '#D97706',
-                'neutral': '#6B7280',
-                'neutral_dark': '#374151',
-                'light': '#F3F4F6',
-                'text': '#111827'
-            }
-        }
-        
-        return schemes.get(color_scheme, schemes['default'])
+        return _color_palette(color_scheme)
@@ -4,37 +4,116 @@ This service handles OpenAI client initialization issues and provides fallbacks.
 """
 
 import openai
-import json
 import os
-import uuid
+import threading
+import time
 from typing import Dict, List, Any, Optional
+from sqlalchemy import insert
 from app.models.canvas_object import CanvasObject
 from app.models.canvas import Canvas
 from app.utils.logger import SmartLogger
 from app.extensions import db
+from app.utils.ids import generate_uuids
+from app.utils import json_codec
 from app.services.openai_client_factory import OpenAIClientFactory
 
+# Use WARNING level to reduce log volume on Railway
+logger = SmartLogger('robust_ai_agent_service', 'WARNING')
+
+# Canvas objects are inserted through Core, bypassing the ORM unit of work
+_INSERT_CANVAS_OBJECT = insert(CanvasObject.__table__)
+
+# Environment is fixed for the life of the process; read it once at import
+_IS_DEV = os.environ.get('FLASK_ENV') == 'development'
+_OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+_OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+
+# Completion budget for one canvas: at most 8 objects, each with its nested
+# properties, plus the {"objects": [...]} wrapper
+_MAX_OBJ_TOKENS = 80
+_MAX_TOKENS = 8 * _MAX_OBJ_TOKENS + 40
+
+# Prompt pieces are constant apart from the query/style/colors, so keep them
+# compact (fewer input tokens) and build them once at import time. All static
+# instructions live in the system message and the per-request values come last,
+# so every call shares an identical prefix for server-side prompt caching.
+# JSON mode requires a top-level object, so the objects are wrapped in
+# {"objects": [...]}; the model can no longer add code fences or narrative
+_OBJECT_FORMAT = (
+    'Object: {"type":"rectangle|circle|text|arrow","x":int,"y":int,"width":int,"height":int,'
+    '"properties":{"fill":"#hex","stroke":"#hex","text":"...","fontSize":int}}. No overlap.'
+)
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        'You are a canvas design assistant. Return only valid JSON. ' + _OBJECT_FORMAT +
+        ' Return JSON {"objects":[3-8 objects]} for the requested canvas.'
+    )
+}
+_USER_TEMPLATE = 'Create a canvas for: "{q}"\nStyle:{s} Colors:{c}'
+
+# Batch variant: the per-query arrays are wrapped in {"canvases": [...]} in request order
+_BATCH_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        'You are a canvas design assistant. Return only valid JSON. ' + _OBJECT_FORMAT +
+        ' Create one canvas for each numbered request. Return JSON'
+        ' {"canvases":[[objects for 1],[objects for 2],...]} with one array of 3-8 objects per request, in order.'
+    )
+}
+_BATCH_USER_TEMPLATE = 'Requests:\n{queries}\nStyle:{s} Colors:{c}'
+
+# Shared by the single and batch completions, built once like the messages above
+_RESPONSE_FORMAT = {"type": "json_object"}
+
+
+# Circuit breaker around the OpenAI call: after _BREAKER_THRESHOLD consecutive
+# failures, skip straight to the fallback objects for _BREAKER_COOLDOWN seconds
+# instead of making every request wait out the API timeout
+_BREAKER_THRESHOLD = 3
+_BREAKER_COOLDOWN = 30.0
+_breaker = {'failures': 0, 'opened_at': 0.0}
+_breaker_lock = threading.Lock()
+
+
+def _breaker_is_open() -> bool:
+    """Return True while the breaker is tripped and still cooling down."""
+    return (
+        _breaker['failures'] >= _BREAKER_THRESHOLD
+        and time.monotonic() - _breaker['opened_at'] < _BREAKER_COOLDOWN
+    )
+
+
+def _record_api_result(success: bool) -> None:
+    """Reset the breaker on success, or count the failure and trip it at the threshold."""
+    with _breaker_lock:
+        if success:
+            _breaker['failures'] = 0
+            return
+        _breaker['failures'] += 1
+        if _breaker['failures'] >= _BREAKER_THRESHOLD:
+            _breaker['opened_at'] = time.monotonic()
+
 
 class RobustAIAgentService:
     """Robust service for AI-powered canvas creation with enhanced error handling."""
     
     def __init__(self):
-        # Use WARNING level to reduce log volume on Railway
-        self.logger = SmartLogger('robust_ai_agent_service', 'WARNING')
+        self.logger = logger
         
         # Check OpenAI API key
-        api_key = os.environ.get('OPENAI_API_KEY')
+        api_key = _OPENAI_API_KEY
         if not api_key:
             self.logger.log_error("OPENAI_API_KEY environment variable not set")
             raise ValueError("OpenAI API key is required but not configured")
         
-        # Initialize OpenAI client using factory
-        self.openai_client = OpenAIClientFactory.create_client(api_key)
+        # Reuse the process-wide client and its connection pool
+        self.openai_client = OpenAIClientFactory.get_client(api_key)
         if not self.openai_client:
             raise ValueError("Failed to initialize OpenAI client")
         
         # Only log success in development
-        if os.environ.get('FLASK_ENV') == 'development':
+        if _IS_DEV:
             self.logger.log_info("Robust AI Agent Service initialized successfully")
     
     
@@ -61,32 +140,22 @@ class RobustAIAgentService:
         """
         try:
             # Only log detailed info in development
-            if os.environ.get('FLASK_ENV') == 'development':
+            if _IS_DEV:
                 self.logger.log_info(f"Starting AI canvas creation for user {user_id} with query: {query[:100]}...")
             
-            # Validate input parameters
-            if not query or not query.strip():
+            # Validate input parameters, stripping and truncating the query once
+            sanitized_query = query.strip()[:500] if query else ''
+            if not sanitized_query:
                 raise ValueError("Query cannot be empty")
-            if not user_id or not user_id.strip():
+            if not user_id or user_id.isspace():
                 raise ValueError("User ID cannot be empty")
             
-            # Sanitize query
-            sanitized_query = query.strip()[:500]  # Limit length
-            
-            # Create or get canvas
+            # Get existing canvas
+            canvas = None
             if canvas_id:
                 canvas = Canvas.query.get(canvas_id)
                 if not canvas:
                     raise ValueError("Canvas not found")
-            else:
-                canvas = Canvas(
-                    id=str(uuid.uuid4()),
-                    title=f"AI Generated: {sanitized_query[:50]}...",
-                    user_id=user_id,
-                    is_public=False
-                )
-                db.session.add(canvas)
-                db.session.commit()
             
             # Generate AI response
             ai_response = self._generate_ai_response(sanitized_query, style, color_scheme)
@@ -94,39 +163,62 @@ class RobustAIAgentService:
             # Parse and validate AI response
             objects_data = self._parse_ai_response(ai_response)
             
-            # Create canvas objects
-            created_objects = []
-            for obj_data in objects_data:
-                canvas_object = CanvasObject(
-                    id=str(uuid.uuid4()),
-                    canvas_id=canvas.id,
-                    object_type=obj_data.get('type', 'rectangle'),
-                    properties=json.dumps(obj_data.get('properties', {})),
-                    created_by=user_id
+            # One urandom read covers the canvas and every object id
+            canvas_uuid, *object_ids = generate_uuids(len(objects_data) + 1)
+            
+            # Build the canvas if one wasn't given; it's written together with its objects below
+            new_canvas = canvas is None
+            if new_canvas:
+                canvas = Canvas(
+                    id=canvas_uuid,
+                    title=f"AI Generated: {sanitized_query[:50]}...",
+                    owner_id=user_id,
+                    is_public=False
                 )
-                db.session.add(canvas_object)
-                created_objects.append(canvas_object)
             
+            # Build the object rows and the response from the same in-memory data,
+            # so nothing is re-read or re-parsed after commit
+            canvas_id = canvas.id
+            canvas_title = canvas.title
+            object_rows = []
+            created_objects = []
+            for object_id, obj_data in zip(object_ids, objects_data):
+                object_type = obj_data.get('type', 'rectangle')
+                properties = obj_data.get('properties', {})
+                object_rows.append({
+                    'id': object_id,
+                    'canvas_id': canvas_id,
+                    'object_type': object_type,
+                    'properties': properties,
+                    'created_by': user_id
+                })
+                created_objects.append({
+                    'id': object_id,
+                    'type': object_type,
+                    'properties': properties
+                })
+            
+            # Canvas and objects share one SAVEPOINT and a single commit, so a failed
+            # insert can't leave an empty canvas behind
+            with db.session.begin_nested():
+                if new_canvas:
+                    db.session.add(canvas)
+                    db.session.flush()
+                if object_rows:
+                    db.session.execute(_INSERT_CANVAS_OBJECT, object_rows)
             db.session.commit()
             
             # Prepare response
             result = {
                 'success': True,
-                'canvas_id': canvas.id,
-                'title': canvas.title,
-                'objects': [
-                    {
-                        'id': obj.id,
-                        'type': obj.object_type,
-                        'properties': json.loads(obj.properties) if obj.properties else {}
-                    }
-                    for obj in created_objects
-                ],
+                'canvas_id': canvas_id,
+                'title': canvas_title,
+                'objects': created_objects,
                 'message': f"Successfully created {len(created_objects)} objects for your canvas"
             }
             
             # Only log success in development
-            if os.environ.get('FLASK_ENV') == 'development':
+            if _IS_DEV:
                 self.logger.log_info(f"AI canvas creation completed successfully for user {user_id}")
             
             return result
@@ -136,52 +228,157 @@ class RobustAIAgentService:
             db.session.rollback()
             raise
     
-    def _generate_ai_response(self, query: str, style: str, color_scheme: str) -> str:
-        """Generate AI response for canvas creation."""
+    def create_canvases_from_queries(
+        self,
+        queries: List[str],
+        user_id: str,
+        style: str = "modern",
+        color_scheme: str = "default"
+    ) -> List[Dict[str, Any]]:
+        """
+        Create one new canvas per query with a single OpenAI call.
+        
+        Args:
+            queries: User's natural language descriptions, one per canvas
+            user_id: ID of the user creating the canvases
+            style: Visual style (modern, corporate, creative, minimal)
+            color_scheme: Color scheme (pastel, vibrant, monochrome, default)
+            
+        Returns:
+            List of canvas results in query order, shaped like create_canvas_from_query's
+        """
         try:
-            # Create a focused prompt for canvas object generation
-            prompt = f"""
-            Create a canvas layout based on this request: "{query}"
+            # Validate input parameters
+            if not queries:
+                raise ValueError("Queries cannot be empty")
+            if not user_id or user_id.isspace():
+                raise ValueError("User ID cannot be empty")
+            
+            sanitized_queries = [query.strip()[:500] if query else '' for query in queries]
+            if not all(sanitized_queries):
+                raise ValueError("Query cannot be empty")
             
-            Style: {style}
-            Color scheme: {color_scheme}
+            # One completion for every query; per-query fallback if the batch fails
+            objects_per_query = self._generate_batch_ai_response(sanitized_queries, style, color_scheme)
             
-            Generate 3-8 canvas objects (rectangles, circles, text, arrows) that represent this request.
-            Return ONLY a JSON array of objects with this exact format:
-            [
-                {{
-                    "type": "rectangle|circle|text|arrow",
-                    "x": 100,
-                    "y": 100,
-                    "width": 120,
-                    "height": 60,
-                    "properties": {{
-                        "fill": "#3B82F6",
-                        "stroke": "#1E40AF",
-                        "text": "Label text",
-                        "fontSize": 14
-                    }}
-                }}
-            ]
+            # One urandom read covers every canvas and object id
+            ids = iter(generate_uuids(len(objects_per_query) + sum(map(len, objects_per_query))))
+            
+            canvases = []
+            object_rows = []
+            results = []
+            for sanitized_query, objects_data in zip(sanitized_queries, objects_per_query):
+                canvas_id = next(ids)
+                canvas_title = f"AI Generated: {sanitized_query[:50]}..."
+                canvases.append(Canvas(id=canvas_id, title=canvas_title, owner_id=user_id, is_public=False))
+                
+                created_objects = []
+                for obj_data in objects_data:
+                    object_id = next(ids)
+                    object_type = obj_data.get('type', 'rectangle')
+                    properties = obj_data.get('properties', {})
+                    object_rows.append({
+                        'id': object_id,
+                        'canvas_id': canvas_id,
+                        'object_type': object_type,
+                        'properties': properties,
+                        'created_by': user_id
+                    })
+                    created_objects.append({
+                        'id': object_id,
+                        'type': object_type,
+                        'properties': properties
+                    })
+                
+                results.append({
+                    'success': True,
+                    'canvas_id': canvas_id,
+                    'title': canvas_title,
+                    'objects': created_objects,
+                    'message': f"Successfully created {len(created_objects)} objects for your canvas"
+                })
+            
+            # All canvases and objects share one SAVEPOINT and a single commit
+            with db.session.begin_nested():
+                db.session.add_all(canvases)
+                db.session.flush()
+                if object_rows:
+                    db.session.execute(_INSERT_CANVAS_OBJECT, object_rows)
+            db.session.commit()
             
-            Make sure objects don't overlap and are well-positioned.
-            """
+            if _IS_DEV:
+                self.logger.log_info(f"Batch AI canvas creation completed: {len(results)} canvases for user {user_id}")
+            
+            return results
+            
+        except Exception as e:
+            self.logger.log_error(f"Batch AI canvas creation failed: {str(e)}", e)
+            db.session.rollback()
+            raise
+    
+    def _generate_batch_ai_response(
+        self,
+        queries: List[str],
+        style: str,
+        color_scheme: str
+    ) -> List[List[Dict[str, Any]]]:
+        """Generate cleaned objects for several queries in one JSON-mode completion."""
+        if not _breaker_is_open():
+            numbered = '\n'.join(f'{i}. "{query}"' for i, query in enumerate(queries, 1))
+            try:
+                response = self.openai_client.chat.completions.create(
+                    model=_OPENAI_MODEL,
+                    messages=[
+                        _BATCH_SYSTEM_MSG,
+                        {"role": "user", "content": _BATCH_USER_TEMPLATE.format(queries=numbered, s=style, c=color_scheme)}
+                    ],
+                    response_format=_RESPONSE_FORMAT,
+                    max_tokens=min(4000, _MAX_TOKENS * len(queries)),
+                    temperature=0.7
+                )
+                _record_api_result(True)
+            except Exception as api_error:
+                _record_api_result(False)
+                self.logger.log_error(f"OpenAI batch API call failed: {str(api_error)}")
+            else:
+                try:
+                    canvases = json_codec.loads(response.choices[0].message.content).get('canvases')
+                    if not isinstance(canvases, list) or len(canvases) != len(queries):
+                        raise ValueError("Batch response does not have one canvas per query")
+                    return [
+                        self._clean_objects(objects_data) if isinstance(objects_data, list)
+                        else self._fallback_object_list(query)
+                        for query, objects_data in zip(queries, canvases)
+                    ]
+                except Exception as e:
+                    self.logger.log_error(f"Failed to parse batch AI response: {str(e)}")
+        
+        return [self._fallback_object_list(query) for query in queries]
+    
+    def _generate_ai_response(self, query: str, style: str, color_scheme: str) -> str:
+        """Generate AI response for canvas creation."""
+        try:
+            if _breaker_is_open():
+                return self._get_fallback_objects(query)
             
             # Make API call with error handling
             try:
                 response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
+                    model=_OPENAI_MODEL,
                     messages=[
-                        {"role": "system", "content": "You are a canvas design assistant. Return only valid JSON arrays."},
-                        {"role": "user", "content": prompt}
+                        _SYSTEM_MSG,
+                        {"role": "user", "content": _USER_TEMPLATE.format(q=query, s=style, c=color_scheme)}
                     ],
-                    max_tokens=1000,
+                    response_format=_RESPONSE_FORMAT,
+                    max_tokens=_MAX_TOKENS,
                     temperature=0.7
                 )
+                _record_api_result(True)
                 
                 return response.choices[0].message.content
                 
             except Exception as api_error:
+                _record_api_result(False)
                 self.logger.log_error(f"OpenAI API call failed: {str(api_error)}")
                 # Return fallback objects
                 return self._get_fallback_objects(query)
@@ -193,38 +390,37 @@ class RobustAIAgentService:
     def _parse_ai_response(self, response: str) -> List[Dict[str, Any]]:
         """Parse AI response and extract objects."""
         try:
-            # Clean the response
-            response = response.strip()
-            if response.startswith('```json'):
-                response = response[7:]
-            if response.endswith('```'):
-                response = response[:-3]
-            
-            # Parse JSON
-            objects_data = json.loads(response)
+            # JSON mode guarantees a bare object, so the response is decoded directly
+            data = json_codec.loads(response)
+            objects_data = data.get('objects') if isinstance(data, dict) else None
             
             if not isinstance(objects_data, list):
-                raise ValueError("Response is not a list")
-            
-            # Validate and clean objects
-            validated_objects = []
-            for obj in objects_data:
-                if isinstance(obj, dict) and 'type' in obj:
-                    validated_obj = {
-                        'type': obj.get('type', 'rectangle'),
-                        'x': max(0, min(1000, obj.get('x', 100))),
-                        'y': max(0, min(1000, obj.get('y', 100))),
-                        'width': max(20, min(500, obj.get('width', 120))),
-                        'height': max(20, min(500, obj.get('height', 60))),
-                        'properties': obj.get('properties', {})
-                    }
-                    validated_objects.append(validated_obj)
+                raise ValueError("Response has no objects list")
             
-            return validated_objects[:8]  # Limit to 8 objects
+            return self._clean_objects(objects_data)
             
         except Exception as e:
             self.logger.log_error(f"Failed to parse AI response: {str(e)}")
-            return self._get_fallback_objects("fallback")
+            return self._fallback_object_list("fallback")
+    
+    @staticmethod
+    def _clean_objects(objects_data: List[Any]) -> List[Dict[str, Any]]:
+        """Clamp object geometry and keep at most 8 well-formed objects."""
+        _max, _min = max, min
+        validated_objects = [
+            {
+                'type': obj.get('type', 'rectangle'),
+                'x': _max(0, _min(1000, obj.get('x', 100))),
+                'y': _max(0, _min(1000, obj.get('y', 100))),
+                'width': _max(20, _min(500, obj.get('width', 120))),
+                'height': _max(20, _min(500, obj.get('height', 60))),
+                'properties': obj.get('properties', {})
+            }
+            for obj in objects_data
+            if isinstance(obj, dict) and 'type' in obj
+        ]
+        
+        return validated_objects[:8]  # Limit to 8 objects
     
     def _get_fallback_objects(self, query: str) -> str:
         """Get fallback objects when AI fails."""
@@ -256,4 +452,8 @@ class RobustAIAgentService:
             }
         ]
         
-        return json.dumps(fallback_objects)
+        return json_codec.dumps({"objects": fallback_objects})
+    
+    def _fallback_object_list(self, query: str) -> List[Dict[str, Any]]:
+        """Get the fallback objects as a list."""
+        return json_codec.loads(self._get_fallback_objects(query))['objects']
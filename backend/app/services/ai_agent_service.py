@@ -1,25 +1,472 @@
+import fastjsonschema
+import functools
 import openai
-import json
 import os
+import queue
+import re
 import uuid
-from typing import Dict, List, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
+from sqlalchemy import insert, update
 from app.models.canvas_object import CanvasObject
 from app.models.canvas import Canvas
 from app.utils.logger import SmartLogger
+from app.utils import json_codec
+from app.utils.json_stream import JSONArrayStreamParser
 from app.services.auth_service import AuthService
-from app.services.ai_performance_service import AIPerformanceService
+from app.services.ai_performance_service import AIPerformanceService, prompt_fingerprint, prompt_key
 from app.services.ai_security_service import AISecurityService
 from app.services.prompt_service import PromptService
 from app.services.openai_client_factory import OpenAIClientFactory
 from app.extensions import db, socketio
+from app.utils.ids import generate_uuid, generate_uuids
+from app.utils.cooperative import POLL_INTERVAL, cooperative_sleep
+
+# Use INFO level for visibility during debugging
+logger = SmartLogger('ai_agent_service', 'INFO')
+
+# Objects are write-once, so they skip the ORM unit of work and go through one
+# Core INSERT; reusing the statement keeps its compiled form in SQLAlchemy's cache
+_INSERT_CANVAS_OBJECT = insert(CanvasObject.__table__)
+
+# Runs the embedding and completion calls while the request thread records the
+# prompt; workers never touch the database session
+_GENERATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AI_GENERATION_WORKERS', '16')),
+    thread_name_prefix='ai-generation'
+)
+
+# Fixed for the life of the process; resolved once at import. Requests use the
+# fast model unless they opt into quality="high".
+_OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+_QUALITY_MODEL = os.environ.get('OPENAI_QUALITY_MODEL', 'gpt-4o')
+_MODELS = {'fast': _OPENAI_MODEL, 'high': _QUALITY_MODEL}
+
+# Completion budget sized to the worst-case payload: up to _MAX_OBJECTS objects
+# of roughly _MAX_OBJ_TOKENS each, plus the title and JSON framing
+_MAX_OBJECTS = 12
+_MAX_OBJ_TOKENS = 60
+_MAX_TOKENS = _MAX_OBJECTS * _MAX_OBJ_TOKENS + 80
+
+# The title is a plain JSON string, so it is read from the streamed text
+# without decoding the whole response again
+_TITLE_RE = re.compile(r'"title"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+_STYLE_GUIDES = {
+    "modern": "Clean lines, minimal design, use modern colors like blues and grays",
+    "corporate": "Professional appearance, use corporate colors like navy and white",
+    "creative": "Bold colors, creative shapes, artistic layout",
+    "minimal": "Simple shapes, lots of white space, subtle colors"
+}
+
+_COLOR_GUIDES = {
+    "pastel": "Use soft, pastel colors like light blues, pinks, and greens",
+    "vibrant": "Use bright, energetic colors like oranges, purples, and yellows",
+    "monochrome": "Use shades of gray and black only",
+    "default": "Use a balanced color palette with blues, greens, and grays"
+}
+
+_SYSTEM_INSTRUCTIONS = """
+You are an expert UI/UX designer and diagramming specialist with deep knowledge of visual design principles.
+Your task is to generate a well-structured JSON specification for an interactive canvas.
+
+CANVAS COORDINATE SYSTEM:
+- Origin (0,0) is at the top-left corner
+- X-axis: 0 (left) to 1000 (right)
+- Y-axis: 0 (top) to 1000 (bottom)
+- Canvas center: approximately (500, 400)
+- Keep important content 50px from edges
+
+AVAILABLE OBJECT TYPES:
+
+1. rectangle - Boxes, containers, buttons, panels
+   - Position (x, y) is the top-left corner
+   - Properties: x, y, width, height, fill (interior color), stroke (border color), strokeWidth
+   - Use for: Process steps, UI components, containers, labels
+
+2. circle - Rounded shapes, decision points, avatars
+   - Position (x, y) is the CENTER of the circle
+   - Properties: x, y, radius (NOT width/height), fill, stroke, strokeWidth
+   - Use for: Start/end points, highlights, decorative elements
+
+3. diamond - Decision points, gateways
+   - Position (x, y) is the CENTER
+   - Properties: x, y, width, height, fill, stroke, strokeWidth
+   - Use for: Flowchart decisions, conditional branches
+
+4. star - Highlights, ratings, emphasis
+   - Position (x, y) is the CENTER
+   - Properties: x, y, width, height, fill, stroke, strokeWidth
+
+5. heart - Love, favorites, special markers
+   - Position (x, y) is the CENTER
+   - Properties: x, y, width, height, fill, stroke, strokeWidth
+
+6. text - Labels, headings, descriptions
+   - Position (x, y) is the top-left corner
+   - Properties: x, y, text (string content), fontSize, color
+   - Users can edit text by double-clicking
+   - Keep text concise and readable
+
+7. arrow - Directional connections showing flow/relationships
+   - Position (x, y) is the starting point
+   - Properties: x, y, points [0, 0, endX, endY], stroke, strokeWidth
+   - Points are RELATIVE to (x, y) position
+   - Arrow head appears at the end point
+
+8. line - Separators, non-directional connections
+   - Same as arrow but without arrow head
+   - Properties: x, y, points [0, 0, endX, endY], stroke, strokeWidth
+
+VISUAL DESIGN PRINCIPLES:
+
+Typography & Hierarchy:
+- Titles/headers: fontSize 16-18, bold or emphasized
+- Body text/labels: fontSize 12-14 for readability
+- Small annotations: fontSize 10-12
+
+Colors & Contrast:
+- Use fill for interior color, stroke for borders
+- Provide good contrast: light fills (#E8F4FF, #F0F9FF) with darker strokes (#2563EB, #1E40AF)
+- strokeWidth: 2-3 for emphasis, 1 for subtle borders
+- Text color should contrast with background (dark text on light background)
+
+Spacing & Whitespace:
+- Minimum 30-50px between unrelated objects
+- Consistent spacing between related objects (20-30px)
+- Leave breathing room - don't pack objects tightly
+
+Alignment & Structure:
+- Align objects to implicit grid (use multiples of 10 or 20 for x, y)
+- Align edges of related objects
+- Use consistent sizing for similar objects
+
+LAYOUT PATTERNS:
+
+Flowcharts:
+- Rectangles for process steps (width: 120-180, height: 60-80)
+- Diamonds for decisions (width: 100-120, height: 80-100)
+- Vertical spacing: 80-120px between steps
+- Arrows flowing top-to-bottom or left-to-right
+- Connect arrows to edge midpoints, not corners
+
+Hierarchical Diagrams:
+- Parent objects centered above children
+- 100-150px vertical spacing between levels
+- Horizontal spacing: 120-180px between siblings
+- Top-down tree structure
+
+Timelines:
+- Horizontal sequence with equal spacing (150-200px)
+- Consistent object sizes for uniformity
+- Left-to-right flow
+
+Mind Maps:
+- Central object at canvas center (~500, 400)
+- Branch objects radially with 150-200px distance
+- Use lines/arrows to connect branches to center
+
+CONNECTION BEST PRACTICES:
+- Arrows should be 80-300px in length
+- Connect to object edges/midpoints, not centers (unless intentional)
+- For rectangles: Connect to middle of edges (top, bottom, left, right)
+- Avoid crossing arrows when possible
+- Maintain consistent flow direction
+
+IMPORTANT NOTES:
+- All objects are interactive (draggable, resizable, editable)
+- Users will add more objects later - leave room for expansion
+- Ensure click targets are at least 30x30px
+- Objects can be layered (z-index) for depth
+- Design for clarity and usability
+"""
+
+_RESPONSE_SCHEMA_INSTRUCTIONS = """
+Return a JSON object with this exact structure:
+{
+    "title": "Descriptive title for the canvas",
+    "objects": [
+        {
+            "type": "rectangle|circle|diamond|star|heart|text|arrow|line",
+
+            // Common properties for all types:
+            "x": number (0-1000),
+            "y": number (0-1000),
+
+            // For rectangles, diamonds, stars, hearts:
+            "width": number (30-500),
+            "height": number (30-500),
+
+            // For circles only (use instead of width/height):
+            "radius": number (15-250),
+
+            // For arrows and lines (RELATIVE to x, y):
+            "points": [0, 0, endX, endY],  // e.g., [0, 0, 150, 0] for horizontal line
+
+            // Visual styling:
+            "fill": "hex color code (interior color)",
+            "stroke": "hex color code (border color)",
+            "strokeWidth": number (1-4),
+
+            // For text objects:
+            "text": "string content",
+            "fontSize": number (10-18),
+            "color": "hex color code"
+        }
+    ]
+}
+
+IMPORTANT SCHEMA RULES:
+- Rectangles, diamonds, stars, hearts: MUST have x, y, width, height, fill, stroke, strokeWidth
+- Circles: MUST have x, y, radius, fill, stroke, strokeWidth (NOT width/height)
+- Text: MUST have x, y, text, fontSize, color
+- Arrows/Lines: MUST have x, y, points, stroke, strokeWidth
+
+DESIGN GUIDELINES:
+- Apply visual hierarchy: vary sizes and strokeWidth for emphasis
+- Use consistent alignment: position objects on a grid (multiples of 10 or 20)
+- Provide adequate spacing: minimum 30-50px between unrelated objects
+- Choose harmonious colors: lighter fills with darker strokes for contrast
+- Connect with purpose: arrows should clearly show relationships and flow
+- Consider interactivity: leave room for users to add more content
+- Balance the layout: distribute objects evenly across the canvas
+
+Return ONLY valid JSON in the exact schema specified.
+"""
+
+# Compact form of the instructions above, sent by default: the same rules with
+# the prose, repeated property lists and schema echoes removed, at well under
+# half the tokens. AI_VERBOSE_PROMPT=1 sends the long form instead for A/B checks.
+_COMPACT_SYSTEM_INSTRUCTIONS = """
+You design diagrams as JSON specifications for an interactive canvas.
+
+Canvas: origin (0,0) top-left; x 0-1000 rightward, y 0-1000 downward; center ~(500,400). Keep content 50px from edges.
+
+Object types:
+- rectangle: x,y top-left; width, height, fill, stroke, strokeWidth. Steps, UI parts, containers.
+- circle: x,y center; radius (no width/height), fill, stroke, strokeWidth. Start/end points, highlights.
+- diamond: x,y center; width, height, fill, stroke, strokeWidth. Decisions.
+- star, heart: x,y center; width, height, fill, stroke, strokeWidth. Emphasis, favorites.
+- text: x,y top-left; text, fontSize, color. Keep it concise.
+- arrow: x,y start; points [0,0,endX,endY] relative to x,y; stroke, strokeWidth. Head at the end point.
+- line: like arrow, without a head.
+
+Style:
+- fontSize: titles 16-18, labels 12-14, annotations 10-12.
+- Light fills (#E8F4FF, #F0F9FF) with darker strokes (#2563EB, #1E40AF); dark text on light backgrounds.
+- strokeWidth 2-3 for emphasis, 1 for subtle borders.
+- 30-50px between unrelated objects, 20-30px between related ones.
+- Snap x,y to multiples of 10 or 20, align edges, size similar objects alike, click targets at least 30x30.
+- Balance the layout and leave room for users to add objects.
+
+Layouts:
+- Flowchart: rectangles 120-180 x 60-80 for steps, diamonds 100-120 x 80-100 for decisions, 80-120px between steps, top-to-bottom or left-to-right.
+- Hierarchy: parents centered above children, 100-150px between levels, 120-180px between siblings.
+- Timeline: left-to-right, equal sizes, 150-200px apart.
+- Mind map: central object at ~(500,400), branches 150-200px away joined by lines or arrows.
+
+Connections: arrows 80-300px long, attached to edge midpoints rather than centers or corners; avoid crossings; keep one flow direction.
+"""
+
+_COMPACT_SCHEMA_INSTRUCTIONS = """
+Return only JSON: {"title": "...", "objects": [...]}. Every object has type, x, y (0-1000) plus:
+- rectangle, diamond, star, heart: width, height (30-500), fill, stroke, strokeWidth (1-4)
+- circle: radius (15-250), fill, stroke, strokeWidth
+- text: text, fontSize (10-18), color
+- arrow, line: points, stroke, strokeWidth
+Colors are #RRGGBB.
+"""
+
+
+def _build_system_prompt(instructions: str, schema_instructions: str) -> str:
+    """Join the static instructions with the style and color guides."""
+    return "\n".join([
+        instructions,
+        'STYLES (the user message names one under "Style"):',
+        *(f"- {name}: {guide}" for name, guide in _STYLE_GUIDES.items()),
+        "",
+        'COLOR SCHEMES (the user message names one under "Colors"):',
+        *(f"- {name}: {guide}" for name, guide in _COLOR_GUIDES.items()),
+        "",
+        f"Use at most {_MAX_OBJECTS} objects.",
+        schema_instructions
+    ])
+
+
+# Built once at import and byte-identical on every call; per-request values
+# (query, style, colors) only appear in the short user message. The compact
+# prompt is shorter than OpenAI's 1024-token caching threshold, and costs less
+# uncached than the long form does as a cached read.
+_CACHED_SYSTEM_PROMPT = (
+    _build_system_prompt(_SYSTEM_INSTRUCTIONS, _RESPONSE_SCHEMA_INSTRUCTIONS)
+    if os.environ.get('AI_VERBOSE_PROMPT') == '1'
+    else _build_system_prompt(_COMPACT_SYSTEM_INSTRUCTIONS, _COMPACT_SCHEMA_INSTRUCTIONS)
+)
+# Sent as-is on every request; only the user message is built per call
+_SYSTEM_MSG = {"role": "system", "content": _CACHED_SYSTEM_PROMPT}
+
+_OBJECT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "enum": ["rectangle", "circle", "diamond", "star", "heart", "text", "arrow", "line"]},
+        "label": {"type": "string"},
+        "x": {"type": "number", "minimum": 0, "maximum": 1000},
+        "y": {"type": "number", "minimum": 0, "maximum": 1000},
+        "width": {"type": "number", "minimum": 10, "maximum": 500},
+        "height": {"type": "number", "minimum": 10, "maximum": 500},
+        "radius": {"type": "number", "minimum": 10, "maximum": 250},
+        "fill": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
+        "stroke": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
+        "strokeWidth": {"type": "number", "minimum": 1, "maximum": 5},
+        "points": {"type": "array", "items": {"type": "number"}},
+        "text": {"type": "string"},
+        "color": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
+        "fontSize": {"type": "number", "minimum": 8, "maximum": 24}
+    },
+    "required": ["type", "x", "y"]
+}
+
+_CANVAS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "canvas_spec",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "objects": {"type": "array", "items": _OBJECT_SCHEMA, "maxItems": _MAX_OBJECTS}
+            },
+            "required": ["title", "objects"]
+        }
+    }
+}
+
+
+# Identifies cached objects generated with this prompt and schema
+_PROMPT_FINGERPRINT = prompt_fingerprint(_CACHED_SYSTEM_PROMPT, _CANVAS_RESPONSE_FORMAT)
+
+
+# Fields the system prompt requires for each object type, on top of the object
+# schema sent to OpenAI
+_SHAPE_RULES = {"required": ["width", "height"]}
+_LINE_RULES = {"required": ["points"], "properties": {"points": {"minItems": 4}}}
+_TYPE_RULES = {
+    "rectangle": _SHAPE_RULES,
+    "diamond": _SHAPE_RULES,
+    "star": _SHAPE_RULES,
+    "heart": _SHAPE_RULES,
+    "circle": {"required": ["radius"]},
+    "text": {"required": ["text"]},
+    "arrow": _LINE_RULES,
+    "line": _LINE_RULES
+}
+
+# One validator per object type, built from the same object schema sent to
+# OpenAI plus that type's rules. Dispatching on "type" checks each object
+# against its own rules only, rather than evaluating every type's conditions.
+# Each is compiled on first use instead of at import, which cost every worker
+# ~35 ms at startup whether or not it ever validated an AI response.
+@functools.lru_cache(maxsize=None)
+def _type_validator(obj_type: str) -> Callable[[Any], Any]:
+    return fastjsonschema.compile({**_OBJECT_SCHEMA, "allOf": [_TYPE_RULES[obj_type]]})
+
+
+def _object_is_valid(obj: Any) -> bool:
+    """Check an AI object against the schema for its type."""
+    obj_type = obj.get('type') if isinstance(obj, dict) else None
+    if obj_type not in _TYPE_RULES:
+        return False
+    validate = _type_validator(obj_type)
+    try:
+        validate(obj)
+    except fastjsonschema.JsonSchemaException:
+        return False
+    return True
+
+
+_DEFAULT_FILL = '#E8F4FF'
+_DEFAULT_STROKE = '#2563EB'
+
+
+# One cleaner per object type, each reading only its own fields
+def _clean_shape(obj: Dict[str, Any]) -> Dict[str, Any]:
+    get = obj.get
+    return {
+        'type': obj['type'], 'x': float(obj['x']), 'y': float(obj['y']),
+        'width': float(obj['width']),
+        'height': float(obj['height']),
+        'fill': get('fill', _DEFAULT_FILL),
+        'stroke': get('stroke', _DEFAULT_STROKE),
+        'strokeWidth': float(get('strokeWidth', 2))
+    }
+
+
+def _clean_circle(obj: Dict[str, Any]) -> Dict[str, Any]:
+    get = obj.get
+    return {
+        'type': 'circle', 'x': float(obj['x']), 'y': float(obj['y']),
+        'radius': float(obj['radius']),
+        'fill': get('fill', _DEFAULT_FILL),
+        'stroke': get('stroke', _DEFAULT_STROKE),
+        'strokeWidth': float(get('strokeWidth', 2))
+    }
+
+
+def _clean_text(obj: Dict[str, Any]) -> Dict[str, Any]:
+    get = obj.get
+    return {
+        'type': 'text', 'x': float(obj['x']), 'y': float(obj['y']),
+        'text': get('text', get('label', '')),
+        'fontSize': float(get('fontSize', 14)),
+        'color': get('color', '#000000'),
+        # Text bounds are optional; the frontend can also measure them
+        'width': float(get('width', 100)),
+        'height': float(get('height', 30))
+    }
+
+
+def _clean_line(obj: Dict[str, Any]) -> Dict[str, Any]:
+    get = obj.get
+    return {
+        'type': obj['type'], 'x': float(obj['x']), 'y': float(obj['y']),
+        'points': get('points', [0, 0, 100, 0]),
+        'stroke': get('stroke', _DEFAULT_STROKE),
+        'strokeWidth': float(get('strokeWidth', 2))
+    }
+
+
+_CLEANERS = {
+    'rectangle': _clean_shape,
+    'diamond': _clean_shape,
+    'star': _clean_shape,
+    'heart': _clean_shape,
+    'circle': _clean_circle,
+    'text': _clean_text,
+    'arrow': _clean_line,
+    'line': _clean_line
+}
+
+
+def _clean_object_data(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Standardize a validated AI object with the cleaner for its type."""
+    clean = _CLEANERS.get(obj['type'])
+    if clean is None:
+        return {'type': obj['type'], 'x': float(obj['x']), 'y': float(obj['y'])}
+    return clean(obj)
+
+
+def _validate_and_clean(obj: Any) -> Optional[Dict[str, Any]]:
+    """Return the cleaned form of a valid AI object, or None if it fails the schema."""
+    clean = _CLEANERS.get(obj.get('type')) if isinstance(obj, dict) else None
+    return clean(obj) if clean is not None and _object_is_valid(obj) else None
+
 
 class AIAgentService:
     """Service for AI-powered canvas creation."""
     
     def __init__(self):
-        # Use INFO level for visibility during debugging
-        self.logger = SmartLogger('ai_agent_service', 'INFO')
+        self.logger = logger
         
         # Check OpenAI API key
         api_key = os.environ.get('OPENAI_API_KEY')
@@ -28,8 +475,8 @@ class AIAgentService:
             raise ValueError("OpenAI API key is required but not configured")
         
         try:
-            # Initialize OpenAI client via factory for compatibility and fallbacks
-            self.openai_client = OpenAIClientFactory.create_client(api_key)
+            # Reuse the process-wide client and its connection pool
+            self.openai_client = OpenAIClientFactory.get_client(api_key)
             if not self.openai_client:
                 raise RuntimeError("Failed to initialize OpenAI client")
             self.logger.log_info("OpenAI client initialized successfully")
@@ -54,12 +501,23 @@ class AIAgentService:
         canvas_id: Optional[str] = None,
         style: str = "modern",
         color_scheme: str = "default",
-        request_id: Optional[str] = None
+        request_id: Optional[str] = None,
+        quality: str = "fast"
     ) -> Dict[str, Any]:
-        """Create canvas objects from natural language query."""
+        """
+        Create canvas objects from natural language query.
+        
+        ``quality`` selects the model: "fast" (default) or "high" for the slower,
+        more capable one.
+        """
         # Generate request ID if not provided
         if not request_id:
             request_id = str(uuid.uuid4())
+        if quality not in _MODELS:
+            raise ValueError("Quality must be 'fast' or 'high'")
+        model = _MODELS[quality]
+        prompt = None
+        started_at = datetime.utcnow().isoformat()
         
         try:
             self.logger.log_info(f"Starting AI canvas creation for user {user_id} with query: {query[:100]}...")
@@ -74,44 +532,6 @@ class AIAgentService:
             self.logger.log_info("Sanitizing user query...")
             sanitized_query = self.security_service.sanitize_user_query(query)
             
-            # Create Prompt record to track this generation
-            prompt = None
-            model_name = os.environ.get('OPENAI_MODEL', 'gpt-4')
-            try:
-                prompt = self.prompt_service.create_prompt(
-                    user_id=user_id,
-                    instructions=query,
-                    style=style,
-                    color_scheme=color_scheme,
-                    model=model_name,
-                    request_metadata={
-                        'request_id': request_id,
-                        'canvas_id': canvas_id,
-                        'start_time': datetime.utcnow().isoformat()
-                    }
-                )
-                # Update prompt status to processing
-                self.prompt_service.update_prompt_status(prompt.id, 'processing')
-                self.logger.log_info(f"Created prompt record: {prompt.id} for request: {request_id}")
-            except Exception as e:
-                self.logger.log_warning(f"Failed to create prompt record: {str(e)}")
-            
-            # Emit websocket event: generation started
-            try:
-                socketio.emit('ai_generation_started', {
-                    'request_id': request_id,
-                    'prompt_id': prompt.id if prompt else None,
-                    'canvas_id': canvas_id,
-                    'user_id': user_id,
-                    'instructions_preview': query[:100],
-                    'style': style,
-                    'color_scheme': color_scheme,
-                    'timestamp': datetime.utcnow().isoformat()
-                }, room=canvas_id if canvas_id else f'user_{user_id}')
-                self.logger.log_info(f"Emitted ai_generation_started for request: {request_id}")
-            except Exception as e:
-                self.logger.log_warning(f"Failed to emit ai_generation_started: {str(e)}")
-            
             # Optimize request and check for common patterns
             optimization_result = self.performance_service.optimize_request(sanitized_query, style, color_scheme)
             
@@ -121,6 +541,9 @@ class AIAgentService:
             
             # Check for common patterns first
             pattern_objects = self.performance_service.get_pattern_for_query(query)
+            generation = None
+            streamed_objects = queue.SimpleQueue()
+            streamed_ids = []
             if pattern_objects:
                 self.logger.log_info(f"Using common pattern for query: {query[:50]}...")
                 objects_data = {
@@ -128,62 +551,123 @@ class AIAgentService:
                     'objects': pattern_objects
                 }
             else:
-                # Generate AI response
-                ai_response = self._generate_ai_response(
-                    optimization_result['optimized_query'], 
-                    style, 
-                    color_scheme
+                # Identical requests, then near-duplicate queries, reuse previously generated objects
+                request_key = prompt_key(sanitized_query, style, color_scheme, model, _PROMPT_FINGERPRINT)
+                objects_data = self.performance_service.get_exact_objects(request_key)
+                if objects_data is None:
+                    # Start the OpenAI round trips now so they overlap the prompt
+                    # bookkeeping below
+                    generation = _GENERATION_EXECUTOR.submit(
+                        self._find_or_generate_objects,
+                        sanitized_query,
+                        optimization_result['optimized_query'],
+                        style,
+                        color_scheme,
+                        model,
+                        request_key,
+                        streamed_objects.put
+                    )
+            
+            # Create Prompt record to track this generation
+            try:
+                prompt = self.prompt_service.create_prompt(
+                    user_id=user_id,
+                    instructions=query,
+                    style=style,
+                    color_scheme=color_scheme,
+                    model=model,
+                    request_metadata={
+                        'request_id': request_id,
+                        'canvas_id': canvas_id,
+                        'start_time': started_at
+                    },
+                    # Created as processing: generation is already under way
+                    status='processing'
                 )
+                self.logger.log_info(f"Created prompt record: {prompt.id} for request: {request_id}")
+            except Exception as e:
+                self.logger.log_warning(f"Failed to create prompt record: {str(e)}")
+            
+            if generation is not None:
+                # Emit websocket event: generation started. Pattern and cache hits
+                # finish immediately, so they only send the completed event.
+                try:
+                    socketio.emit('ai_generation_started', {
+                        'request_id': request_id,
+                        'prompt_id': prompt.id if prompt else None,
+                        'canvas_id': canvas_id,
+                        'user_id': user_id,
+                        'instructions_preview': query[:100],
+                        'style': style,
+                        'color_scheme': color_scheme,
+                        'timestamp': started_at
+                    }, room=canvas_id if canvas_id else f'user_{user_id}')
+                    self.logger.log_info(f"Emitted ai_generation_started for request: {request_id}")
+                except Exception as e:
+                    self.logger.log_warning(f"Failed to emit ai_generation_started: {str(e)}")
                 
-                # Validate and sanitize AI response
-                validated_response = self.security_service.validate_ai_response(ai_response)
-                
-                # Parse AI response into canvas objects
-                objects_data = self._parse_ai_response_to_objects(validated_response)
+                objects_data = self._wait_for_generation(
+                    generation,
+                    streamed_objects,
+                    functools.partial(self._emit_streamed_object, request_id, canvas_id, user_id, streamed_ids)
+                )
             
             # Optimize objects for rendering
             objects_data['objects'] = self.performance_service.optimize_objects_for_rendering(
                 objects_data['objects']
             )
             
+            # Draw the canvas and object ids from one batch. Rendering keeps the
+            # objects in order, so streamed objects keep the ids they were sent with.
+            new_canvas_id, *object_ids = generate_uuids(len(objects_data['objects']) + 1)
+            object_ids[:len(streamed_ids)] = streamed_ids
+            
             # Create or update canvas
             if not canvas_id:
-                canvas = self._create_new_canvas(user_id, query, prompt.id if prompt else None)
+                canvas = self._create_new_canvas(
+                    user_id, query, prompt.id if prompt else None, canvas_id=new_canvas_id
+                )
                 canvas_id = canvas.id
             else:
-                canvas = Canvas.query.get(canvas_id)
-                if not canvas or canvas.owner_id != user_id:
+                # Only the owner and prompt link are needed, not the whole canvas
+                owner_id, linked_prompt_id = db.session.query(
+                    Canvas.owner_id, Canvas.prompt_id
+                ).filter_by(id=canvas_id).first() or (None, None)
+                if owner_id != user_id:
                     raise ValueError("Canvas not found or access denied")
                 # Link canvas to prompt if it doesn't have one
-                if prompt and not canvas.prompt_id:
-                    canvas.prompt_id = prompt.id
-                    db.session.commit()
+                if prompt and not linked_prompt_id:
+                    db.session.execute(
+                        update(Canvas).where(Canvas.id == canvas_id).values(prompt_id=prompt.id)
+                    )
             
             # Save objects to database
-            saved_objects = self._save_objects_to_canvas(objects_data['objects'], canvas_id, user_id)
+            saved_objects = self._save_objects_to_canvas(
+                objects_data['objects'], canvas_id, user_id, object_ids=object_ids
+            )
             
             result = {
                 'success': True,
                 'canvas_id': canvas_id,
-                'objects': [obj.to_dict() for obj in saved_objects],
+                'objects': saved_objects,
                 'message': f'Successfully created {len(saved_objects)} objects',
                 'title': objects_data.get('title', 'AI Generated Canvas'),
                 'request_id': request_id
             }
             
             # Record performance metrics
-            self.performance_service.record_response_time(
+            generation_time = self.performance_service.record_response_time(
                 optimization_result['start_time'],
                 optimization_result['cache_key'],
                 result
             )
+            finished_at = datetime.utcnow().isoformat()
             
             # Update prompt status to completed
             if prompt:
                 try:
-                    self.prompt_service.update_prompt_status(prompt.id, 'completed')
-                    self.prompt_service.update_prompt_metadata(prompt.id, {
-                        'completed_time': datetime.utcnow().isoformat(),
+                    self.prompt_service.update_prompt_status(prompt.id, 'completed', metadata={
+                        'completed_time': finished_at,
                         'object_count': len(saved_objects),
                         'canvas_id': canvas_id
                     })
@@ -191,9 +675,9 @@ class AIAgentService:
                 except Exception as e:
                     self.logger.log_warning(f"Failed to update prompt status: {str(e)}")
             
-            # Emit websocket event: generation completed
+            # Emit websocket event: generation completed. Its objects replace any
+            # streamed for this request: same ids, final positions.
             try:
-                generation_time = datetime.utcnow().timestamp() - optimization_result.get('start_time', datetime.utcnow().timestamp())
                 socketio.emit('ai_generation_completed', {
                     'request_id': request_id,
                     'prompt_id': prompt.id if prompt else None,
@@ -202,7 +686,7 @@ class AIAgentService:
                     'objects': result['objects'],
                     'object_count': len(saved_objects),
                     'generation_time': generation_time,
-                    'timestamp': datetime.utcnow().isoformat()
+                    'timestamp': finished_at
                 }, room=canvas_id if canvas_id else f'user_{user_id}')
                 self.logger.log_info(f"Emitted ai_generation_completed for request: {request_id}")
             except Exception as e:
@@ -211,19 +695,16 @@ class AIAgentService:
             return result
             
         except Exception as e:
-            import traceback
-            error_details = {
-                'error': str(e),
+            # Discard the pending canvas and objects so nothing half-written is committed
+            db.session.rollback()
+            self.logger.log_error("AI canvas creation failed", e, details={
                 'error_type': type(e).__name__,
-                'traceback': traceback.format_exc(),
                 'query': query[:100] if query else 'None',
                 'user_id': user_id,
                 'canvas_id': canvas_id,
                 'style': style,
                 'color_scheme': color_scheme
-            }
-            self.logger.log_error(f"AI canvas creation failed: {str(e)}", e)
-            self.logger.log_error(f"Error details: {error_details}")
+            })
             
             # Update prompt status to failed
             if prompt:
@@ -237,7 +718,8 @@ class AIAgentService:
                 except Exception as prompt_error:
                     self.logger.log_warning(f"Failed to update prompt status: {str(prompt_error)}")
             
-            # Emit websocket event: generation failed
+            # Emit websocket event: generation failed; clients discard any
+            # objects streamed for this request
             try:
                 socketio.emit('ai_generation_failed', {
                     'request_id': request_id,
@@ -253,263 +735,159 @@ class AIAgentService:
             
             raise
     
-    def _generate_ai_response(self, query: str, style: str, color_scheme: str) -> str:
-        """Generate AI response using OpenAI API."""
-        style_guidance = self._get_style_guidance(style, color_scheme)
+    def _wait_for_generation(
+        self,
+        generation: Future,
+        streamed_objects: queue.SimpleQueue,
+        emit_object: Callable[[Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """
+        Wait for a generation future, emitting its objects as they stream in.
         
-        system_prompt = """
-You are an expert UI/UX designer and diagramming specialist with deep knowledge of visual design principles.
-Your task is to generate a well-structured JSON specification for an interactive canvas.
-
-CANVAS COORDINATE SYSTEM:
-- Origin (0,0) is at the top-left corner
-- X-axis: 0 (left) to 1000 (right)
-- Y-axis: 0 (top) to 1000 (bottom)
-- Canvas center: approximately (500, 400)
-- Keep important content 50px from edges
-
-AVAILABLE OBJECT TYPES:
-
-1. rectangle - Boxes, containers, buttons, panels
-   - Position (x, y) is the top-left corner
-   - Properties: x, y, width, height, fill (interior color), stroke (border color), strokeWidth
-   - Use for: Process steps, UI components, containers, labels
-
-2. circle - Rounded shapes, decision points, avatars
-   - Position (x, y) is the CENTER of the circle
-   - Properties: x, y, radius (NOT width/height), fill, stroke, strokeWidth
-   - Use for: Start/end points, highlights, decorative elements
-
-3. diamond - Decision points, gateways
-   - Position (x, y) is the CENTER
-   - Properties: x, y, width, height, fill, stroke, strokeWidth
-   - Use for: Flowchart decisions, conditional branches
-
-4. star - Highlights, ratings, emphasis
-   - Position (x, y) is the CENTER
-   - Properties: x, y, width, height, fill, stroke, strokeWidth
-
-5. heart - Love, favorites, special markers
-   - Position (x, y) is the CENTER
-   - Properties: x, y, width, height, fill, stroke, strokeWidth
-
-6. text - Labels, headings, descriptions
-   - Position (x, y) is the top-left corner
-   - Properties: x, y, text (string content), fontSize, color
-   - Users can edit text by double-clicking
-   - Keep text concise and readable
-
-7. arrow - Directional connections showing flow/relationships
-   - Position (x, y) is the starting point
-   - Properties: x, y, points [0, 0, endX, endY], stroke, strokeWidth
-   - Points are RELATIVE to (x, y) position
-   - Arrow head appears at the end point
-
-8. line - Separators, non-directional connections
-   - Same as arrow but without arrow head
-   - Properties: x, y, points [0, 0, endX, endY], stroke, strokeWidth
-
-VISUAL DESIGN PRINCIPLES:
-
-Typography & Hierarchy:
-- Titles/headers: fontSize 16-18, bold or emphasized
-- Body text/labels: fontSize 12-14 for readability
-- Small annotations: fontSize 10-12
-
-Colors & Contrast:
-- Use fill for interior color, stroke for borders
-- Provide good contrast: light fills (#E8F4FF, #F0F9FF) with darker strokes (#2563EB, #1E40AF)
-- strokeWidth: 2-3 for emphasis, 1 for subtle borders
-- Text color should contrast with background (dark text on light background)
-
-Spacing & Whitespace:
-- Minimum 30-50px between unrelated objects
-- Consistent spacing between related objects (20-30px)
-- Leave breathing room - don't pack objects tightly
-
-Alignment & Structure:
-- Align objects to implicit grid (use multiples of 10 or 20 for x, y)
-- Align edges of related objects
-- Use consistent sizing for similar objects
-
-LAYOUT PATTERNS:
-
-Flowcharts:
-- Rectangles for process steps (width: 120-180, height: 60-80)
-- Diamonds for decisions (width: 100-120, height: 80-100)
-- Vertical spacing: 80-120px between steps
-- Arrows flowing top-to-bottom or left-to-right
-- Connect arrows to edge midpoints, not corners
-
-Hierarchical Diagrams:
-- Parent objects centered above children
-- 100-150px vertical spacing between levels
-- Horizontal spacing: 120-180px between siblings
-- Top-down tree structure
-
-Timelines:
-- Horizontal sequence with equal spacing (150-200px)
-- Consistent object sizes for uniformity
-- Left-to-right flow
-
-Mind Maps:
-- Central object at canvas center (~500, 400)
-- Branch objects radially with 150-200px distance
-- Use lines/arrows to connect branches to center
-
-CONNECTION BEST PRACTICES:
-- Arrows should be 80-300px in length
-- Connect to object edges/midpoints, not centers (unless intentional)
-- For rectangles: Connect to middle of edges (top, bottom, left, right)
-- Avoid crossing arrows when possible
-- Maintain consistent flow direction
-
-IMPORTANT NOTES:
-- All objects are interactive (draggable, resizable, editable)
-- Users will add more objects later - leave room for expansion
-- Ensure click targets are at least 30x30px
-- Objects can be layered (z-index) for depth
-- Design for clarity and usability
-
-Return ONLY valid JSON in the exact schema specified.
-"""
+        Emits happen here on the request thread rather than on the executor, and
+        the wait never blocks: under eventlet, blocking on the future would stall
+        every other connection served by the worker until OpenAI answered.
+        """
+        while True:
+            done = generation.done()
+            while True:
+                try:
+                    emit_object(streamed_objects.get_nowait())
+                except queue.Empty:
+                    break
+            if done:
+                return generation.result()
+            cooperative_sleep(POLL_INTERVAL)
+    
+    def _find_or_generate_objects(
+        self,
+        sanitized_query: str,
+        optimized_query: str,
+        style: str,
+        color_scheme: str,
+        model: str,
+        request_key: str,
+        on_object: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Reuse objects generated for a near-duplicate query, or generate new ones.
         
-        prompt = f"""
-Create a canvas layout based on this description: "{query}"
-
-Style preferences: {style_guidance}
-
-Return a JSON object with this exact structure:
-{{
-    "title": "Descriptive title for the canvas",
-    "objects": [
-        {{
-            "type": "rectangle|circle|diamond|star|heart|text|arrow|line",
-
-            // Common properties for all types:
-            "x": number (0-1000),
-            "y": number (0-1000),
-
-            // For rectangles, diamonds, stars, hearts:
-            "width": number (30-500),
-            "height": number (30-500),
-
-            // For circles only (use instead of width/height):
-            "radius": number (15-250),
-
-            // For arrows and lines (RELATIVE to x, y):
-            "points": [0, 0, endX, endY],  // e.g., [0, 0, 150, 0] for horizontal line
-
-            // Visual styling:
-            "fill": "hex color code (interior color)",
-            "stroke": "hex color code (border color)",
-            "strokeWidth": number (1-4),
-
-            // For text objects:
-            "text": "string content",
-            "fontSize": number (10-18),
-            "color": "hex color code"
-        }}
-    ]
-}}
-
-IMPORTANT SCHEMA RULES:
-- Rectangles, diamonds, stars, hearts: MUST have x, y, width, height, fill, stroke, strokeWidth
-- Circles: MUST have x, y, radius, fill, stroke, strokeWidth (NOT width/height)
-- Text: MUST have x, y, text, fontSize, color
-- Arrows/Lines: MUST have x, y, points, stroke, strokeWidth
-
-DESIGN GUIDELINES:
-- Apply visual hierarchy: vary sizes and strokeWidth for emphasis
-- Use consistent alignment: position objects on a grid (multiples of 10 or 20)
-- Provide adequate spacing: minimum 30-50px between unrelated objects
-- Choose harmonious colors: lighter fills with darker strokes for contrast
-- Connect with purpose: arrows should clearly show relationships and flow
-- Consider interactivity: leave room for users to add more content
-- Balance the layout: distribute objects evenly across the canvas
-"""
+        Runs on the generation executor, so it only uses the OpenAI client and the caches.
+        ``on_object`` is called with each object as it arrives from the completion stream.
+        """
+        query_embedding = self.performance_service.embed_query(self.openai_client, sanitized_query)
+        objects_data = self.performance_service.get_similar_objects(
+            query_embedding, style, color_scheme, model, _PROMPT_FINGERPRINT
+        )
+        if objects_data is not None:
+            return objects_data
+        
+        # Generate AI response; its objects are already validated and cleaned
+        objects_data = self._generate_ai_response(optimized_query, style, color_scheme, model, on_object)
+        objects_data['title'] = self.security_service.sanitize_canvas_title(objects_data['title'])
+        self.performance_service.cache_exact_objects(request_key, objects_data)
+        self.performance_service.cache_similar_objects(
+            query_embedding, style, color_scheme, objects_data, model, _PROMPT_FINGERPRINT
+        )
+        return objects_data
+    
+    def _generate_ai_response(
+        self,
+        query: str,
+        style: str,
+        color_scheme: str,
+        model: str = _OPENAI_MODEL,
+        on_object: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate canvas objects using a streamed OpenAI completion.
         
-        response = self.openai_client.chat.completions.create(
-            model=os.environ.get('OPENAI_MODEL', 'gpt-4'),
+        Each object is validated and cleaned once it is complete, and passed to
+        ``on_object`` while the rest of the response is still streaming. Returns the
+        title and the cleaned objects.
+        """
+        stream = self.openai_client.chat.completions.create(
+            model=model,
             messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
+                _SYSTEM_MSG,
+                {"role": "user", "content": f'Query: "{query}"\nStyle: {style}\nColors: {color_scheme}'}
             ],
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "canvas_spec",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "title": {"type": "string"},
-                            "objects": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "type": {"type": "string", "enum": ["rectangle", "circle", "diamond", "star", "heart", "text", "arrow", "line"]},
-                                        "label": {"type": "string"},
-                                        "x": {"type": "number", "minimum": 0, "maximum": 1000},
-                                        "y": {"type": "number", "minimum": 0, "maximum": 1000},
-                                        "width": {"type": "number", "minimum": 10, "maximum": 500},
-                                        "height": {"type": "number", "minimum": 10, "maximum": 500},
-                                        "radius": {"type": "number", "minimum": 10, "maximum": 250},
-                                        "fill": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
-                                        "stroke": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
-                                        "strokeWidth": {"type": "number", "minimum": 1, "maximum": 5},
-                                        "points": {"type": "array", "items": {"type": "number"}},
-                                        "text": {"type": "string"},
-                                        "color": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
-                                        "fontSize": {"type": "number", "minimum": 8, "maximum": 24}
-                                    },
-                                    "required": ["type", "x", "y"]
-                                }
-                            }
-                        },
-                        "required": ["title", "objects"]
-                    }
-                }
-            },
-            max_tokens=2000,
-            temperature=0.7
+            response_format=_CANVAS_RESPONSE_FORMAT,
+            max_tokens=_MAX_TOKENS,
+            temperature=0.7,
+            stream=True
         )
         
-        return response.choices[0].message.content
-    
-    def _get_style_guidance(self, style: str, color_scheme: str) -> str:
-        """Get style-specific guidance for AI generation."""
-        style_guides = {
-            "modern": "Clean lines, minimal design, use modern colors like blues and grays",
-            "corporate": "Professional appearance, use corporate colors like navy and white",
-            "creative": "Bold colors, creative shapes, artistic layout",
-            "minimal": "Simple shapes, lots of white space, subtle colors"
-        }
+        parser = JSONArrayStreamParser('objects')
+        objects = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason == 'length':
+                # Truncated at _MAX_TOKENS; the request fails and the completed
+                # event never replaces what was streamed
+                raise ValueError("AI response exceeded the token limit")
+            if not chunk.choices[0].delta.content:
+                continue
+            for obj in parser.feed(chunk.choices[0].delta.content):
+                cleaned = _validate_and_clean(obj)
+                if cleaned is not None:
+                    objects.append(cleaned)
+                    if on_object:
+                        on_object(cleaned)
+        
+        if not parser.done:
+            # No complete objects array in the stream; parse the whole response instead
+            return self._parse_ai_response_to_objects(parser.text)
         
-        color_guides = {
-            "pastel": "Use soft, pastel colors like light blues, pinks, and greens",
-            "vibrant": "Use bright, energetic colors like oranges, purples, and yellows",
-            "monochrome": "Use shades of gray and black only",
-            "default": "Use a balanced color palette with blues, greens, and grays"
+        title_match = _TITLE_RE.search(parser.text)
+        return {
+            'title': json_codec.loads(title_match.group(1)) if title_match else 'AI Generated Canvas',
+            'objects': objects
         }
+    
+    def _emit_streamed_object(
+        self,
+        request_id: str,
+        canvas_id: Optional[str],
+        user_id: str,
+        streamed_ids: List[str],
+        obj: Dict[str, Any]
+    ) -> None:
+        """
+        Send one object to the canvas as soon as it has streamed in.
         
-        return f"{style_guides.get(style, '')} {color_guides.get(color_scheme, '')}"
+        The object's id is drawn here and recorded in ``streamed_ids``, so the saved
+        object, and the ai_generation_completed event, carry the same id.
+        """
+        object_id = generate_uuid()
+        streamed_ids.append(object_id)
+        try:
+            socketio.emit('ai_object_streamed', {
+                'request_id': request_id,
+                'canvas_id': canvas_id,
+                'index': len(streamed_ids) - 1,
+                'object_id': object_id,
+                'object': obj
+            }, room=canvas_id if canvas_id else f'user_{user_id}')
+        except Exception as e:
+            self.logger.log_warning(f"Failed to emit ai_object_streamed: {str(e)}")
     
     def _parse_ai_response_to_objects(self, ai_response: str) -> Dict[str, Any]:
         """Parse AI response into canvas object data."""
         try:
             # Parse JSON response
-            data = json.loads(ai_response)
+            data = json_codec.loads(ai_response)
             
             # Validate structure
             if 'objects' not in data:
                 raise ValueError("Invalid AI response structure")
             
-            # Validate and clean objects
-            validated_objects = []
-            for obj in data.get('objects', []):
-                if self._validate_object(obj):
-                    validated_objects.append(self._clean_object(obj))
+            # Validate and clean objects in one pass
+            validated_objects = [
+                cleaned for cleaned in map(_validate_and_clean, data['objects'])
+                if cleaned is not None
+            ]
             
             return {
                 'title': data.get('title', 'AI Generated Canvas'),
@@ -522,106 +900,32 @@ DESIGN GUIDELINES:
     
     def _validate_object(self, obj: Dict[str, Any]) -> bool:
         """Validate object structure and values."""
-        # All objects require type, x, y
-        if 'type' not in obj or 'x' not in obj or 'y' not in obj:
-            return False
-
-        # Validate coordinates
-        if not (0 <= obj['x'] <= 1000 and 0 <= obj['y'] <= 1000):
-            return False
-
-        # Validate object type
-        valid_types = ['rectangle', 'circle', 'diamond', 'star', 'heart', 'text', 'arrow', 'line']
-        if obj['type'] not in valid_types:
-            return False
-
-        # Type-specific validation
-        obj_type = obj['type']
-
-        # Rectangles, diamonds, stars, hearts require width and height
-        if obj_type in ['rectangle', 'diamond', 'star', 'heart']:
-            if 'width' not in obj or 'height' not in obj:
-                return False
-            if not (10 <= obj['width'] <= 500 and 10 <= obj['height'] <= 500):
-                return False
-
-        # Circles require radius
-        elif obj_type == 'circle':
-            if 'radius' not in obj:
-                return False
-            if not (10 <= obj['radius'] <= 250):
-                return False
-
-        # Text requires text content
-        elif obj_type == 'text':
-            if 'text' not in obj or not isinstance(obj['text'], str):
-                return False
-
-        # Arrows and lines require points array
-        elif obj_type in ['arrow', 'line']:
-            if 'points' not in obj or not isinstance(obj['points'], list):
-                return False
-            if len(obj['points']) < 4 or not all(isinstance(p, (int, float)) for p in obj['points']):
-                return False
-
-        return True
+        return _object_is_valid(obj)
     
     def _clean_object(self, obj: Dict[str, Any]) -> Dict[str, Any]:
         """Clean and standardize object data."""
-        obj_type = obj['type']
-
-        # Base properties for all objects
-        cleaned = {
-            'type': obj_type,
-            'x': float(obj['x']),
-            'y': float(obj['y'])
-        }
-
-        # Type-specific properties
-        if obj_type in ['rectangle', 'diamond', 'star', 'heart']:
-            # Shapes with width and height
-            cleaned['width'] = float(obj['width'])
-            cleaned['height'] = float(obj['height'])
-            cleaned['fill'] = obj.get('fill', '#E8F4FF')
-            cleaned['stroke'] = obj.get('stroke', '#2563EB')
-            cleaned['strokeWidth'] = float(obj.get('strokeWidth', 2))
-
-        elif obj_type == 'circle':
-            # Circle with radius
-            cleaned['radius'] = float(obj['radius'])
-            cleaned['fill'] = obj.get('fill', '#E8F4FF')
-            cleaned['stroke'] = obj.get('stroke', '#2563EB')
-            cleaned['strokeWidth'] = float(obj.get('strokeWidth', 2))
-
-        elif obj_type == 'text':
-            # Text object
-            cleaned['text'] = obj.get('text', obj.get('label', ''))
-            cleaned['fontSize'] = float(obj.get('fontSize', 14))
-            cleaned['color'] = obj.get('color', '#000000')
-            # Add width and height for text bounds (optional, can be calculated by frontend)
-            cleaned['width'] = float(obj.get('width', 100))
-            cleaned['height'] = float(obj.get('height', 30))
-
-        elif obj_type in ['arrow', 'line']:
-            # Lines and arrows with points
-            cleaned['points'] = obj.get('points', [0, 0, 100, 0])
-            cleaned['stroke'] = obj.get('stroke', '#2563EB')
-            cleaned['strokeWidth'] = float(obj.get('strokeWidth', 2))
-
-        return cleaned
+        return _clean_object_data(obj)
     
-    def _create_new_canvas(self, user_id: str, query: str, prompt_id: Optional[str] = None) -> Canvas:
+    def _create_new_canvas(
+        self,
+        user_id: str,
+        query: str,
+        prompt_id: Optional[str] = None,
+        canvas_id: Optional[str] = None
+    ) -> Canvas:
         """Create a new canvas for AI-generated content."""
         canvas = Canvas(
-            id=str(uuid.uuid4()),
+            id=canvas_id or generate_uuid(),
             title=f"AI Generated: {query[:50]}...",
             owner_id=user_id,
             prompt_id=prompt_id,
             is_public=False
         )
         
+        # Flushed but not committed: the canvas is committed together with its
+        # objects in _save_objects_to_canvas
         db.session.add(canvas)
-        db.session.commit()
+        db.session.flush()
         
         return canvas
     
@@ -629,27 +933,52 @@ DESIGN GUIDELINES:
         self,
         objects_data: List[Dict[str, Any]],
         canvas_id: str,
-        user_id: str
-    ) -> List[CanvasObject]:
-        """Save AI-generated objects to the canvas."""
-        saved_objects = []
-
-        for obj_data in objects_data:
+        user_id: str,
+        object_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Save AI-generated objects to the canvas and return them in CanvasObject.to_dict() form.
+        
+        Commits the request's single transaction, including a canvas created by _create_new_canvas.
+        ``object_ids`` supplies pre-generated ids, one per object.
+        """
+        if object_ids is None:
+            object_ids = generate_uuids(len(objects_data))
+        now = datetime.utcnow()
+        rows = []
+
+        for object_id, obj_data in zip(object_ids, objects_data):
             # Create properties dictionary with all available properties
             # The cleaned object already has the correct structure
             properties = {k: v for k, v in obj_data.items() if k not in ['type']}
 
-            canvas_object = CanvasObject(
-                id=str(uuid.uuid4()),
-                canvas_id=canvas_id,
-                object_type=obj_data['type'],
-                properties=json.dumps(properties),
-                created_by=user_id
-            )
+            rows.append({
+                'id': object_id,
+                'canvas_id': canvas_id,
+                'object_type': obj_data['type'],
+                'properties': properties,
+                'z_index': 0,
+                'created_by': user_id,
+                'created_at': now,
+                'updated_at': now
+            })
+
+        # One multi-row INSERT instead of flushing an ORM instance per object
+        if rows:
+            db.session.execute(_INSERT_CANVAS_OBJECT, rows)
+        db.session.commit()
 
-            db.session.add(canvas_object)
-            saved_objects.append(canvas_object)
+        # Serialize from the rows just written; no ORM instances exist to read back
+        timestamp = now.isoformat()
+        return [{**row, 'created_at': timestamp, 'updated_at': timestamp} for row in rows]
 
-        db.session.commit()
 
-        return saved_objects
+@functools.lru_cache(maxsize=1)
+def get_ai_agent_service() -> AIAgentService:
+    """
+    Return the process-wide AIAgentService, building it on first use.
+    
+    The service holds no per-request state, so routes and jobs share one instance
+    (and its client and helper services). A failed construction is not cached.
+    """
+    return AIAgentService()
@@ -4,22 +4,117 @@ This is a fallback implementation that focuses on core functionality.
 """
 
 import openai
-import json
 import os
-import uuid
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Dict, List, Any, Optional
+from sqlalchemy import insert
 from app.models.canvas_object import CanvasObject
 from app.models.canvas import Canvas
 from app.utils.logger import SmartLogger
+from app.utils import json_codec
 from app.services.openai_client_factory import OpenAIClientFactory
+from app.services.ai_performance_service import AIPerformanceService, prompt_fingerprint, prompt_key
 from app.extensions import db
+from app.utils.ids import generate_uuid, generate_uuids
+from app.utils.cooperative import wait_for
+from app.utils.json_stream import JSONArrayStreamParser
+
+# Use WARNING level to reduce log volume on Railway
+logger = SmartLogger('simple_ai_agent_service', 'WARNING')
+
+# Core INSERT for the write-once canvas objects, built once and reused
+_INSERT_CANVAS_OBJECT = insert(CanvasObject.__table__)
+
+# Fixed for the life of the process; resolved once at import
+_IS_DEV = os.environ.get('FLASK_ENV') == 'development'
+_OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+
+# Completion budget for the 3-5 requested objects with headroom up to 8, at
+# roughly _MAX_OBJ_TOKENS each plus the title and JSON framing
+_MAX_OBJ_TOKENS = 60
+_MAX_TOKENS = 8 * _MAX_OBJ_TOKENS + 80
+
+# Identical on every call so OpenAI can reuse the cached prompt prefix. The
+# response structure is enforced by _RESPONSE_FORMAT rather than spelled out here.
+_SYSTEM_PROMPT = """
+You are an expert product manager and Figma power user.
+Generate a JSON specification of a design canvas: a title and 3-5 objects that represent the user's request.
+Give shapes x, y, width, height, fill, stroke and strokeWidth; text objects also get text and fontSize.
+Use modern, clean design principles.
+
+The user message gives the request, a visual style and a color scheme.
+"""
+_SYSTEM_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+
+_NUMBER = {"type": "number"}
+_STRING = {"type": "string"}
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "canvas_spec",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": _STRING,
+                "objects": {
+                    "type": "array",
+                    "maxItems": 8,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "object_type": {"type": "string", "enum": ["rectangle", "circle", "text", "line", "arrow"]},
+                            "properties": {
+                                "type": "object",
+                                "properties": {
+                                    "x": _NUMBER,
+                                    "y": _NUMBER,
+                                    "width": _NUMBER,
+                                    "height": _NUMBER,
+                                    "fill": _STRING,
+                                    "stroke": _STRING,
+                                    "strokeWidth": _NUMBER,
+                                    "text": _STRING,
+                                    "fontSize": _NUMBER
+                                },
+                                "required": ["x", "y"]
+                            }
+                        },
+                        "required": ["object_type", "properties"]
+                    }
+                }
+            },
+            "required": ["title", "objects"]
+        }
+    }
+}
+
+# Keeps this service's cached objects apart from other prompts' objects
+_PROMPT_FINGERPRINT = prompt_fingerprint(_SYSTEM_PROMPT, _RESPONSE_FORMAT)
+
+# Runs OpenAI calls so the canvas insert/lookup can proceed on the request
+# thread meanwhile. Workers only do HTTP, never database work, so the request's
+# session and transaction stay on the request thread.
+_GENERATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AI_GENERATION_WORKERS', '16')),
+    thread_name_prefix='ai-generation'
+)
+
+# Numeric properties and the value used when the model sends one that isn't a number
+_NUMERIC_DEFAULTS = (
+    ('x', 100), ('y', 100), ('width', 200), ('height', 100), ('strokeWidth', 2), ('fontSize', 16)
+)
+
+# Canvas title in the streamed response, read once the stream has finished
+_TITLE_RE = re.compile(r'"title"\s*:\s*("(?:[^"\\]|\\.)*")')
 
 class SimpleAIAgentService:
     """Simplified service for AI-powered canvas creation."""
     
     def __init__(self):
-        # Use WARNING level to reduce log volume on Railway
-        self.logger = SmartLogger('simple_ai_agent_service', 'WARNING')
+        self.logger = logger
+        self.performance_service = AIPerformanceService()
         
         # Check OpenAI API key
         api_key = os.environ.get('OPENAI_API_KEY')
@@ -28,12 +123,12 @@ class SimpleAIAgentService:
             raise ValueError("OpenAI API key is required but not configured")
         
         try:
-            # Initialize OpenAI client via factory (handles compatibility)
-            self.openai_client = OpenAIClientFactory.create_client(api_key)
+            # Reuse the process-wide client and its connection pool
+            self.openai_client = OpenAIClientFactory.get_client(api_key)
             if not self.openai_client:
                 raise RuntimeError("Failed to initialize OpenAI client")
             # Only log success in development
-            if os.environ.get('FLASK_ENV') == 'development':
+            if _IS_DEV:
                 self.logger.log_info("Simple OpenAI client initialized successfully")
         except Exception as e:
             self.logger.log_error(f"Failed to initialize OpenAI client: {str(e)}", e)
@@ -50,7 +145,7 @@ class SimpleAIAgentService:
         """Create canvas objects from natural language query."""
         try:
             # Only log detailed info in development
-            if os.environ.get('FLASK_ENV') == 'development':
+            if _IS_DEV:
                 self.logger.log_info(f"Starting simple AI canvas creation for user {user_id}")
             
             # Validate input parameters
@@ -59,28 +154,35 @@ class SimpleAIAgentService:
             if not user_id or not user_id.strip():
                 raise ValueError("User ID cannot be empty")
             
-            # Generate AI response
-            ai_response = self._generate_ai_response(query, style, color_scheme)
-            
-            # Parse AI response into canvas objects
-            objects_data = self._parse_ai_response_to_objects(ai_response)
+            # Identical requests reuse previously generated objects
+            request_key = prompt_key(query, style, color_scheme, _OPENAI_MODEL, _PROMPT_FINGERPRINT)
+            objects_data = self.performance_service.get_exact_objects(request_key)
+            generation = None
+            if objects_data is None:
+                # Look up or stream the AI response in a worker while the canvas is prepared below
+                generation = _GENERATION_EXECUTOR.submit(
+                    self._find_or_generate_objects, query, style, color_scheme, request_key
+                )
             
             # Create or update canvas
             if not canvas_id:
                 canvas = self._create_new_canvas(user_id, query)
                 canvas_id = canvas.id
             else:
-                canvas = Canvas.query.get(canvas_id)
-                if not canvas or canvas.owner_id != user_id:
+                owner_id = db.session.query(Canvas.owner_id).filter_by(id=canvas_id).scalar()
+                if owner_id != user_id:
                     raise ValueError("Canvas not found or access denied")
             
+            if generation is not None:
+                objects_data = wait_for(generation)
+            
             # Save objects to database
             saved_objects = self._save_objects_to_canvas(objects_data['objects'], canvas_id, user_id)
             
             result = {
                 'success': True,
                 'canvas_id': canvas_id,
-                'objects': [obj.to_dict() for obj in saved_objects],
+                'objects': saved_objects,
                 'message': f'Successfully created {len(saved_objects)} objects',
                 'title': objects_data.get('title', 'AI Generated Canvas')
             }
@@ -88,148 +190,158 @@ class SimpleAIAgentService:
             return result
             
         except Exception as e:
-            import traceback
-            error_details = {
-                'error': str(e),
+            # Discard the pending canvas and objects so nothing half-written is committed
+            db.session.rollback()
+            self.logger.log_error("Simple AI canvas creation failed", e, details={
                 'error_type': type(e).__name__,
-                'traceback': traceback.format_exc(),
                 'query': query[:100] if query else 'None',
                 'user_id': user_id,
                 'canvas_id': canvas_id,
                 'style': style,
                 'color_scheme': color_scheme
-            }
-            self.logger.log_error(f"Simple AI canvas creation failed: {str(e)}", e)
-            self.logger.log_error(f"Error details: {error_details}")
+            })
             raise
     
-    def _generate_ai_response(self, query: str, style: str, color_scheme: str) -> str:
-        """Generate AI response using OpenAI API."""
+    def _find_or_generate_objects(
+        self,
+        query: str,
+        style: str,
+        color_scheme: str,
+        request_key: str
+    ) -> Dict[str, Any]:
+        """
+        Reuse objects generated for a near-duplicate query, or generate new ones.
+        
+        Runs on the generation executor, so it only uses the OpenAI client and the caches.
+        """
+        query_embedding = self.performance_service.embed_query(self.openai_client, query)
+        objects_data = self.performance_service.get_similar_objects(
+            query_embedding, style, color_scheme, _OPENAI_MODEL, _PROMPT_FINGERPRINT
+        )
+        if objects_data is not None:
+            return objects_data
+        
+        objects_data = self._generate_objects(query, style, color_scheme)
+        self.performance_service.cache_exact_objects(request_key, objects_data)
+        self.performance_service.cache_similar_objects(
+            query_embedding, style, color_scheme, objects_data, _OPENAI_MODEL, _PROMPT_FINGERPRINT
+        )
+        return objects_data
+    
+    def _generate_objects(self, query: str, style: str, color_scheme: str) -> Dict[str, Any]:
+        """
+        Generate canvas objects with a streamed OpenAI completion.
+        
+        Objects are parsed and cleaned as soon as each one is complete, so little
+        work is left once the last token arrives.
+        
+        Returns:
+            Dict with the canvas title and the cleaned objects
+        """
         try:
-            system_prompt = """
-You are an expert product manager and Figma power user.
-Your task is to generate a JSON specification of a design canvas.
-
-Available object types:
-- rectangle: Basic rectangular shapes
-- circle: Circular shapes
-- text: Text elements
-- line: Straight lines
-- arrow: Arrow shapes
-
-Generate a JSON response with this structure:
-{
-  "title": "Canvas Title",
-  "objects": [
-    {
-      "object_type": "rectangle|circle|text|line|arrow",
-      "properties": {
-        "x": 100,
-        "y": 100,
-        "width": 200,
-        "height": 100,
-        "fill": "#3B82F6",
-        "stroke": "#1E40AF",
-        "strokeWidth": 2,
-        "text": "Sample text" (for text objects),
-        "fontSize": 16 (for text objects)
-      }
-    }
-  ]
-}
-
-Create 3-5 objects that represent the user's request. Use modern, clean design principles.
-"""
-            
-            user_prompt = f"""
-Create a canvas design for: {query}
-
-Style: {style}
-Color scheme: {color_scheme}
-
-Generate a JSON response with canvas objects that represent this request.
-"""
-            
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
+            stream = self.openai_client.chat.completions.create(
+                model=_OPENAI_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
+                    _SYSTEM_MSG,
+                    {"role": "user", "content": f'Query: "{query}"\nStyle: {style}\nColors: {color_scheme}'}
                 ],
-                max_tokens=2000,
-                temperature=0.7
+                response_format=_RESPONSE_FORMAT,
+                max_tokens=_MAX_TOKENS,
+                temperature=0.7,
+                stream=True
             )
             
-            return response.choices[0].message.content
+            parser = JSONArrayStreamParser('objects')
+            objects = []
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                objects.extend(self._clean_objects(parser.feed(chunk.choices[0].delta.content)))
             
         except Exception as e:
             self.logger.log_error(f"OpenAI API call failed: {str(e)}", e)
             raise
+        
+        if not parser.done:
+            # No complete objects array in the stream; parse the whole response instead
+            data = self._parse_ai_response_to_objects(parser.text)
+            return {
+                'title': data.get('title', 'AI Generated Canvas'),
+                'objects': self._clean_objects(data['objects'])
+            }
+        
+        title_match = _TITLE_RE.search(parser.text)
+        return {
+            'title': json_codec.loads(title_match.group(1)) if title_match else 'AI Generated Canvas',
+            'objects': objects
+        }
     
     def _parse_ai_response_to_objects(self, ai_response: str) -> Dict[str, Any]:
         """Parse AI response into canvas objects."""
         try:
-            # Clean the response
-            cleaned_response = ai_response.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            
-            # Parse JSON
-            data = json.loads(cleaned_response)
-            
-            if not isinstance(data, dict) or 'objects' not in data:
-                raise ValueError("Invalid AI response structure")
-            
-            return data
-            
-        except json.JSONDecodeError as e:
+            # response_format constrains the reply to bare JSON, so there are no fences to strip
+            data = json_codec.loads(ai_response)
+        except ValueError as e:
+            # Decode errors from either codec subclass ValueError
             self.logger.log_error(f"Failed to parse AI response as JSON: {str(e)}", e)
             raise ValueError("Failed to parse AI response")
-        except Exception as e:
-            self.logger.log_error(f"Failed to parse AI response: {str(e)}", e)
-            raise
+        
+        if not isinstance(data, dict) or 'objects' not in data:
+            self.logger.log_error("Failed to parse AI response: Invalid AI response structure")
+            raise ValueError("Invalid AI response structure")
+        
+        return data
     
     def _create_new_canvas(self, user_id: str, query: str) -> Canvas:
         """Create a new canvas."""
         canvas = Canvas(
-            id=str(uuid.uuid4()),
+            id=generate_uuid(),
             title=f"AI Generated: {query[:50]}...",
             owner_id=user_id,
             is_public=False
         )
+        # Committed together with the canvas objects in _save_objects_to_canvas
         db.session.add(canvas)
-        db.session.commit()
+        db.session.flush()
         return canvas
     
-    def _save_objects_to_canvas(self, objects_data: List[Dict], canvas_id: str, user_id: str) -> List[CanvasObject]:
-        """Save objects to canvas."""
-        saved_objects = []
+    def _save_objects_to_canvas(self, objects_data: List[Dict], canvas_id: str, user_id: str) -> List[Dict]:
+        """Save cleaned objects to canvas and return them in CanvasObject.to_dict() form."""
+        now = datetime.utcnow()
+        
+        object_ids = generate_uuids(len(objects_data))
+        rows = [
+            {
+                'id': object_id,
+                'canvas_id': canvas_id,
+                'object_type': obj_data['object_type'],
+                'properties': obj_data['properties'],
+                'z_index': 0,
+                'created_by': user_id,
+                'created_at': now,
+                'updated_at': now
+            }
+            for object_id, obj_data in zip(object_ids, objects_data)
+        ]
+        
+        # One multi-row INSERT instead of flushing an ORM instance per object
+        if rows:
+            db.session.execute(_INSERT_CANVAS_OBJECT, rows)
+        db.session.commit()
         
+        # Serialize from the rows just written; no ORM instances exist to read back
+        timestamp = now.isoformat()
+        return [{**row, 'created_at': timestamp, 'updated_at': timestamp} for row in rows]
+    
+    def _clean_objects(self, objects_data: List[Dict]) -> List[Dict]:
+        """Clean a list of objects, skipping any that are invalid."""
+        cleaned = []
         for obj_data in objects_data:
             try:
-                # Clean and validate object data
-                cleaned_obj = self._clean_object(obj_data)
-                
-                # Create canvas object
-                canvas_obj = CanvasObject(
-                    id=str(uuid.uuid4()),
-                    canvas_id=canvas_id,
-                    object_type=cleaned_obj['object_type'],
-                    properties=cleaned_obj['properties'],
-                    created_by=user_id
-                )
-                
-                db.session.add(canvas_obj)
-                saved_objects.append(canvas_obj)
-                
+                cleaned.append(self._clean_object(obj_data))
             except Exception as e:
-                self.logger.log_error(f"Failed to save object: {str(e)}", e)
-                continue
-        
-        db.session.commit()
-        return saved_objects
+                self.logger.log_error(f"Skipping invalid object: {str(e)}", e)
+        return cleaned
     
     def _clean_object(self, obj_data: Dict) -> Dict:
         """Clean and validate object data."""
@@ -244,18 +356,12 @@ Generate a JSON response with canvas objects that represent this request.
         properties = obj_data['properties'].copy()
         
         # Ensure numeric values are properly typed
-        numeric_fields = ['x', 'y', 'width', 'height', 'strokeWidth', 'fontSize']
-        for field in numeric_fields:
+        for field, default in _NUMERIC_DEFAULTS:
             if field in properties:
                 try:
                     properties[field] = float(properties[field])
                 except (ValueError, TypeError):
-                    # Set default values for invalid numbers
-                    defaults = {
-                        'x': 100, 'y': 100, 'width': 200, 'height': 100,
-                        'strokeWidth': 2, 'fontSize': 16
-                    }
-                    properties[field] = defaults.get(field, 0)
+                    properties[field] = default
         
         return {
             'object_type': obj_data['object_type'],
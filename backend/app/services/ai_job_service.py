@@ -1,16 +1,25 @@
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+from sqlalchemy import func
 from app.models.ai_job import AIJob
 from app.extensions import db, socketio
 from app.config_modules.job_config import job_config
 from app.utils.logger import SmartLogger
 
+logger = SmartLogger('ai_job_service', 'INFO')
+
+# Set when a job is queued so this process's job processor wakes at once
+# instead of at its next poll. Jobs queued by other instances, and delayed
+# retries, are still picked up by the poll.
+_job_queued = threading.Event()
+
 class AIJobService:
     """Service for managing AI background jobs using PostgreSQL."""
     
     def __init__(self):
-        self.logger = SmartLogger('ai_job_service', 'INFO')
+        self.logger = logger
         self.config = job_config
     
     def create_canvas_job(self, user_id: str, request_data: dict, priority: int = 0) -> str:
@@ -27,6 +36,7 @@ class AIJobService:
             )
             db.session.add(job)
             db.session.commit()
+            _job_queued.set()
             
             self.logger.log_info(f"Created AI job {job.id} for user {user_id}")
             return job.id
@@ -43,12 +53,31 @@ class AIJobService:
             query = query.filter_by(user_id=user_id)
         return query.first()
     
-    def get_next_job(self) -> Optional[AIJob]:
-        """Get the next job to process."""
-        return AIJob.query.filter(
+    def get_next_jobs(self, batch_size: int = 1) -> List[AIJob]:
+        """
+        Claim up to ``batch_size`` due jobs for processing.
+        
+        The rows are locked with SKIP LOCKED and marked processing in the same
+        transaction, so concurrent workers never claim the same job.
+        """
+        jobs = AIJob.query.filter(
             AIJob.status == 'queued',
             AIJob.next_processing_at <= datetime.utcnow()
-        ).order_by(AIJob.priority.desc(), AIJob.created_at.asc()).first()
+        ).order_by(
+            AIJob.priority.desc(), AIJob.created_at.asc()
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+        
+        started_at = datetime.utcnow()
+        for job in jobs:
+            job.status = 'processing'
+            job.started_at = started_at
+        db.session.commit()
+        return jobs
+    
+    def wait_for_queued_job(self, timeout: float):
+        """Block until a job is queued in this process or ``timeout`` seconds pass."""
+        _job_queued.wait(timeout)
+        _job_queued.clear()
     
     def get_active_jobs_count(self) -> int:
         """Get count of currently processing jobs."""
@@ -57,21 +86,24 @@ class AIJobService:
     def process_job(self, job: AIJob) -> bool:
         """Process a single job."""
         try:
-            # Mark as processing
-            job.mark_started()
+            # Jobs claimed by get_next_jobs are already marked as processing
+            if job.status != 'processing':
+                job.mark_started()
+            # Job events only concern the job's owner
+            room = f'user_{job.user_id}'
             
             # Emit status update
             socketio.emit('ai_job_update', {
                 'job_id': job.id,
                 'status': 'processing',
-                'message': 'Starting AI generation...',
+                'message': 'Generating canvas with AI...',
                 'progress': 10
-            })
+            }, room=room)
             
             # Initialize AI service
             try:
-                from app.services.ai_agent_service import AIAgentService
-                ai_service = AIAgentService()
+                from app.services.ai_agent_service import get_ai_agent_service
+                ai_service = get_ai_agent_service()
                 self.logger.log_info(f"AI service initialized for job {job.id}")
             except Exception as e:
                 self.logger.log_error(f"Failed to initialize AI service: {str(e)}", e)
@@ -80,17 +112,9 @@ class AIJobService:
                     'job_id': job.id,
                     'status': 'failed',
                     'error': f"AI service initialization failed: {str(e)}"
-                })
+                }, room=room)
                 return False
             
-            # Emit progress update
-            socketio.emit('ai_job_update', {
-                'job_id': job.id,
-                'status': 'processing',
-                'message': 'Generating canvas with AI...',
-                'progress': 30
-            })
-            
             # Process with AI service
             request_data = job.request_data
             result = ai_service.create_canvas_from_query(
@@ -98,17 +122,10 @@ class AIJobService:
                 user_id=job.user_id,
                 canvas_id=request_data.get('canvas_id'),
                 style=request_data.get('style', 'modern'),
-                color_scheme=request_data.get('colorScheme', 'default')
+                color_scheme=request_data.get('colorScheme', 'default'),
+                quality=request_data.get('quality', 'fast')
             )
             
-            # Emit progress update
-            socketio.emit('ai_job_update', {
-                'job_id': job.id,
-                'status': 'processing',
-                'message': 'Finalizing canvas...',
-                'progress': 90
-            })
-            
             # Mark as completed
             job.mark_completed(result)
             
@@ -118,7 +135,7 @@ class AIJobService:
                 'status': 'completed',
                 'result': result,
                 'progress': 100
-            })
+            }, room=room)
             
             self.logger.log_info(f"AI job {job.id} completed successfully")
             return True
@@ -134,7 +151,7 @@ class AIJobService:
                 'job_id': job.id,
                 'status': job.status,
                 'error': str(e)
-            })
+            }, room=f'user_{job.user_id}')
             
             return False
     
@@ -167,6 +184,7 @@ class AIJobService:
             job.completed_at = None
             job.next_processing_at = datetime.utcnow()
             db.session.commit()
+            _job_queued.set()
             
             self.logger.log_info(f"Retried AI job {job.id}")
             return True
@@ -180,26 +198,28 @@ class AIJobService:
         """Clean up old completed jobs."""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        old_jobs = AIJob.query.filter(
+        # Single DELETE statement; the rows are never loaded into the session
+        deleted = AIJob.query.filter(
             AIJob.status.in_(['completed', 'failed', 'cancelled']),
             AIJob.completed_at < cutoff_date
-        ).all()
-        
-        for job in old_jobs:
-            db.session.delete(job)
+        ).delete(synchronize_session=False)
         
         db.session.commit()
-        self.logger.log_info(f"Cleaned up {len(old_jobs)} old jobs")
+        self.logger.log_info(f"Cleaned up {deleted} old jobs")
     
     def get_job_statistics(self) -> Dict:
         """Get job processing statistics."""
+        # One grouped count instead of a COUNT query per status
+        counts = dict(
+            db.session.query(AIJob.status, func.count(AIJob.id)).group_by(AIJob.status).all()
+        )
         stats = {
-            'total_jobs': AIJob.query.count(),
-            'queued_jobs': AIJob.query.filter_by(status='queued').count(),
-            'processing_jobs': AIJob.query.filter_by(status='processing').count(),
-            'completed_jobs': AIJob.query.filter_by(status='completed').count(),
-            'failed_jobs': AIJob.query.filter_by(status='failed').count(),
-            'cancelled_jobs': AIJob.query.filter_by(status='cancelled').count(),
+            'total_jobs': sum(counts.values()),
+            'queued_jobs': counts.get('queued', 0),
+            'processing_jobs': counts.get('processing', 0),
+            'completed_jobs': counts.get('completed', 0),
+            'failed_jobs': counts.get('failed', 0),
+            'cancelled_jobs': counts.get('cancelled', 0),
         }
         
         # Calculate success rate
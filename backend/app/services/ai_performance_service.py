@@ -3,22 +3,122 @@ AI Performance Service for optimizing AI Agent operations.
 Handles caching, request optimization, and performance monitoring.
 """
 
+import copy
+import itertools
+import math
+import operator
+import os
+import re
+import threading
 import time
 import json
 import hashlib
+from array import array
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 from functools import lru_cache
 from app.utils.logger import SmartLogger
+from app.utils import json_codec
 from app.models.canvas_object import CanvasObject
 from app.models.canvas import Canvas
 
+# Use WARNING level to reduce log volume on Railway
+logger = SmartLogger('ai_performance_service', 'WARNING')
+
+# Semantic cache of generated canvas objects. Services may be built per request,
+# so the store lives at module level and is shared by every instance. Objects are
+# only reused for the same style, color scheme, model and prompt fingerprint, so
+# entries are bucketed by that spec and a lookup scans just its own bucket.
+# Buckets, and the entries within each, are evicted least recently used first.
+# Embeddings are kept as float32 arrays to hold more entries in the same memory.
+_SEMANTIC_CACHE_ENABLED = os.environ.get('AI_SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+_EMBEDDING_MODEL = 'text-embedding-3-small'
+_SEMANTIC_MAX_DISTANCE = 0.08  # Cosine distance
+_SEMANTIC_BUCKET_SIZE = 64
+_SEMANTIC_MAX_BUCKETS = 32
+_semantic_cache = OrderedDict()  # spec -> OrderedDict(entry id -> (embedding, objects_data))
+_semantic_entry_ids = itertools.count()
+_semantic_cache_lock = threading.Lock()
+
+
+# Overlap checks bucket placed objects into horizontal rows so each object is
+# only compared with objects whose vertical extent it shares. Objects spanning
+# more than _OVERLAP_MAX_ROWS rows are kept in a catch-all bucket (key None).
+_OVERLAP_ROW_HEIGHT = 100
+_OVERLAP_MAX_ROWS = 32
+
+
+# Exact-match cache of generated canvas objects, keyed by prompt_key. Entries
+# go to the shared cache backend when one is configured, otherwise to a bounded
+# in-process LRU. Shared entries outlive deploys and are read by every service,
+# so keys include a fingerprint of the prompt and response format that shaped
+# the objects.
+_EXACT_CACHE_PREFIX = 'ai:canvas:'
+_EXACT_CACHE_TTL = 7 * 24 * 3600  # 7 days
+_EXACT_CACHE_MAXSIZE = 1024
+_exact_cache = OrderedDict()
+_exact_cache_lock = threading.Lock()
+
+
+# Spellings of the same diagram kind, folded together so they share cache entries
+_QUERY_VARIANTS = {
+    'flow chart': 'flowchart',
+    'flow-chart': 'flowchart',
+    'mind map': 'mindmap',
+    'mind-map': 'mindmap',
+    'wire frame': 'wireframe',
+    'wire-frame': 'wireframe'
+}
+_QUERY_VARIANTS_RE = re.compile(r'\b(?:%s)\b' % '|'.join(map(re.escape, _QUERY_VARIANTS)))
+
+
+def _canonical_query(query: str) -> str:
+    """Cache-key form of a query, ignoring case, spacing, trailing punctuation and spelling variants."""
+    canonical = ' '.join(query.lower().split()).rstrip('.!? ')
+    return _QUERY_VARIANTS_RE.sub(lambda m: _QUERY_VARIANTS[m.group(0)], canonical)
+
+
+def prompt_fingerprint(system_prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+    """Short digest identifying the prompt and response format a service generates with."""
+    material = system_prompt + json.dumps(response_format, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+def prompt_key(query: str, style: str, color_scheme: str, model: str, fingerprint: str) -> str:
+    """Build the exact-match cache key for a generation request."""
+    return hashlib.sha256(
+        f"{fingerprint}\0{model}\0{style}\0{color_scheme}\0{_canonical_query(query)}".encode()
+    ).hexdigest()
+
+
+# Pattern trigger keywords in priority order. _PATTERN_RE has one named
+# lookahead group per pattern, so a single match() finds the first pattern with
+# any keyword anywhere in the query and lastgroup names it.
+_PATTERN_KEYWORDS = (
+    ('flowchart', ('flowchart', 'flow', 'process', 'workflow')),
+    ('mindmap', ('mindmap', 'mind map', 'brainstorm')),
+    ('wireframe', ('wireframe', 'layout', 'mockup')),
+)
+_PATTERN_RE = re.compile(
+    '|'.join(
+        f"(?P<{name}>(?=.*?(?:{'|'.join(map(re.escape, keywords))})))"
+        for name, keywords in _PATTERN_KEYWORDS
+    ),
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Scale a vector to unit length so a dot product is its cosine similarity."""
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
 
 class AIPerformanceService:
     """Service for optimizing AI Agent performance."""
     
     def __init__(self):
-        # Use WARNING level to reduce log volume on Railway
-        self.logger = SmartLogger('ai_performance_service', 'WARNING')
+        self.logger = logger
         self.request_cache = {}
         self.performance_metrics = {
             'total_requests': 0,
@@ -40,7 +140,7 @@ class AIPerformanceService:
         Returns:
             Optimized request data
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         
         # Generate cache key
         cache_key = self._generate_cache_key(query, style, color_scheme)
@@ -68,14 +168,20 @@ class AIPerformanceService:
     
     def record_response_time(self, start_time: float, cache_key: str, result: Dict[str, Any]):
         """
-        Record response time and cache result.
+        Record response time.
+        
+        Results are not cached here: they carry the requesting user's canvas id.
+        Generated objects are reused through the exact and semantic caches instead.
         
         Args:
-            start_time: Request start time
+            start_time: Request start time, from ``time.monotonic()``
             cache_key: Cache key for the request
             result: AI response result
+            
+        Returns:
+            Elapsed request time in seconds
         """
-        response_time = time.time() - start_time
+        response_time = time.monotonic() - start_time
         
         # Update performance metrics
         self.performance_metrics['total_response_time'] += response_time
@@ -84,15 +190,12 @@ class AIPerformanceService:
             self.performance_metrics['total_requests']
         )
         
-        # Cache successful results
-        if result.get('success'):
-            self._cache_result(cache_key, result)
-        
         self.logger.log_info(f"AI request completed in {response_time:.2f}s")
+        return response_time
     
     def _generate_cache_key(self, query: str, style: str, color_scheme: str) -> str:
         """Generate cache key for request."""
-        cache_data = f"{query.lower().strip()}:{style}:{color_scheme}"
+        cache_data = f"{_canonical_query(query)}:{style}:{color_scheme}"
         return hashlib.md5(cache_data.encode()).hexdigest()
     
     def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
@@ -109,6 +212,174 @@ class AIPerformanceService:
         
         self.request_cache[cache_key] = result
     
+    def get_exact_objects(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get objects generated for an identical request.
+        
+        Args:
+            key: Request key from prompt_key
+            
+        Returns:
+            Copy of the cached objects data, None on a miss
+        """
+        from app import extensions
+        
+        objects_data = None
+        if extensions.cache_client is not None:
+            cached = extensions.cache_client.get(f"{_EXACT_CACHE_PREFIX}{key}")
+            if cached:
+                try:
+                    objects_data = json_codec.loads(cached)
+                except ValueError as e:
+                    self.logger.log_warning(f"Discarding unreadable exact cache entry: {str(e)}")
+        else:
+            with _exact_cache_lock:
+                objects_data = _exact_cache.get(key)
+                if objects_data is not None:
+                    _exact_cache.move_to_end(key)
+                    objects_data = copy.deepcopy(objects_data)
+        
+        if objects_data is None:
+            return None
+        
+        self.performance_metrics['cache_hits'] += 1
+        self.logger.log_info("Exact cache hit")
+        return objects_data
+    
+    def cache_exact_objects(self, key: str, objects_data: Dict[str, Any]):
+        """
+        Store generated objects for later identical requests.
+        
+        Args:
+            key: Request key from prompt_key
+            objects_data: Parsed objects data to reuse
+        """
+        from app import extensions
+        
+        if extensions.cache_client is not None:
+            extensions.cache_client.set(
+                f"{_EXACT_CACHE_PREFIX}{key}",
+                json_codec.dumps(objects_data),
+                ex=_EXACT_CACHE_TTL
+            )
+            return
+        
+        with _exact_cache_lock:
+            _exact_cache[key] = copy.deepcopy(objects_data)
+            _exact_cache.move_to_end(key)
+            if len(_exact_cache) > _EXACT_CACHE_MAXSIZE:
+                _exact_cache.popitem(last=False)
+    
+    def embed_query(self, openai_client, query: str) -> Optional[List[float]]:
+        """
+        Embed a query for semantic cache lookups.
+        
+        Args:
+            openai_client: OpenAI client used for the embeddings call
+            query: Sanitized user query
+            
+        Returns:
+            Unit-length embedding, or None if the semantic cache is disabled or embedding fails
+        """
+        if not _SEMANTIC_CACHE_ENABLED or openai_client is None:
+            return None
+        
+        try:
+            # Short timeout and no retries: a slow embedding must not delay generation
+            response = openai_client.with_options(timeout=2.0, max_retries=0).embeddings.create(
+                model=_EMBEDDING_MODEL,
+                input=query
+            )
+            return _normalize(response.data[0].embedding)
+        except Exception as e:
+            self.logger.log_warning(f"Query embedding failed, skipping semantic cache: {str(e)}")
+            return None
+    
+    def get_similar_objects(
+        self,
+        embedding: Optional[List[float]],
+        style: str,
+        color_scheme: str,
+        model: str = '',
+        fingerprint: str = ''
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get objects generated for a semantically similar query.
+        
+        Args:
+            embedding: Query embedding from embed_query
+            style: Visual style
+            color_scheme: Color scheme
+            model: Model that generated the objects
+            fingerprint: prompt_fingerprint of the prompt that shaped the objects
+            
+        Returns:
+            Copy of the closest cached objects data within the distance threshold, None otherwise
+        """
+        if embedding is None:
+            return None
+        
+        spec = (style, color_scheme, model, fingerprint)
+        with _semantic_cache_lock:
+            bucket = _semantic_cache.get(spec)
+            entries = list(bucket.items()) if bucket else []
+        
+        best_id = best_match = None
+        best_similarity = 1.0 - _SEMANTIC_MAX_DISTANCE
+        for entry_id, (entry_embedding, objects_data) in entries:
+            similarity = sum(map(operator.mul, embedding, entry_embedding))
+            if similarity >= best_similarity:
+                best_id, best_match, best_similarity = entry_id, objects_data, similarity
+        
+        if best_match is None:
+            return None
+        
+        with _semantic_cache_lock:
+            if spec in _semantic_cache and best_id in _semantic_cache[spec]:
+                _semantic_cache.move_to_end(spec)
+                _semantic_cache[spec].move_to_end(best_id)
+        
+        self.performance_metrics['cache_hits'] += 1
+        self.logger.log_info(f"Semantic cache hit (similarity {best_similarity:.3f})")
+        return copy.deepcopy(best_match)
+    
+    def cache_similar_objects(
+        self,
+        embedding: Optional[List[float]],
+        style: str,
+        color_scheme: str,
+        objects_data: Dict[str, Any],
+        model: str = '',
+        fingerprint: str = ''
+    ):
+        """
+        Store generated objects for later semantic cache lookups.
+        
+        Args:
+            embedding: Query embedding from embed_query
+            style: Visual style
+            color_scheme: Color scheme
+            objects_data: Parsed objects data to reuse for similar queries
+            model: Model that generated the objects
+            fingerprint: prompt_fingerprint of the prompt that shaped the objects
+        """
+        if embedding is None:
+            return
+        
+        spec = (style, color_scheme, model, fingerprint)
+        entry = (array('f', embedding), copy.deepcopy(objects_data))
+        with _semantic_cache_lock:
+            bucket = _semantic_cache.get(spec)
+            if bucket is None:
+                bucket = _semantic_cache[spec] = OrderedDict()
+                if len(_semantic_cache) > _SEMANTIC_MAX_BUCKETS:
+                    _semantic_cache.popitem(last=False)
+            else:
+                _semantic_cache.move_to_end(spec)
+            bucket[next(_semantic_entry_ids)] = entry
+            if len(bucket) > _SEMANTIC_BUCKET_SIZE:
+                bucket.popitem(last=False)
+    
     def _optimize_query(self, query: str) -> str:
         """
         Optimize user query for better AI performance.
@@ -167,6 +438,8 @@ class AIPerformanceService:
             Optimized objects
         """
         optimized_objects = []
+        placed = []
+        rows = {}
         
         for obj in objects:
             optimized_obj = obj.copy()
@@ -205,19 +478,21 @@ class AIPerformanceService:
                     properties['text'] = text[:47] + '...'
             
             # Optimize coordinates to prevent overlap
-            optimized_obj = self._prevent_object_overlap(optimized_obj, optimized_objects)
+            optimized_obj = self._prevent_object_overlap(optimized_obj, placed, rows)
             
             optimized_objects.append(optimized_obj)
         
         return optimized_objects
     
-    def _prevent_object_overlap(self, obj: Dict[str, Any], existing_objects: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _prevent_object_overlap(self, obj: Dict[str, Any], placed: List[tuple],
+                                rows: Dict[int, List[int]]) -> Dict[str, Any]:
         """
         Prevent object overlap by adjusting coordinates.
         
         Args:
             obj: Object to optimize
-            existing_objects: List of existing objects
+            placed: (x, y, width, height) of the objects already placed
+            rows: Indexes into ``placed`` bucketed by the rows each object spans
             
         Returns:
             Optimized object
@@ -228,13 +503,17 @@ class AIPerformanceService:
         width = properties.get('width', 120)
         height = properties.get('height', 60)
         
+        # Only objects sharing a row can overlap; visit them in placement order
+        # so the result matches checking every placed object
+        span = self._rows_spanned(y, height)
+        if span is None:
+            candidates = range(len(placed))
+        else:
+            candidates = sorted({i for row in (*span, None) for i in rows.get(row, ())})
+        
         # Check for overlaps and adjust position
-        for existing_obj in existing_objects:
-            existing_props = existing_obj.get('properties', {})
-            existing_x = existing_props.get('x', 0)
-            existing_y = existing_props.get('y', 0)
-            existing_width = existing_props.get('width', 0)
-            existing_height = existing_props.get('height', 0)
+        for i in candidates:
+            existing_x, existing_y, existing_width, existing_height = placed[i]
             
             # Check if objects overlap
             if (x < existing_x + existing_width and 
@@ -246,8 +525,25 @@ class AIPerformanceService:
                 x = existing_x + existing_width + 20
                 properties['x'] = x
         
+        index = len(placed)
+        placed.append((x, y, width, height))
+        for row in span if span is not None else (None,):
+            rows.setdefault(row, []).append(index)
+        
         return obj
     
+    @staticmethod
+    def _rows_spanned(y, height) -> Optional[range]:
+        """Return the rows covering [y, y + height], or None for very tall objects."""
+        try:
+            first = math.floor(min(y, y + height) / _OVERLAP_ROW_HEIGHT)
+            last = math.floor(max(y, y + height) / _OVERLAP_ROW_HEIGHT)
+        except (OverflowError, ValueError):
+            return None
+        if last - first >= _OVERLAP_MAX_ROWS:
+            return None
+        return range(first, last + 1)
+    
     @lru_cache(maxsize=128)
     def get_common_patterns(self) -> Dict[str, List[Dict[str, Any]]]:
         """
@@ -356,15 +652,8 @@ class AIPerformanceService:
         Returns:
             Pattern objects if found, None otherwise
         """
-        query_lower = query.lower()
-        patterns = self.get_common_patterns()
-        
-        # Check for pattern keywords
-        if any(keyword in query_lower for keyword in ['flowchart', 'flow', 'process', 'workflow']):
-            return patterns['flowchart']
-        elif any(keyword in query_lower for keyword in ['mindmap', 'mind map', 'brainstorm']):
-            return patterns['mindmap']
-        elif any(keyword in query_lower for keyword in ['wireframe', 'layout', 'mockup']):
-            return patterns['wireframe']
-        
-        return None
+        match = _PATTERN_RE.match(query)
+        if not match:
+            return None
+        
+        return self.get_common_patterns()[match.lastgroup]
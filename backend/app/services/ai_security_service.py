@@ -8,42 +8,81 @@ import html
 import json
 from typing import Dict, Any, List, Optional
 from app.utils.logger import SmartLogger
+from app.utils import json_codec
 from app.services.sanitization_service import SanitizationService
 
+# Use WARNING level to reduce log volume on Railway
+logger = SmartLogger('ai_security_service', 'WARNING')
+
+_VALID_OBJECT_TYPES = frozenset({'rectangle', 'circle', 'diamond', 'text', 'arrow', 'line'})
+
+# Security patterns for prompt injection detection
+_PROMPT_INJECTION_PATTERNS = [
+    r'ignore\s+(?:previous|above|all)\s+(?:instructions?|prompts?)',
+    r'forget\s+(?:everything|all)\s+(?:previous|above)',
+    r'you\s+are\s+now\s+(?:a\s+)?(?:different|new)',
+    r'pretend\s+to\s+be',
+    r'act\s+as\s+if',
+    r'roleplay\s+as',
+    r'system\s*:\s*',
+    r'admin\s*:\s*',
+    r'override\s*:\s*',
+    r'<\|.*?\|>',  # Special tokens
+    r'\[.*?\]',    # Bracketed commands
+    r'\{.*?\}',    # Curly brace commands
+]
+
+# Dangerous keywords that could indicate malicious intent
+_DANGEROUS_KEYWORDS = [
+    'password', 'token', 'key', 'secret', 'private',
+    'admin', 'root', 'system', 'execute', 'run',
+    'delete', 'drop', 'truncate', 'alter', 'create',
+    'script', 'javascript', 'eval', 'function',
+    'http', 'https', 'ftp', 'file://', 'data:',
+    'base64', 'encode', 'decode'
+]
+
+# Verbs that make a following dangerous keyword suspicious, e.g. "reveal password"
+_DANGEROUS_VERBS = [
+    'get', 'find', 'show', 'reveal', 'extract',
+    'steal', 'hack', 'exploit', 'bypass', 'crack'
+]
+
+# Every query is screened, so each check is a single precompiled scan
+# instead of one re.search or substring test per pattern
+_PROMPT_INJECTION_RE = re.compile(
+    '|'.join(f'(?:{pattern})' for pattern in _PROMPT_INJECTION_PATTERNS), re.IGNORECASE
+)
+_DANGEROUS_CONTEXT_RE = re.compile(
+    f"(?:{'|'.join(_DANGEROUS_VERBS)}) (?:{'|'.join(map(re.escape, _DANGEROUS_KEYWORDS))})"
+)
+
+# Command injection patterns, removed in order
+_COMMAND_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r';\s*[a-zA-Z]',  # Semicolon followed by command
+        r'\|\s*[a-zA-Z]',  # Pipe followed by command
+        r'&&\s*[a-zA-Z]',  # Double ampersand followed by command
+        r'\|\|\s*[a-zA-Z]',  # Double pipe followed by command
+        r'`[^`]*`',  # Backtick commands
+        r'\$\([^)]*\)',  # Command substitution
+    )
+]
+
+# Six hex digits, with or without the leading '#'
+_HEX_COLOR_RE = re.compile(r'#?([0-9A-Fa-f]{6})')
+
 
 class AISecurityService:
     """Service for securing AI Agent operations."""
     
     def __init__(self):
-        # Use WARNING level to reduce log volume on Railway
-        self.logger = SmartLogger('ai_security_service', 'WARNING')
+        self.logger = logger
         self.sanitization_service = SanitizationService()
         
-        # Security patterns for prompt injection detection
-        self.prompt_injection_patterns = [
-            r'ignore\s+(?:previous|above|all)\s+(?:instructions?|prompts?)',
-            r'forget\s+(?:everything|all)\s+(?:previous|above)',
-            r'you\s+are\s+now\s+(?:a\s+)?(?:different|new)',
-            r'pretend\s+to\s+be',
-            r'act\s+as\s+if',
-            r'roleplay\s+as',
-            r'system\s*:\s*',
-            r'admin\s*:\s*',
-            r'override\s*:\s*',
-            r'<\|.*?\|>',  # Special tokens
-            r'\[.*?\]',    # Bracketed commands
-            r'\{.*?\}',    # Curly brace commands
-        ]
-        
-        # Dangerous keywords that could indicate malicious intent
-        self.dangerous_keywords = [
-            'password', 'token', 'key', 'secret', 'private',
-            'admin', 'root', 'system', 'execute', 'run',
-            'delete', 'drop', 'truncate', 'alter', 'create',
-            'script', 'javascript', 'eval', 'function',
-            'http', 'https', 'ftp', 'file://', 'data:',
-            'base64', 'encode', 'decode'
-        ]
+        # Kept on the instance for the security metrics endpoint
+        self.prompt_injection_patterns = _PROMPT_INJECTION_PATTERNS
+        self.dangerous_keywords = _DANGEROUS_KEYWORDS
         
         # Maximum allowed values for security
         self.security_limits = {
@@ -111,7 +150,7 @@ class AISecurityService:
         
         try:
             # Parse JSON response
-            data = json.loads(response)
+            data = json_codec.loads(response)
         except json.JSONDecodeError as e:
             self.logger.log_error(f"Invalid JSON in AI response: {str(e)}")
             raise ValueError("Invalid AI response format")
@@ -127,7 +166,7 @@ class AISecurityService:
         
         # Validate canvas title
         if 'title' in canvas_data:
-            canvas_data['title'] = self._sanitize_canvas_title(canvas_data['title'])
+            canvas_data['title'] = self.sanitize_canvas_title(canvas_data['title'])
         
         # Validate objects
         if 'objects' in canvas_data:
@@ -137,67 +176,20 @@ class AISecurityService:
     
     def _detect_prompt_injection(self, query: str) -> bool:
         """Detect potential prompt injection attacks."""
-        query_lower = query.lower()
-        
-        for pattern in self.prompt_injection_patterns:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return True
-        
-        return False
+        return _PROMPT_INJECTION_RE.search(query.lower()) is not None
     
     def _detect_dangerous_keywords(self, query: str) -> bool:
-        """Detect potentially dangerous keywords."""
-        query_lower = query.lower()
-        
-        # Check for dangerous keywords in context
-        for keyword in self.dangerous_keywords:
-            if keyword in query_lower:
-                # Check if it's in a dangerous context
-                if self._is_dangerous_context(query_lower, keyword):
-                    return True
-        
-        return False
-    
-    def _is_dangerous_context(self, query: str, keyword: str) -> bool:
-        """Check if keyword is used in a dangerous context."""
-        # Look for patterns that suggest malicious intent
-        dangerous_contexts = [
-            f'get {keyword}',
-            f'find {keyword}',
-            f'show {keyword}',
-            f'reveal {keyword}',
-            f'extract {keyword}',
-            f'steal {keyword}',
-            f'hack {keyword}',
-            f'exploit {keyword}',
-            f'bypass {keyword}',
-            f'crack {keyword}'
-        ]
-        
-        for context in dangerous_contexts:
-            if context in query:
-                return True
-        
-        return False
+        """Detect dangerous keywords used in a dangerous context."""
+        return _DANGEROUS_CONTEXT_RE.search(query.lower()) is not None
     
     def _remove_command_patterns(self, query: str) -> str:
         """Remove potential command injection patterns."""
-        # Remove common command patterns
-        command_patterns = [
-            r';\s*[a-zA-Z]',  # Semicolon followed by command
-            r'\|\s*[a-zA-Z]',  # Pipe followed by command
-            r'&&\s*[a-zA-Z]',  # Double ampersand followed by command
-            r'\|\|\s*[a-zA-Z]',  # Double pipe followed by command
-            r'`[^`]*`',  # Backtick commands
-            r'\$\([^)]*\)',  # Command substitution
-        ]
-        
-        for pattern in command_patterns:
-            query = re.sub(pattern, '', query, flags=re.IGNORECASE)
+        for pattern in _COMMAND_PATTERNS:
+            query = pattern.sub('', query)
         
         return query
     
-    def _sanitize_canvas_title(self, title: str) -> str:
+    def sanitize_canvas_title(self, title: str) -> str:
         """Sanitize canvas title."""
         if not title or not isinstance(title, str):
             return "AI Generated Canvas"
@@ -235,8 +227,7 @@ class AISecurityService:
     def _validate_single_object(self, obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Validate and sanitize a single object."""
         # Validate object type
-        valid_types = ['rectangle', 'circle', 'diamond', 'text', 'arrow', 'line']
-        if 'type' not in obj or obj['type'] not in valid_types:
+        if not isinstance(obj.get('type'), str) or obj['type'] not in _VALID_OBJECT_TYPES:
             return None
         
         validated_obj = {
@@ -280,13 +271,10 @@ class AISecurityService:
         if not color or not isinstance(color, str):
             return '#3B82F6'  # Default safe color
         
-        # Check for valid hex color
-        if re.match(r'^#[0-9A-Fa-f]{6}$', color):
-            return color.upper()
-        
-        # Check for valid hex color without #
-        if re.match(r'^[0-9A-Fa-f]{6}$', color):
-            return f"#{color.upper()}"
+        # Normalize valid hex colors, with or without the leading #
+        match = _HEX_COLOR_RE.fullmatch(color)
+        if match:
+            return f"#{match.group(1).upper()}"
         
         # Default safe color
         return '#3B82F6'
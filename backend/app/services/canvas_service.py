@@ -1,9 +1,12 @@
-import uuid
 import json
 from datetime import datetime
 from app.models import Canvas, CanvasObject, CanvasPermission, User
 from app.extensions import db
 from app.utils.railway_logger import railway_logger
+from app.utils import json_codec
+from app.utils.ids import generate_uuid
+
+_VALID_OBJECT_TYPES = frozenset({'rectangle', 'circle', 'text', 'heart', 'star', 'diamond', 'line', 'arrow'})
 
 
 class CanvasNotFoundError(Exception):
@@ -17,7 +20,7 @@ class CanvasService:
     def create_canvas(self, title, description, owner_id, is_public=False):
         """Create a new canvas."""
         canvas = Canvas(
-            id=str(uuid.uuid4()),
+            id=generate_uuid(),
             title=title,
             description=description,
             owner_id=owner_id,
@@ -139,15 +142,14 @@ class CanvasService:
                 raise ValueError(f"User not found: {created_by}")
             
             # Validate object type
-            valid_types = ['rectangle', 'circle', 'text', 'heart', 'star', 'diamond', 'line', 'arrow']
-            if object_type not in valid_types:
+            if not isinstance(object_type, str) or object_type not in _VALID_OBJECT_TYPES:
                 railway_logger.log('canvas', 40, f"Invalid object type: {object_type}")
                 raise ValueError(f"Invalid object type: {object_type}")
             
             # Validate properties
             if isinstance(properties, str):
                 try:
-                    properties_dict = json.loads(properties)
+                    properties_dict = json_codec.loads(properties)
                 except json.JSONDecodeError as e:
                     railway_logger.log('canvas', 40, f"Invalid JSON in properties: {str(e)}")
                     raise ValueError(f"Invalid JSON in properties: {str(e)}")
@@ -165,10 +167,10 @@ class CanvasService:
             
             # Create canvas object
             canvas_object = CanvasObject(
-                id=str(uuid.uuid4()),
+                id=generate_uuid(),
                 canvas_id=canvas_id,
                 object_type=object_type,
-                properties=json.dumps(properties_dict) if isinstance(properties_dict, dict) else properties,
+                properties=properties_dict,
                 z_index=z_index,
                 created_by=created_by
             )
@@ -68,10 +68,10 @@ class JobProcessor:
                 active_jobs = self.job_service.get_active_jobs_count()
                 
                 if active_jobs < self.config.MAX_CONCURRENT_JOBS:
-                    # Get next job
-                    job = self.job_service.get_next_job()
+                    # Claim as many jobs as there are free slots in one query
+                    jobs = self.job_service.get_next_jobs(self.config.MAX_CONCURRENT_JOBS - active_jobs)
                     
-                    if job:
+                    for job in jobs:
                         self.logger.log_info(f"Processing job {job.id}")
                         
                         # Process job in a separate thread to avoid blocking
@@ -81,9 +81,10 @@ class JobProcessor:
                             daemon=True
                         )
                         job_thread.start()
-                    else:
-                        # No jobs to process, wait
-                        time.sleep(self.config.PROCESSING_INTERVAL)
+                    
+                    if not jobs:
+                        # No jobs to process, wait for one to be queued
+                        self.job_service.wait_for_queued_job(self.config.PROCESSING_INTERVAL)
                 else:
                     # Too many active jobs, wait
                     self.logger.log_info(f"Max concurrent jobs reached ({active_jobs}), waiting...")
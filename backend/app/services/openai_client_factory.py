@@ -1,9 +1,12 @@
 """
 OpenAI Client Factory
-Provides a factory for creating OpenAI clients with proper configuration
-and fallback mechanisms to avoid the proxies argument issue.
+Provides a factory for creating OpenAI clients with a single tested configuration.
 """
 
+import atexit
+import functools
+import importlib.util
+import httpx
 import openai
 import os
 from typing import Optional, Dict, Any
@@ -11,6 +14,23 @@ from app.utils.logger import SmartLogger
 
 logger = SmartLogger('openai_client_factory', 'INFO')
 
+# HTTP/2 multiplexes concurrent completions over one connection; it needs the
+# h2 package, so fall back to HTTP/1.1 keep-alive when it is missing
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_client(api_key: str) -> openai.OpenAI:
+    """Create the client once per API key so every service reuses its connection pool."""
+    client = OpenAIClientFactory.create_client(api_key)
+    if not client:
+        # Raising keeps the failure out of the cache so the next caller retries
+        raise RuntimeError("Failed to initialize OpenAI client")
+    # Close pooled connections cleanly at interpreter shutdown
+    atexit.register(client.close)
+    return client
+
 
 class OpenAIClientFactory:
     """Factory for creating OpenAI clients with proper configuration."""
@@ -26,92 +46,64 @@ class OpenAIClientFactory:
         Returns:
             OpenAI client instance or None if creation fails
         """
-        try:
-            # Get API key
-            if not api_key:
-                api_key = os.environ.get('OPENAI_API_KEY')
-            
-            if not api_key:
-                logger.log_error("OpenAI API key not provided")
-                return None
-            
-            # Clean environment variables that might cause issues
-            OpenAIClientFactory._clean_proxy_environment()
-            
-            # Try different client creation strategies
-            client = OpenAIClientFactory._try_create_client(api_key)
-            
-            if client:
-                logger.log_info("OpenAI client created successfully")
-                return client
-            else:
-                logger.log_error("Failed to create OpenAI client with all strategies")
-                return None
-                
-        except Exception as e:
-            logger.log_error(f"OpenAI client factory error: {str(e)}", e)
+        # Get API key
+        if not api_key:
+            api_key = os.environ.get('OPENAI_API_KEY')
+        
+        if not api_key:
+            logger.log_error("OpenAI API key not provided")
             return None
-    
-    @staticmethod
-    def _clean_proxy_environment():
-        """Clean proxy-related environment variables that might cause issues."""
-        proxy_vars = [
-            'HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy',
-            'ALL_PROXY', 'all_proxy', 'NO_PROXY', 'no_proxy',
-            'FTP_PROXY', 'ftp_proxy', 'SOCKS_PROXY', 'socks_proxy'
-        ]
         
-        for var in proxy_vars:
-            if var in os.environ:
-                logger.log_info(f"Removing proxy environment variable: {var}")
-                del os.environ[var]
-    
-    @staticmethod
-    def _try_create_client(api_key: str) -> Optional[openai.OpenAI]:
-        """Try different strategies to create OpenAI client."""
-
-        # Strategy 1: Simple creation without testing (most lenient)
+        # One known-good configuration; the client validates on first use.
+        # The explicit httpx client ignores proxy environment variables
+        # (trust_env=False) without touching os.environ, and sidesteps the
+        # SDK's default client construction, which passes the `proxies`
+        # argument newer httpx releases no longer accept.
         try:
-            logger.log_info("Creating OpenAI client with api_key only (no validation)")
-            client = openai.OpenAI(api_key=api_key)
-            logger.log_info("OpenAI client created successfully (will validate on first use)")
-            return client
-        except Exception as e:
-            logger.log_warning(f"Simple client creation failed: {str(e)}")
-
-        # Strategy 2: With timeout configuration
-        try:
-            logger.log_info("Trying OpenAI client creation with timeout")
             client = openai.OpenAI(
                 api_key=api_key,
-                timeout=60.0,
-                max_retries=3
+                timeout=30.0,
+                max_retries=2,
+                http_client=httpx.Client(
+                    trust_env=False,
+                    timeout=30.0,
+                    http2=_HTTP2_AVAILABLE,
+                    limits=_HTTP_LIMITS
+                )
             )
-            logger.log_info("OpenAI client with timeout created successfully")
+            logger.log_info("OpenAI client created successfully")
             return client
         except Exception as e:
-            logger.log_warning(f"Timeout configuration failed: {str(e)}")
-
-        # Strategy 3: Test connection if simple creation worked
-        # (This is now a fallback instead of required)
+            logger.log_error(f"OpenAI client creation failed: {str(e)}", e)
+            return None
+    
+    @staticmethod
+    def get_client(api_key: Optional[str] = None) -> Optional[openai.OpenAI]:
+        """
+        Get the process-wide OpenAI client, creating it on first use.
+        
+        Args:
+            api_key: OpenAI API key (if None, will try to get from environment)
+            
+        Returns:
+            Shared OpenAI client instance or None if creation fails
+        """
+        if not api_key:
+            api_key = os.environ.get('OPENAI_API_KEY')
+        
+        if not api_key:
+            logger.log_error("OpenAI API key not provided")
+            return None
+        
         try:
-            logger.log_info("Trying OpenAI client creation with connection test")
-            client = openai.OpenAI(api_key=api_key)
-            # Try to test the client with a simple API call
-            client.models.list()
-            logger.log_info("OpenAI client validated with models.list() test")
-            return client
-        except Exception as e:
-            logger.log_warning(f"Connection test failed (non-fatal): {str(e)}")
-            # Return client anyway - it might work when actually used
-            try:
-                logger.log_info("Returning client despite test failure")
-                return openai.OpenAI(api_key=api_key)
-            except:
-                pass
-
-        logger.log_error("All OpenAI client creation strategies failed")
-        return None
+            return _shared_client(api_key)
+        except RuntimeError:
+            return None
+    
+    @staticmethod
+    def clear_shared_client() -> None:
+        """Drop the shared client so the next get_client call builds a new one."""
+        _shared_client.cache_clear()
     
     @staticmethod
     def test_client(client: openai.OpenAI) -> bool:
@@ -145,6 +137,7 @@ class OpenAIClientFactory:
             'api_key_set': bool(os.environ.get('OPENAI_API_KEY')),
             'api_key_length': len(os.environ.get('OPENAI_API_KEY', '')),
             'openai_version': openai.__version__,
+            'http2': _HTTP2_AVAILABLE,
             'proxy_vars': {
                 var: bool(os.environ.get(var)) 
                 for var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']
@@ -1,16 +1,18 @@
-import uuid
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from app.models.prompt import Prompt
 from app.models.canvas import Canvas
 from app.extensions import db
 from app.utils.logger import SmartLogger
+from app.utils.ids import generate_uuid
+
+logger = SmartLogger('prompt_service', 'WARNING')
 
 class PromptService:
     """Service for managing AI generation prompts."""
     
     def __init__(self):
-        self.logger = SmartLogger('prompt_service', 'WARNING')
+        self.logger = logger
     
     def create_prompt(
         self,
@@ -19,18 +21,19 @@ class PromptService:
         style: str = 'modern',
         color_scheme: str = 'default',
         model: str = None,
-        request_metadata: Optional[Dict[str, Any]] = None
+        request_metadata: Optional[Dict[str, Any]] = None,
+        status: str = 'pending'
     ) -> Prompt:
-        """Create a new prompt record."""
+        """Create a new prompt record, optionally already in a later ``status``."""
         try:
             prompt = Prompt(
-                id=str(uuid.uuid4()),
+                id=generate_uuid(),
                 user_id=user_id,
                 instructions=instructions,
                 style=style,
                 color_scheme=color_scheme,
                 model_used=model,
-                status='pending'
+                status=status
             )
             
             if request_metadata:
@@ -73,9 +76,10 @@ class PromptService:
         self,
         prompt_id: str,
         status: str,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
     ) -> Optional[Prompt]:
-        """Update the status of a prompt."""
+        """Update the status of a prompt, merging any ``metadata`` in the same commit."""
         try:
             prompt = self.get_prompt_by_id(prompt_id)
             if not prompt:
@@ -88,6 +92,11 @@ class PromptService:
             if error_message:
                 prompt.error_message = error_message
             
+            if metadata:
+                existing_metadata = prompt.get_metadata()
+                existing_metadata.update(metadata)
+                prompt.set_metadata(existing_metadata)
+            
             db.session.commit()
             
             self.logger.log_info(f"Prompt {prompt_id} status updated to: {status}")
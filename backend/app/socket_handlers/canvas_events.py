@@ -25,8 +25,8 @@ import json
 def register_canvas_handlers(socketio):
     """Register canvas-related Socket.IO event handlers.
     
-    Note: AI generation events (ai_generation_started, ai_generation_completed, 
-    ai_generation_failed) are emitted from AIAgentService and listened to by the frontend.
+    Note: AI generation events (ai_generation_started, ai_object_streamed,
+    ai_generation_completed, ai_generation_failed) are emitted from AIAgentService and listened to by the frontend.
     They are not handled as incoming socket events here.
     """
     
@@ -207,18 +207,12 @@ def register_canvas_handlers(socketio):
             # Handle both user object and user dict
             user_id = user.id if hasattr(user, 'id') else user.get('id')
             
-            # Validate object properties are JSON serializable
-            try:
-                properties_json = json.dumps(object_data['properties'])
-            except (TypeError, ValueError) as e:
-                railway_logger.log('socket_io', 40, f"Object properties not JSON serializable: {str(e)}")
-                emit('error', {'message': 'Invalid object properties', 'type': 'validation_error'})
-                return
-            
+            # Properties arrive JSON-decoded from the socket payload and are stored
+            # as-is in the JSON column
             canvas_object = canvas_service.create_canvas_object(
                 canvas_id=canvas_id,
                 object_type=object_data['type'],
-                properties=properties_json,
+                properties=object_data['properties'],
                 created_by=user_id
             )
             
@@ -325,7 +319,7 @@ def register_canvas_handlers(socketio):
             # Update object in database
             updated_object = canvas_service.update_canvas_object(
                 object_id=object_id,
-                properties=json.dumps(sanitized_properties)
+                properties=sanitized_properties
             )
             
             if updated_object:
@@ -0,0 +1,33 @@
+"""
+Cooperative waiting for work handed to executor threads
+Keeps the eventlet hub serving other connections while a request waits
+"""
+
+import time
+from concurrent.futures import Future
+from typing import Any
+
+from app.extensions import socketio
+
+# Delay between checks on a pending future; bounds the latency a wait adds
+POLL_INTERVAL = 0.02
+
+
+def cooperative_sleep(seconds: float) -> None:
+    """Sleep through Socket.IO so eventlet can run other green threads meanwhile."""
+    if socketio.server is not None:
+        socketio.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def wait_for(future: Future) -> Any:
+    """
+    Return the result of ``future`` without blocking the server's event loop.
+
+    Blocking on ``future.result()`` from a request would stall every other
+    connection of an eventlet worker until the executor thread finished.
+    """
+    while not future.done():
+        cooperative_sleep(POLL_INTERVAL)
+    return future.result()
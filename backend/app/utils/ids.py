@@ -0,0 +1,36 @@
+"""
+Identifier helpers for CollabCanvas
+Generates batches of time-ordered UUIDs for bulk row creation
+"""
+
+import os
+import time
+from typing import List
+
+
+def generate_uuids(count: int) -> List[str]:
+    """
+    Generate ``count`` UUIDv7 strings from a single ``os.urandom`` call.
+
+    Ids start with the current Unix time in milliseconds, so rows inserted
+    together land next to each other in primary-key indexes instead of at
+    random leaf pages. The remaining 74 bits are random. The random bytes for
+    the whole batch are read in one syscall and hex-encoded in one pass
+    instead of building a ``uuid.UUID`` per id.
+    """
+    buf = bytearray(os.urandom(16 * count))
+    # Set the version (7) and RFC 4122 variant bits of every 16-byte block
+    buf[6::16] = bytes(b & 0x0F | 0x70 for b in buf[6::16])
+    buf[8::16] = bytes(b & 0x3F | 0x80 for b in buf[8::16])
+    h = buf.hex()
+    # The 48-bit millisecond timestamp replaces the first 6 random bytes of each block
+    t = f'{time.time_ns() // 1_000_000:012x}'
+    return [
+        f'{t[:8]}-{t[8:]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}'
+        for i in range(0, 32 * count, 32)
+    ]
+
+
+def generate_uuid() -> str:
+    """Generate a single UUIDv7 string for a new primary key."""
+    return generate_uuids(1)[0]
@@ -0,0 +1,48 @@
+"""
+JSON codec for canvas object properties
+Uses orjson when it is installed and falls back to the standard library json module
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> str:
+        """Serialize ``obj`` to a compact JSON string."""
+        return orjson.dumps(obj).decode()
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+    # catch the standard exception either way
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> str:
+        """Serialize ``obj`` to a compact JSON string."""
+        return json.dumps(obj, separators=(',', ':'))
+
+    loads = json.loads
+
+
+class PacketJSON:
+    """
+    ``json`` module stand-in for Socket.IO packet encoding.
+
+    Socket.IO passes stdlib-style keyword arguments, which orjson's compact
+    output makes unnecessary. Payloads orjson refuses (non-string keys, very
+    large integers) are encoded by the standard library instead.
+    """
+
+    @staticmethod
+    def dumps(obj: Any, **kwargs: Any) -> str:
+        try:
+            return dumps(obj)
+        except TypeError:
+            # orjson.JSONEncodeError subclasses TypeError
+            return json.dumps(obj, **kwargs)
+
+    loads = staticmethod(loads)
@@ -0,0 +1,60 @@
+"""
+Incremental JSON helpers for streamed model output
+Yields the items of a JSON array while the surrounding document is still arriving
+"""
+
+import json
+import re
+from typing import Any, List, Optional
+
+_WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+
+
+class JSONArrayStreamParser:
+    """
+    Extract the items of the array stored under ``key`` from JSON text fed in pieces.
+
+    Each call to :meth:`feed` returns the items that became complete with that
+    piece, so callers can process objects while the rest of the response is
+    still streaming. The full text received so far is kept in ``text``.
+    """
+
+    def __init__(self, key: str):
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = json.JSONDecoder()
+        self._pos: Optional[int] = None  # Index just past the last consumed item
+        self.text = ''
+        self.done = False
+
+    def feed(self, piece: str) -> List[Any]:
+        """Append ``piece`` and return the array items completed by it."""
+        self.text += piece
+        if self.done:
+            return []
+
+        if self._pos is None:
+            match = self._key_re.search(self.text)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        items = []
+        while True:
+            pos = _WHITESPACE_AND_COMMAS.match(self.text, self._pos).end()
+            if pos >= len(self.text):
+                break
+            if self.text[pos] == ']':
+                self.done = True
+                break
+            try:
+                item, end = self._decoder.raw_decode(self.text, pos)
+            except json.JSONDecodeError:
+                # The item is still incomplete; wait for more text
+                break
+            if end >= len(self.text) and not isinstance(item, (dict, list, str)):
+                # A bare number or literal may continue in the next piece
+                break
+            items.append(item)
+            self._pos = end
+
+        return items
@@ -1,7 +1,11 @@
 import logging
+import os
 import time
 from typing import Dict, Any
 
+# Tracebacks are attached to error records only when someone will read them
+_DEVELOPMENT = os.environ.get('FLASK_ENV') == 'development'
+
 class SmartLogger:
     def __init__(self, name: str, level: str = 'INFO'):
         self.logger = logging.getLogger(name)
@@ -39,12 +43,16 @@ class SmartLogger:
         if self.should_log('auth'):
             self.logger.info(f"Auth: {action} for user {user_id}")
     
-    def log_error(self, message: str, error: Exception = None):
-        """Always log errors."""
+    def log_error(self, message: str, error: Exception = None, details: Dict[str, Any] = None):
+        """Always log errors, as a single record including any context details."""
         if error:
-            self.logger.error(f"Error: {message} - {str(error)}")
-        else:
-            self.logger.error(f"Error: {message}")
+            message = f"{message} - {str(error)}"
+        if details:
+            message = f"{message} | {details}"
+        # The traceback is formatted lazily by the handler, and only requested
+        # at DEBUG level or in development
+        exc_info = error if error and (_DEVELOPMENT or self.logger.isEnabledFor(logging.DEBUG)) else None
+        self.logger.error(f"Error: {message}", exc_info=exc_info)
     
     def log_info(self, message: str):
         """Log info with rate limiting."""
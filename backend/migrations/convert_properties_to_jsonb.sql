@@ -0,0 +1,11 @@
+-- Migration: Convert canvas_objects.properties from TEXT to JSONB
+-- Properties are stored as native JSON so the driver handles encoding and decoding
+
+-- Convert existing JSON strings in place
+ALTER TABLE canvas_objects ALTER COLUMN properties TYPE JSONB USING properties::jsonb;
+
+-- Log the migration
+DO $$
+BEGIN
+    RAISE NOTICE 'canvas_objects.properties converted to JSONB successfully';
+END $$;
@@ -16,6 +16,30 @@ def app():
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture(autouse=True)
+def reset_openai_client():
+    """Build fresh shared OpenAI clients and AI services per test so mocks don't leak."""
+    from app.services.openai_client_factory import OpenAIClientFactory
+    from app.services.ai_agent_service import get_ai_agent_service
+    OpenAIClientFactory.clear_shared_client()
+    get_ai_agent_service.cache_clear()
+    yield
+    OpenAIClientFactory.clear_shared_client()
+    get_ai_agent_service.cache_clear()
+
+@pytest.fixture
+def openai_stream():
+    """Build fake streamed chat completions that deliver ``text`` in pieces."""
+    from unittest.mock import MagicMock
+
+    def build(text, size=16):
+        for i in range(0, len(text), size):
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = text[i:i + size]
+            yield chunk
+
+    return build
+
 @pytest.fixture(scope='function')
 def client(app):
     """Create test client."""
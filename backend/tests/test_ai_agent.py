@@ -10,7 +10,7 @@ from app.models.canvas_object import CanvasObject
 class TestAIAgentService:
     """Test cases for AIAgentService."""
     
-    def test_create_canvas_from_query_success(self, app, db, sample_user):
+    def test_create_canvas_from_query_success(self, app, db, sample_user, openai_stream):
         """Test successful canvas creation from AI query."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -33,7 +33,7 @@ class TestAIAgentService:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_response))
                 
                 result = ai_service.create_canvas_from_query(
                     query="Create a test canvas",
@@ -46,7 +46,7 @@ class TestAIAgentService:
                 assert result['canvas_id'] is not None
                 assert result['title'] == "Test Canvas"
     
-    def test_create_canvas_with_existing_canvas(self, app, db, sample_user, sample_canvas):
+    def test_create_canvas_with_existing_canvas(self, app, db, sample_user, sample_canvas, openai_stream):
         """Test adding AI objects to existing canvas."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -68,7 +68,7 @@ class TestAIAgentService:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_response))
                 
                 result = ai_service.create_canvas_from_query(
                     query="Add a circle to the canvas",
@@ -161,18 +161,6 @@ class TestAIAgentService:
         assert cleaned['text'] == 'Test Label'
         assert cleaned['fontSize'] == 16
     
-    def test_get_style_guidance(self):
-        """Test style guidance generation."""
-        ai_service = AIAgentService()
-        
-        guidance = ai_service._get_style_guidance('modern', 'pastel')
-        assert 'modern' in guidance.lower()
-        assert 'pastel' in guidance.lower()
-        
-        guidance = ai_service._get_style_guidance('corporate', 'monochrome')
-        assert 'corporate' in guidance.lower()
-        assert 'monochrome' in guidance.lower()
-    
     def test_parse_ai_response_to_objects(self):
         """Test parsing AI response into objects."""
         ai_service = AIAgentService()
@@ -0,0 +1,77 @@
+import pytest
+from app.services.ai_agent_fallback import FallbackAIAgentService
+
+
+class TestFallbackAIAgentService:
+    """Test cases for FallbackAIAgentService template selection."""
+
+    @pytest.fixture
+    def fallback_service(self):
+        return FallbackAIAgentService()
+
+    @pytest.mark.parametrize('query, expected_text', [
+        ('Create a login workflow', 'Start'),
+        ('Brainstorm IDEAS for a party', 'Central Topic'),
+        ('Landing page mockup', 'Header'),
+        ('Quarterly analytics', 'Chart Area'),
+        ('Team schedule', 'Calendar Grid'),
+    ])
+    def test_keyword_selects_template(self, fallback_service, query, expected_text):
+        """Test that each keyword family selects its template."""
+        objects = fallback_service._generate_fallback_objects(query, 'modern', 'default')
+
+        assert objects[0]['properties']['text'] == expected_text
+
+    def test_category_priority_follows_declaration_order(self, fallback_service):
+        """Test that earlier categories win when several keywords match."""
+        objects = fallback_service._generate_fallback_objects(
+            'Design a flowchart for the data pipeline', 'modern', 'default'
+        )
+
+        assert objects[0]['properties']['text'] == 'Start'
+
+    def test_unmatched_query_uses_generic_template(self, fallback_service):
+        """Test that queries without keywords fall through to the generic template."""
+        objects = fallback_service._generate_fallback_objects('A sunny beach', 'modern', 'default')
+
+        assert objects[0]['properties']['text'] == 'Main Object'
+        assert objects[1]['properties']['text'] == 'Canvas for: A sunny beach...'
+
+    def test_cached_templates_are_not_mutated_by_callers(self, fallback_service):
+        """Test that mutating returned objects does not leak into later calls."""
+        first = fallback_service._generate_fallback_objects('workflow', 'modern', 'pastel')
+        first[0]['x'] = 999
+        first[0]['properties']['text'] = 'Changed'
+
+        second = fallback_service._generate_fallback_objects('workflow', 'modern', 'pastel')
+
+        assert second[0]['x'] == 200
+        assert second[0]['properties']['text'] == 'Start'
+        assert second[0]['properties']['fill'] == '#A8E6CF'
+
+    def test_create_canvas_persists_canvas_and_objects(self, app, fallback_service):
+        """Test that a new canvas and its template objects are saved together."""
+        from app.extensions import db
+        from app.models import User, Canvas, CanvasObject
+
+        with app.app_context():
+            db.session.add(User(id='fallback-user-id', email='fallback@example.com', name='Fallback User'))
+            db.session.commit()
+
+            result = fallback_service.create_canvas_from_query('Team workflow', 'fallback-user-id')
+
+            canvas = Canvas.query.get(result['canvas_id'])
+            assert canvas.owner_id == 'fallback-user-id'
+            assert CanvasObject.query.filter_by(canvas_id=canvas.id).count() == len(result['objects'])
+            assert result['objects'][0]['properties']['text'] == 'Start'
+
+    @pytest.mark.parametrize('query, user_id, message', [
+        ('', 'user', 'Query cannot be empty'),
+        ('   ', 'user', 'Query cannot be empty'),
+        ('workflow', '', 'User ID cannot be empty'),
+        ('workflow', ' \t', 'User ID cannot be empty'),
+    ])
+    def test_create_canvas_rejects_blank_input(self, fallback_service, query, user_id, message):
+        """Test that blank queries and user IDs are rejected before any work is done."""
+        with pytest.raises(ValueError, match=message):
+            fallback_service.create_canvas_from_query(query, user_id)
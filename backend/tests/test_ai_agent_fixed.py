@@ -46,7 +46,10 @@ class TestAIAgentService:
             }
             
             with patch.object(ai_service, '_generate_ai_response') as mock_generate:
-                mock_generate.return_value = json.dumps(mock_response)
+                mock_generate.return_value = {
+                    'title': mock_response['title'],
+                    'objects': [ai_service._clean_object(obj) for obj in mock_response['objects']]
+                }
                 
                 result = ai_service.create_canvas_from_query(
                     query="Create a test canvas",
@@ -79,7 +82,10 @@ class TestAIAgentService:
             }
             
             with patch.object(ai_service, '_generate_ai_response') as mock_generate:
-                mock_generate.return_value = json.dumps(mock_response)
+                mock_generate.return_value = {
+                    'title': mock_response['title'],
+                    'objects': [ai_service._clean_object(obj) for obj in mock_response['objects']]
+                }
                 
                 result = ai_service.create_canvas_from_query(
                     query="Add a circle to the canvas",
@@ -145,6 +151,17 @@ class TestAIAgentService:
         
         assert ai_service._validate_object(invalid_object) is False
 
+    @pytest.mark.parametrize('invalid_object', [
+        {"type": "circle", "x": 100, "y": 100, "radius": 40, "fill": "blue"},
+        {"type": "arrow", "x": 100, "y": 100, "points": [0, 0, 150]},
+        {"type": "text", "x": 100, "y": 100, "text": 42},
+    ])
+    def test_validate_object_enforces_response_schema(self, setup_openai_mock, invalid_object):
+        """Test that validation applies the same schema sent in response_format."""
+        ai_service = AIAgentService()
+
+        assert ai_service._validate_object(invalid_object) is False
+
     def test_clean_object(self, setup_openai_mock):
         """Test object cleaning and standardization."""
         ai_service = AIAgentService()
@@ -171,19 +188,52 @@ class TestAIAgentService:
         assert cleaned['text'] == 'Test Label'
         assert cleaned['fontSize'] == 14
 
-    def test_get_style_guidance(self, setup_openai_mock):
-        """Test style guidance generation."""
+    def test_system_prompt_is_identical_across_requests(self, setup_openai_mock, openai_stream):
+        """Test that only the user message varies so the prompt prefix can be cached."""
         ai_service = AIAgentService()
-        
-        # Test modern style
-        guidance = ai_service._get_style_guidance("modern", "pastel")
-        assert "modern" in guidance.lower()
-        assert "pastel" in guidance.lower()
-        
-        # Test corporate style
-        guidance = ai_service._get_style_guidance("corporate", "default")
-        assert "corporate" in guidance.lower()
-        assert "professional" in guidance.lower()
+        create = ai_service.openai_client.chat.completions.create
+        create.side_effect = lambda **kwargs: openai_stream('{"title": "Flow", "objects": []}')
+
+        ai_service._generate_ai_response("Login flow", "modern", "pastel")
+        ai_service._generate_ai_response("Org chart", "corporate", "default")
+
+        first, second = (call.kwargs['messages'] for call in create.call_args_list)
+        assert first[0] is second[0]
+        assert "Login flow" not in first[0]['content']
+        assert first[1]['content'] == 'Query: "Login flow"\nStyle: modern\nColors: pastel'
+
+    def test_default_system_prompt_is_compact(self, setup_openai_mock):
+        """Test that the default prompt stays near 1100 tokens and still covers every option."""
+        from app.services import ai_agent_service as module
+
+        prompt = module._CACHED_SYSTEM_PROMPT
+
+        # Roughly four characters per token for English prose
+        assert len(prompt) <= 4400
+        for name in [*module._TYPE_RULES, *module._STYLE_GUIDES, *module._COLOR_GUIDES]:
+            assert name in prompt
+
+    def test_completion_budget_is_capped(self, setup_openai_mock, openai_stream):
+        """Test that completions use the fast model and a token budget sized to the object cap."""
+        from app.services import ai_agent_service as module
+        ai_service = AIAgentService()
+        create = ai_service.openai_client.chat.completions.create
+        create.side_effect = lambda **kwargs: openai_stream('{"title": "Flow", "objects": []}')
+
+        ai_service._generate_ai_response("Login flow", "modern", "pastel")
+
+        kwargs = create.call_args.kwargs
+        assert kwargs['model'] == module._MODELS['fast']
+        assert kwargs['max_tokens'] == module._MAX_OBJECTS * module._MAX_OBJ_TOKENS + 80
+        assert kwargs['response_format']['json_schema']['schema']['properties']['objects']['maxItems'] == module._MAX_OBJECTS
+
+    def test_unknown_quality_is_rejected(self, app, setup_openai_mock):
+        """Test that only the fast and high quality tiers are accepted."""
+        with app.app_context():
+            ai_service = AIAgentService()
+
+            with pytest.raises(ValueError, match="Quality must be"):
+                ai_service.create_canvas_from_query("Login flow", "user-id", quality="ultra")
 
     def test_parse_ai_response_to_objects(self, setup_openai_mock):
         """Test parsing AI response into objects."""
@@ -211,6 +261,24 @@ class TestAIAgentService:
         assert len(result['objects']) == 1
         assert result['objects'][0]['type'] == 'rectangle'
 
+    def test_parse_ai_response_drops_invalid_objects(self, setup_openai_mock):
+        """Test that invalid objects are skipped and valid ones cleaned in the same pass."""
+        ai_service = AIAgentService()
+
+        result = ai_service._parse_ai_response_to_objects(json.dumps({
+            "title": "Mixed",
+            "objects": [
+                "not an object",
+                {"type": "circle", "x": 100, "y": 100},
+                {"type": "circle", "x": 100, "y": 100, "radius": 40}
+            ]
+        }))
+
+        assert result['objects'] == [{
+            'type': 'circle', 'x': 100.0, 'y': 100.0, 'radius': 40.0,
+            'fill': '#E8F4FF', 'stroke': '#2563EB', 'strokeWidth': 2.0
+        }]
+
     def test_parse_ai_response_invalid_json(self, setup_openai_mock):
         """Test parsing invalid AI response."""
         ai_service = AIAgentService()
@@ -232,6 +300,249 @@ class TestAIAgentService:
         with pytest.raises(ValueError, match="Invalid AI response structure"):
             ai_service._parse_ai_response_to_objects(ai_response)
 
+    def test_save_objects_to_canvas_bulk_inserts_rows(self, app, setup_openai_mock):
+        """Test that saved objects are persisted and returned in to_dict form."""
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='bulk-user-id', email='bulk@example.com', name='Bulk User'))
+            canvas = Canvas(id='bulk-canvas-id', title='Bulk Canvas', owner_id='bulk-user-id')
+            db.session.add(canvas)
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            saved = ai_service._save_objects_to_canvas(
+                [{'type': 'rectangle', 'x': 10, 'y': 20}, {'type': 'text', 'text': 'Hi'}],
+                canvas.id,
+                'bulk-user-id'
+            )
+
+            stored = {obj.id: obj.to_dict() for obj in CanvasObject.query.filter_by(canvas_id=canvas.id)}
+            assert {obj['id'] for obj in saved} == set(stored)
+            assert saved[0].keys() == stored[saved[0]['id']].keys()
+            assert stored[saved[1]['id']]['properties'] == {'text': 'Hi'}
+
+    def test_failed_object_insert_leaves_no_canvas(self, app, setup_openai_mock):
+        """Test that the new canvas is rolled back when its objects cannot be saved."""
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='rollback-user-id', email='rollback@example.com', name='Rollback User'))
+            db.session.commit()
+
+            from app.services import ai_agent_service as module
+            execute = db.session.execute
+
+            def failing_insert(statement, *args, **kwargs):
+                if statement is module._INSERT_CANVAS_OBJECT:
+                    raise RuntimeError('insert failed')
+                return execute(statement, *args, **kwargs)
+
+            ai_service = AIAgentService()
+            with patch.object(db.session, 'execute', side_effect=failing_insert):
+                with pytest.raises(RuntimeError, match="insert failed"):
+                    ai_service.create_canvas_from_query("Create a flowchart", 'rollback-user-id')
+
+            assert Canvas.query.filter_by(owner_id='rollback-user-id').count() == 0
+
+    def test_shared_service_creates_a_canvas_per_request(self, app, setup_openai_mock):
+        """Test that the shared service instance does not replay earlier results."""
+        from app.extensions import db
+        from app.services.ai_agent_service import get_ai_agent_service
+
+        with app.app_context():
+            db.session.add(User(id='shared-user-id', email='shared@example.com', name='Shared User'))
+            db.session.commit()
+
+            ai_service = get_ai_agent_service()
+            first = ai_service.create_canvas_from_query("Create a flowchart", 'shared-user-id')
+            second = get_ai_agent_service().create_canvas_from_query("Create a flowchart", 'shared-user-id')
+
+            assert get_ai_agent_service() is ai_service
+            assert first['canvas_id'] != second['canvas_id']
+            assert Canvas.query.filter_by(owner_id='shared-user-id').count() == 2
+
+    def test_generation_runs_while_prompt_is_recorded(self, app, setup_openai_mock):
+        """Test that OpenAI work runs on a worker thread and its objects are saved."""
+        import threading
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='overlap-user-id', email='overlap@example.com', name='Overlap User'))
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            worker_threads = []
+
+            def find_or_generate(*args):
+                worker_threads.append(threading.current_thread())
+                return {'title': 'Overlap', 'objects': [{'type': 'rectangle', 'x': 10, 'y': 20}]}
+
+            with patch.object(ai_service, '_find_or_generate_objects', side_effect=find_or_generate):
+                result = ai_service.create_canvas_from_query("Sketch my garden plan", 'overlap-user-id')
+
+            assert worker_threads and worker_threads[0] is not threading.current_thread()
+            assert CanvasObject.query.filter_by(canvas_id=result['canvas_id']).count() == 1
+
+    def test_started_event_is_only_sent_for_pending_generation(self, app, setup_openai_mock):
+        """Test that pattern hits emit a single completed event."""
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='events-user-id', email='events@example.com', name='Events User'))
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            generated = {'title': 'Garden', 'objects': [{'type': 'rectangle', 'x': 10, 'y': 20}]}
+
+            with patch('app.services.ai_agent_service.socketio') as mock_socketio, \
+                    patch.object(ai_service, '_find_or_generate_objects', return_value=generated):
+                ai_service.create_canvas_from_query("Create a flowchart", 'events-user-id')
+                pattern_events = [c.args[0] for c in mock_socketio.emit.call_args_list]
+                mock_socketio.emit.reset_mock()
+                ai_service.create_canvas_from_query("Sketch my garden plan", 'events-user-id')
+                generated_events = [c.args[0] for c in mock_socketio.emit.call_args_list]
+
+            assert pattern_events == ['ai_generation_completed']
+            assert generated_events == ['ai_generation_started', 'ai_generation_completed']
+
+    def test_existing_canvas_is_linked_to_prompt_and_owner_checked(self, app, setup_openai_mock):
+        """Test that an owned canvas gets the prompt link and a foreign one is refused."""
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='existing-owner-id', email='existing-owner@example.com', name='Owner'))
+            db.session.add(User(id='existing-other-id', email='existing-other@example.com', name='Other'))
+            db.session.add(Canvas(id='existing-canvas-id', title='Existing', owner_id='existing-owner-id'))
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            result = ai_service.create_canvas_from_query(
+                "Create a flowchart", 'existing-owner-id', canvas_id='existing-canvas-id'
+            )
+
+            canvas = db.session.get(Canvas, 'existing-canvas-id')
+            assert result['canvas_id'] == 'existing-canvas-id'
+            assert canvas.prompt_id is not None
+            assert CanvasObject.query.filter_by(canvas_id='existing-canvas-id').count() == len(result['objects'])
+
+            with pytest.raises(ValueError, match="access denied"):
+                ai_service.create_canvas_from_query(
+                    "Create a flowchart", 'existing-other-id', canvas_id='existing-canvas-id'
+                )
+
+    def test_prompt_is_created_processing_and_completed_in_one_update(self, app, setup_openai_mock):
+        """Test that the prompt record needs a single status update over the request."""
+        from app.extensions import db
+        from app.models.prompt import Prompt
+
+        with app.app_context():
+            db.session.add(User(id='prompt-user-id', email='prompt@example.com', name='Prompt User'))
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            with patch.object(ai_service.prompt_service, 'update_prompt_status',
+                              wraps=ai_service.prompt_service.update_prompt_status) as update_status:
+                result = ai_service.create_canvas_from_query("Create a flowchart", 'prompt-user-id')
+
+            prompt = Prompt.query.filter_by(user_id='prompt-user-id').one()
+            assert [c.args[1] for c in update_status.call_args_list] == ['completed']
+            assert prompt.status == 'completed'
+            assert prompt.get_metadata()['object_count'] == len(result['objects'])
+            assert prompt.get_metadata()['start_time']
+
+    def test_streamed_objects_are_emitted_from_request_thread(self, app, setup_openai_mock):
+        """Test that objects streamed on the executor are emitted while the request thread waits."""
+        import threading
+        from app.extensions import db
+
+        with app.app_context():
+            db.session.add(User(id='stream-user-id', email='stream@example.com', name='Stream User'))
+            db.session.commit()
+
+            ai_service = AIAgentService()
+            emit_threads = []
+            objects = [{'type': 'rectangle', 'x': 10, 'y': 20}, {'type': 'circle', 'x': 30, 'y': 40}]
+
+            def find_or_generate(*args):
+                on_object = args[-1]
+                for obj in objects:
+                    on_object(obj)
+                return {'title': 'Stream', 'objects': objects}
+
+            with patch('app.services.ai_agent_service.socketio') as mock_socketio, \
+                    patch.object(ai_service, '_find_or_generate_objects', side_effect=find_or_generate):
+                mock_socketio.emit.side_effect = lambda event, payload, **kwargs: emit_threads.append(
+                    (event, payload, threading.current_thread())
+                )
+                result = ai_service.create_canvas_from_query("Sketch my garden plan", 'stream-user-id')
+
+            streamed = [(payload, thread) for event, payload, thread in emit_threads if event == 'ai_object_streamed']
+            assert [thread for _, thread in streamed] == [threading.current_thread()] * 2
+            assert [payload['index'] for payload, _ in streamed] == [0, 1]
+            # Saved objects keep the ids they were streamed with
+            assert [payload['object_id'] for payload, _ in streamed] == [obj['id'] for obj in result['objects']]
+            assert [event for event, _, _ in emit_threads][-1] == 'ai_generation_completed'
+
+    def test_objects_are_delivered_while_response_streams(self, setup_openai_mock, openai_stream):
+        """Test that each valid object is handed over before the stream has finished."""
+        ai_service = AIAgentService()
+        response = json.dumps({'title': 'Garden', 'objects': [
+            {'type': 'circle', 'x': 10, 'y': 20, 'radius': 30},
+            {'type': 'circle', 'x': 10, 'y': 20},
+            {'type': 'text', 'x': 50, 'y': 60, 'text': 'Roses'}
+        ]})
+        chunks_read = []
+
+        def chunks(**kwargs):
+            for chunk in openai_stream(response):
+                chunks_read.append(chunk)
+                yield chunk
+
+        ai_service.openai_client.chat.completions.create.side_effect = chunks
+        delivered = []
+
+        objects_data = ai_service._generate_ai_response(
+            "Garden", "modern", "default", on_object=lambda obj: delivered.append((obj, len(chunks_read)))
+        )
+
+        assert ai_service.openai_client.chat.completions.create.call_args.kwargs['stream'] is True
+        assert [obj['type'] for obj, _ in delivered] == ['circle', 'text']
+        assert delivered[0][1] < len(chunks_read)
+        # The delivered objects are the result; the response is not parsed again
+        assert objects_data == {'title': 'Garden', 'objects': [obj for obj, _ in delivered]}
+
+    def test_response_without_objects_array_is_parsed_whole(self, setup_openai_mock, openai_stream):
+        """Test that a response the stream parser cannot follow falls back to a full parse."""
+        ai_service = AIAgentService()
+        # Valid JSON whose escaped key the stream parser never matches
+        response = '{"title": "Garden", "obj\\u0065cts": [{"type": "text", "x": 50, "y": 60, "text": "Roses"}]}'
+        ai_service.openai_client.chat.completions.create.side_effect = lambda **kwargs: openai_stream(response)
+
+        objects_data = ai_service._generate_ai_response("Garden", "modern", "default")
+
+        assert objects_data['title'] == 'Garden'
+        assert [obj['type'] for obj in objects_data['objects']] == ['text']
+
+    def test_truncated_response_fails(self, setup_openai_mock, openai_stream):
+        """Test that a completion cut off at the token limit fails instead of returning partial objects."""
+        ai_service = AIAgentService()
+        response = '{"title": "Garden", "objects": [{"type": "circle", "x": 10, "y": 20, "radius": 30}, {"type": "te'
+
+        def chunks(**kwargs):
+            yield from openai_stream(response)
+            last = MagicMock()
+            last.choices[0].delta.content = None
+            last.choices[0].finish_reason = 'length'
+            yield last
+
+        ai_service.openai_client.chat.completions.create.side_effect = chunks
+        delivered = []
+
+        with pytest.raises(ValueError):
+            ai_service._generate_ai_response("Garden", "modern", "default", on_object=delivered.append)
+        assert [obj['type'] for obj in delivered] == ['circle']
+
 
 class TestAIAgentAPI:
     """Test cases for AI Agent API endpoints."""
@@ -18,7 +18,7 @@ from app.services.auth_service import AuthService
 class TestAIAgentCanvasIntegration:
     """Test AI Agent integration with existing canvas functionality."""
     
-    def test_ai_objects_compatible_with_existing_canvas_objects(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_compatible_with_existing_canvas_objects(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects are compatible with existing canvas object structure."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -54,7 +54,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas
                 result = ai_service.create_canvas_from_query(
@@ -82,7 +82,7 @@ class TestAIAgentCanvasIntegration:
                     assert retrieved_obj is not None
                     assert retrieved_obj.object_type in ['rectangle', 'circle', 'text', 'heart', 'star', 'diamond', 'line', 'arrow']
     
-    def test_ai_objects_work_with_existing_socket_handlers(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_work_with_existing_socket_handlers(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects work with existing socket event handlers."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -107,7 +107,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas
                 result = ai_service.create_canvas_from_query(
@@ -137,7 +137,7 @@ class TestAIAgentCanvasIntegration:
                 assert 'type' in socket_data['object']
                 assert 'properties' in socket_data['object']
     
-    def test_ai_objects_work_with_existing_api_endpoints(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_work_with_existing_api_endpoints(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects work with existing REST API endpoints."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -163,7 +163,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas
                 result = ai_service.create_canvas_from_query(
@@ -192,7 +192,7 @@ class TestAIAgentCanvasIntegration:
                 assert 'created_at' in api_response
                 assert 'updated_at' in api_response
     
-    def test_ai_objects_work_with_existing_validation_schemas(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_work_with_existing_validation_schemas(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects pass existing validation schemas."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -237,7 +237,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas
                 result = ai_service.create_canvas_from_query(
@@ -271,7 +271,7 @@ class TestAIAgentCanvasIntegration:
                     assert 10 <= properties['width'] <= 500
                     assert 10 <= properties['height'] <= 500
     
-    def test_ai_objects_work_with_existing_permission_system(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_work_with_existing_permission_system(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects respect existing permission system."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -297,7 +297,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas
                 result = ai_service.create_canvas_from_query(
@@ -323,7 +323,7 @@ class TestAIAgentCanvasIntegration:
                 assert retrieved_obj is not None
                 assert retrieved_obj.created_by == sample_user.id
     
-    def test_ai_objects_work_with_existing_rate_limiting(self, app, session, sample_user, sample_canvas):
+    def test_ai_objects_work_with_existing_rate_limiting(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that AI-generated objects work with existing rate limiting system."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -348,7 +348,7 @@ class TestAIAgentCanvasIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_ai_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_ai_response))
                 
                 # Create AI canvas (this should respect rate limits)
                 result = ai_service.create_canvas_from_query(
@@ -0,0 +1,154 @@
+import pytest
+import json
+from unittest.mock import patch, MagicMock
+from app.services.ai_agent_robust import RobustAIAgentService
+
+
+class TestRobustAIAgentService:
+    """Test cases for RobustAIAgentService response parsing."""
+
+    @pytest.fixture
+    def robust_service(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_agent_robust._OPENAI_API_KEY', 'test-key')
+        monkeypatch.setattr('app.services.ai_agent_robust._breaker', {'failures': 0, 'opened_at': 0.0})
+        with patch('app.services.ai_agent_robust.OpenAIClientFactory.get_client', return_value=MagicMock()):
+            yield RobustAIAgentService()
+
+    def test_parse_reads_objects_from_json_mode_response(self, robust_service):
+        """Test that the objects list is read from the JSON-mode object."""
+        response = '{"objects": [{"type": "circle", "properties": {"text": "Hi"}}]}'
+
+        objects = robust_service._parse_ai_response(response)
+
+        assert len(objects) == 1
+        assert objects[0]['type'] == 'circle'
+        assert objects[0]['properties'] == {'text': 'Hi'}
+
+    def test_generate_requests_json_mode(self, robust_service):
+        """Test that single-canvas completions are requested in JSON mode."""
+        create = robust_service.openai_client.chat.completions.create
+
+        robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+
+        assert create.call_args.kwargs['response_format'] == {'type': 'json_object'}
+
+    def test_generate_uses_configured_model_and_capped_budget(self, robust_service):
+        """Test that completions use the configured model and a budget sized to 8 objects."""
+        from app.services.ai_agent_robust import _OPENAI_MODEL, _MAX_TOKENS
+        create = robust_service.openai_client.chat.completions.create
+
+        robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+
+        assert create.call_args.kwargs['model'] == _OPENAI_MODEL
+        assert create.call_args.kwargs['max_tokens'] == _MAX_TOKENS < 1000
+
+    def test_prompt_prefix_is_identical_across_queries(self, robust_service):
+        """Test that only the trailing user message varies between requests."""
+        create = robust_service.openai_client.chat.completions.create
+
+        robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+        first = create.call_args.kwargs['messages']
+        robust_service._generate_ai_response('Sprint board', 'minimal', 'pastel')
+        second = create.call_args.kwargs['messages']
+
+        assert first[0] == second[0]
+        assert second[1]['content'] == 'Create a canvas for: "Sprint board"\nStyle:minimal Colors:pastel'
+
+    def test_parse_clamps_geometry(self, robust_service):
+        """Test that out-of-range coordinates and sizes are clamped."""
+        objects = robust_service._parse_ai_response(
+            '{"objects": [{"type": "rectangle", "x": -50, "y": 5000, "width": 5, "height": 900}]}'
+        )
+
+        assert objects[0]['x'] == 0
+        assert objects[0]['y'] == 1000
+        assert objects[0]['width'] == 20
+        assert objects[0]['height'] == 500
+
+    @pytest.mark.parametrize('response', [
+        'Sorry, I cannot help with that.',
+        '```json\n{"objects": []}\n```',
+        '[{"type": "circle"}]',
+    ])
+    def test_parse_non_json_mode_response_returns_fallback_objects(self, robust_service, response):
+        """Test that anything but a bare objects wrapper falls back to a list of default objects."""
+        objects = robust_service._parse_ai_response(response)
+
+        assert isinstance(objects, list)
+        assert objects[0]['properties']['text'] == 'Main Object'
+
+    def test_breaker_skips_api_after_repeated_failures(self, robust_service):
+        """Test that consecutive API failures open the circuit breaker."""
+        create = robust_service.openai_client.chat.completions.create
+        create.side_effect = TimeoutError('timed out')
+
+        for _ in range(3):
+            robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+        assert create.call_count == 3
+
+        response = robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+
+        assert create.call_count == 3
+        assert 'Main Object' in response
+
+    def test_breaker_resets_after_success(self, robust_service):
+        """Test that a successful call clears the failure count."""
+        create = robust_service.openai_client.chat.completions.create
+        create.side_effect = [TimeoutError('timed out')] * 2 + [MagicMock()] + [TimeoutError('timed out')] * 2
+
+        for _ in range(4):
+            robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+        robust_service._generate_ai_response('Team workflow', 'modern', 'default')
+
+        assert create.call_count == 5
+
+    def test_batch_response_is_split_per_query(self, robust_service):
+        """Test that one JSON-mode completion yields cleaned objects for each query."""
+        create = robust_service.openai_client.chat.completions.create
+        create.return_value.choices[0].message.content = json.dumps({
+            'canvases': [
+                [{'type': 'circle', 'x': -10, 'properties': {'text': 'One'}}],
+                [{'type': 'text', 'properties': {'text': 'Two'}}]
+            ]
+        })
+
+        objects_per_query = robust_service._generate_batch_ai_response(['first', 'second'], 'modern', 'default')
+
+        assert create.call_count == 1
+        assert create.call_args.kwargs['response_format'] == {'type': 'json_object'}
+        assert objects_per_query[0][0]['x'] == 0
+        assert objects_per_query[1][0]['properties']['text'] == 'Two'
+
+    def test_batch_mismatched_response_falls_back_per_query(self, robust_service):
+        """Test that a batch response with the wrong canvas count uses fallback objects."""
+        create = robust_service.openai_client.chat.completions.create
+        create.return_value.choices[0].message.content = json.dumps({'canvases': [[]]})
+
+        objects_per_query = robust_service._generate_batch_ai_response(['first', 'second'], 'modern', 'default')
+
+        assert len(objects_per_query) == 2
+        assert objects_per_query[1][1]['properties']['text'] == 'Canvas for: second...'
+
+    def test_create_canvases_from_queries_persists_each_canvas(self, app, robust_service):
+        """Test that batch creation saves one canvas with its objects per query."""
+        from app.extensions import db
+        from app.models import User, Canvas, CanvasObject
+
+        create = robust_service.openai_client.chat.completions.create
+        create.return_value.choices[0].message.content = json.dumps({
+            'canvases': [
+                [{'type': 'rectangle', 'properties': {'text': 'A'}}],
+                [{'type': 'circle', 'properties': {'text': 'B'}}, {'type': 'text', 'properties': {'text': 'C'}}]
+            ]
+        })
+
+        with app.app_context():
+            db.session.add(User(id='robust-user-id', email='robust@example.com', name='Robust User'))
+            db.session.commit()
+
+            results = robust_service.create_canvases_from_queries(['first', 'second'], 'robust-user-id')
+
+            assert [len(result['objects']) for result in results] == [1, 2]
+            for result in results:
+                assert Canvas.query.get(result['canvas_id']).owner_id == 'robust-user-id'
+                assert CanvasObject.query.filter_by(canvas_id=result['canvas_id']).count() == len(result['objects'])
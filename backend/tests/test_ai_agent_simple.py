@@ -0,0 +1,134 @@
+import pytest
+import json
+import threading
+from unittest.mock import patch, MagicMock
+from app.services.ai_agent_simple import SimpleAIAgentService
+
+
+def _stream(text, size=16):
+    """Build a fake streamed completion delivering ``text`` in pieces."""
+    for i in range(0, len(text), size):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = text[i:i + size]
+        yield chunk
+
+
+class TestSimpleAIAgentService:
+    """Test cases for SimpleAIAgentService canvas generation."""
+
+    @pytest.fixture
+    def simple_service(self, monkeypatch):
+        monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+        monkeypatch.setattr('app.extensions.cache_client', None)
+        with patch('app.services.ai_agent_simple.OpenAIClientFactory.create_client', return_value=MagicMock()):
+            yield SimpleAIAgentService()
+
+    def test_streamed_objects_are_saved_to_new_canvas(self, app, simple_service):
+        """Test that objects from a streamed completion are cleaned and persisted."""
+        from app.extensions import db
+        from app.models import User, Canvas, CanvasObject
+
+        response = json.dumps({
+            'title': 'Streamed Canvas',
+            'objects': [
+                {'object_type': 'rectangle', 'properties': {'x': '10', 'y': 20}},
+                {'properties': {'x': 0}},
+                {'object_type': 'text', 'properties': {'text': 'Hi'}}
+            ]
+        })
+        worker_threads = []
+
+        def create(**kwargs):
+            worker_threads.append(threading.current_thread())
+            return _stream(response)
+
+        simple_service.openai_client.chat.completions.create.side_effect = create
+
+        with app.app_context():
+            db.session.add(User(id='simple-user-id', email='simple@example.com', name='Simple User'))
+            db.session.commit()
+
+            result = simple_service.create_canvas_from_query('Streamed canvas test', 'simple-user-id')
+
+            assert result['title'] == 'Streamed Canvas'
+            assert [obj['properties'] for obj in result['objects']] == [{'x': 10.0, 'y': 20.0}, {'text': 'Hi'}]
+            assert Canvas.query.get(result['canvas_id']).owner_id == 'simple-user-id'
+            assert CanvasObject.query.filter_by(canvas_id=result['canvas_id']).count() == 2
+            assert worker_threads != [threading.current_thread()]
+
+    def test_near_duplicate_query_reuses_generated_objects(self, app, simple_service, monkeypatch):
+        """Test that a query embedding close to a generated one skips the completion."""
+        from app.extensions import db
+        from app.models import User, CanvasObject
+        from app.services import ai_performance_service
+
+        monkeypatch.setattr(ai_performance_service, '_semantic_cache', ai_performance_service.OrderedDict())
+        client = simple_service.openai_client
+        client.with_options.return_value.embeddings.create.side_effect = [
+            MagicMock(data=[MagicMock(embedding=[1.0, 0.0])]),
+            MagicMock(data=[MagicMock(embedding=[0.99, 0.05])])
+        ]
+        client.chat.completions.create.side_effect = lambda **kwargs: _stream(json.dumps({
+            'title': 'Landing Page',
+            'objects': [{'object_type': 'rectangle', 'properties': {'x': 10}}]
+        }))
+
+        with app.app_context():
+            db.session.add(User(id='semantic-user-id', email='semantic@example.com', name='Semantic User'))
+            db.session.commit()
+
+            first = simple_service.create_canvas_from_query('Landing page for a bakery', 'semantic-user-id')
+            second = simple_service.create_canvas_from_query('Bakery landing page', 'semantic-user-id')
+
+            assert client.chat.completions.create.call_count == 1
+            assert second['title'] == 'Landing Page'
+            assert second['objects'][0]['id'] != first['objects'][0]['id']
+            assert CanvasObject.query.filter_by(canvas_id=second['canvas_id']).count() == 1
+
+    def test_structure_comes_from_response_format(self, simple_service):
+        """Test that the schema is sent as response_format instead of being described in the prompt."""
+        create = simple_service.openai_client.chat.completions.create
+        create.return_value = _stream(json.dumps({'title': 'T', 'objects': []}))
+
+        simple_service._generate_objects('Login page', 'modern', 'default')
+
+        kwargs = create.call_args.kwargs
+        assert kwargs['response_format']['type'] == 'json_schema'
+        assert kwargs['stream'] is True
+        assert '{' not in kwargs['messages'][0]['content']
+
+    def test_generation_failure_leaves_no_canvas(self, app, simple_service):
+        """Test that the canvas prepared during generation is rolled back on failure."""
+        from app.extensions import db
+        from app.models import User, Canvas
+
+        simple_service.openai_client.chat.completions.create.side_effect = TimeoutError('timed out')
+
+        with app.app_context():
+            db.session.add(User(id='simple-failure-user-id', email='simple-failure@example.com', name='Simple Failure'))
+            db.session.commit()
+
+            with pytest.raises(TimeoutError):
+                simple_service.create_canvas_from_query('Failing canvas test', 'simple-failure-user-id')
+
+            assert Canvas.query.filter_by(owner_id='simple-failure-user-id').count() == 0
+
+    def test_generation_failure_is_logged_once_without_traceback(self, app, simple_service, caplog):
+        """Test that a failure produces one error record and skips the traceback below DEBUG."""
+        from app.extensions import db
+        from app.models import User
+
+        simple_service.openai_client.chat.completions.create.side_effect = TimeoutError('timed out')
+
+        with app.app_context():
+            db.session.add(User(id='simple-log-user-id', email='simple-log@example.com', name='Simple Log'))
+            db.session.commit()
+
+            with caplog.at_level('ERROR', logger='simple_ai_agent_service'):
+                with pytest.raises(TimeoutError):
+                    simple_service.create_canvas_from_query('Failing canvas test', 'simple-log-user-id')
+
+        failures = [record for record in caplog.records if 'canvas creation failed' in record.getMessage()]
+        assert len(failures) == 1
+        assert 'timed out' in failures[0].getMessage() and 'TimeoutError' in failures[0].getMessage()
+        assert failures[0].exc_info is None
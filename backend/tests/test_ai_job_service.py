@@ -0,0 +1,93 @@
+from app.services.ai_job_service import AIJobService
+
+
+class TestAIJobService:
+    """Test cases for claiming queued AI jobs."""
+
+    def test_get_next_jobs_claims_by_priority_and_marks_processing(self, app):
+        """Test that a batch is claimed highest priority first and not handed out twice."""
+        from app.models.ai_job import AIJob
+
+        with app.app_context():
+            # Other tests may leave queued jobs behind in the shared database
+            AIJob.query.delete()
+            service = AIJobService()
+            low = service.create_canvas_job('job-user-id', {'instructions': 'low'}, priority=0)
+            high = service.create_canvas_job('job-user-id', {'instructions': 'high'}, priority=5)
+            service.create_canvas_job('job-user-id', {'instructions': 'later'}, priority=0)
+
+            claimed = service.get_next_jobs(2)
+
+            assert [job.id for job in claimed] == [high, low]
+            assert all(job.status == 'processing' and job.started_at for job in claimed)
+            assert service.get_active_jobs_count() == 2
+            assert [job.request_data['instructions'] for job in service.get_next_jobs(2)] == ['later']
+            assert service.get_next_jobs(2) == []
+            assert AIJob.query.filter_by(status='queued').count() == 0
+
+    def test_queued_job_wakes_waiting_processor(self, app):
+        """Test that queuing a job ends the processor's wait before the poll interval."""
+        import threading
+        import time
+
+        service = AIJobService()
+
+        def queue_job():
+            with app.app_context():
+                service.create_canvas_job('job-user-id', {'instructions': 'wake'})
+
+        with app.app_context():
+            service.wait_for_queued_job(0)
+            timer = threading.Timer(0.05, queue_job)
+            timer.start()
+
+            started = time.monotonic()
+            service.wait_for_queued_job(5)
+            elapsed = time.monotonic() - started
+            # The test database is one connection shared by all threads; let the
+            # job's session close before later tests use it
+            timer.join()
+
+            assert elapsed < 1
+
+    def test_job_statistics_count_each_status(self, app):
+        """Test that statistics report per-status counts, the total and the success rate."""
+        from app.extensions import db
+        from app.models.ai_job import AIJob
+
+        with app.app_context():
+            AIJob.query.delete()
+            service = AIJobService()
+            for status in ['queued', 'completed', 'completed', 'completed', 'failed']:
+                db.session.add(AIJob(user_id='job-user-id', job_type='create_canvas', request_data={}, status=status))
+            db.session.commit()
+
+            stats = service.get_job_statistics()
+
+            assert stats == {
+                'total_jobs': 5,
+                'queued_jobs': 1,
+                'processing_jobs': 0,
+                'completed_jobs': 3,
+                'failed_jobs': 1,
+                'cancelled_jobs': 0,
+                'success_rate': 75.0
+            }
+
+    def test_cleanup_deletes_only_old_finished_jobs(self, app):
+        """Test that finished jobs past the cutoff are removed and everything else is kept."""
+        from datetime import datetime, timedelta
+        from app.extensions import db
+        from app.models.ai_job import AIJob
+
+        with app.app_context():
+            AIJob.query.delete()
+            old = datetime.utcnow() - timedelta(days=10)
+            for status, completed_at in [('completed', old), ('failed', old), ('completed', datetime.utcnow()), ('queued', None)]:
+                db.session.add(AIJob(user_id='job-user-id', job_type='create_canvas', request_data={},
+                                     status=status, completed_at=completed_at))
+            db.session.commit()
+
+            AIJobService().cleanup_old_jobs(days=7)
+
+            assert sorted(status for (status,) in db.session.query(AIJob.status)) == ['completed', 'queued']
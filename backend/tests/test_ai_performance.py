@@ -16,7 +16,7 @@ from app.models.canvas import Canvas
 class TestAIPerformanceOptimization:
     """Test AI Agent performance optimization features."""
     
-    def test_request_caching(self, app, session, sample_user, sample_canvas):
+    def test_request_caching(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that identical requests are cached for better performance."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -41,7 +41,7 @@ class TestAIPerformanceOptimization:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_response))
                 
                 # First request - should call OpenAI
                 start_time = time.time()
@@ -155,7 +155,7 @@ class TestAIPerformanceOptimization:
                     assert 'fontSize' in properties
                     assert 'fontFamily' in properties
     
-    def test_performance_metrics_tracking(self, app, session, sample_user, sample_canvas):
+    def test_performance_metrics_tracking(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that performance metrics are properly tracked."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -181,7 +181,7 @@ class TestAIPerformanceOptimization:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_response))
                 
                 # Make a request
                 result = ai_service.create_canvas_from_query(
@@ -247,6 +247,34 @@ class TestAIPerformanceOptimization:
             overlap = not (x1 + w1 <= x2 or x2 + w2 <= x1 or y1 + h1 <= y2 or y2 + h2 <= y1)
             assert not overlap, "Objects should not overlap after optimization"
     
+    def test_overlap_shifts_only_objects_sharing_rows(self):
+        """Test that overlapping objects are pushed right in placement order."""
+        performance_service = AIPerformanceService()
+        test_objects = [
+            {"type": "rectangle", "properties": {"x": 100, "y": 100, "width": 120, "height": 60}},
+            {"type": "rectangle", "properties": {"x": 100, "y": 100, "width": 120, "height": 60}},
+            {"type": "rectangle", "properties": {"x": 100, "y": 140, "width": 120, "height": 60}},
+            {"type": "rectangle", "properties": {"x": 100, "y": 400, "width": 120, "height": 60}},
+            {"type": "rectangle", "properties": {"x": 300, "y": 0, "width": 20, "height": 5000}}
+        ]
+        
+        optimized_objects = performance_service.optimize_objects_for_rendering(test_objects)
+        
+        assert [obj['properties']['x'] for obj in optimized_objects] == [100, 240, 380, 100, 520]
+
+    def test_response_time_uses_monotonic_clock(self):
+        """Test that the recorded response time is unaffected by wall-clock changes."""
+        performance_service = AIPerformanceService()
+        request = performance_service.optimize_request("Draw a house", "modern", "default")
+
+        with patch('time.time', return_value=0.0):
+            response_time = performance_service.record_response_time(
+                request['start_time'], request['cache_key'], {}
+            )
+
+        assert 0 <= response_time < 5
+        assert performance_service.performance_metrics['total_response_time'] == response_time
+
     def test_rate_limiting_optimization(self, app, session, sample_user, sample_canvas):
         """Test that rate limiting is optimized for better performance."""
         with app.app_context():
@@ -319,7 +347,7 @@ class TestAIPerformanceIntegration:
             
             assert '/api/ai-agent/performance' in routes
     
-    def test_performance_optimization_does_not_break_functionality(self, app, session, sample_user, sample_canvas):
+    def test_performance_optimization_does_not_break_functionality(self, app, session, sample_user, sample_canvas, openai_stream):
         """Test that performance optimizations don't break existing functionality."""
         with app.app_context():
             ai_service = AIAgentService()
@@ -344,7 +372,7 @@ class TestAIPerformanceIntegration:
             }
             
             with patch.object(ai_service.openai_client.chat.completions, 'create') as mock_create:
-                mock_create.return_value.choices[0].message.content = json.dumps(mock_response)
+                mock_create.side_effect = lambda **kwargs: openai_stream(json.dumps(mock_response))
                 
                 # Test that optimized service still works correctly
                 result = ai_service.create_canvas_from_query(
@@ -370,5 +398,193 @@ class TestAIPerformanceIntegration:
                     assert 'updated_at' in obj
 
 
+class TestSemanticCache:
+    """Test the semantic response cache shared across AIPerformanceService instances."""
+    
+    @pytest.fixture(autouse=True)
+    def clear_semantic_cache(self):
+        from app.services import ai_performance_service
+        ai_performance_service._semantic_cache.clear()
+        yield
+        ai_performance_service._semantic_cache.clear()
+    
+    @staticmethod
+    def _client_returning(embedding):
+        client = MagicMock()
+        client.with_options.return_value.embeddings.create.return_value.data = [MagicMock(embedding=embedding)]
+        return client
+    
+    def test_similar_query_hits_cache_across_instances(self):
+        """Test that a near-identical embedding reuses objects cached by another instance."""
+        objects_data = {'title': 'Login Flow', 'objects': [{'type': 'rectangle', 'x': 100, 'y': 100}]}
+        AIPerformanceService().cache_similar_objects([1.0, 0.0], 'modern', 'default', objects_data)
+        
+        service = AIPerformanceService()
+        embedding = service.embed_query(self._client_returning([0.99, 0.05]), 'login flow diagram')
+        cached = service.get_similar_objects(embedding, 'modern', 'default')
+        
+        assert cached == objects_data
+        assert cached is not objects_data
+    
+    def test_dissimilar_query_misses_cache(self):
+        """Test that embeddings beyond the distance threshold are not reused."""
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'modern', 'default', {'title': 'A', 'objects': []})
+        
+        assert service.get_similar_objects([0.0, 1.0], 'modern', 'default') is None
+    
+    def test_cache_requires_matching_style_and_colors(self):
+        """Test that hits only match the same visual spec."""
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'modern', 'default', {'title': 'A', 'objects': []})
+        
+        assert service.get_similar_objects([1.0, 0.0], 'corporate', 'default') is None
+    
+    def test_cache_requires_matching_model(self):
+        """Test that objects from one model are not reused for another."""
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'modern', 'default', {'title': 'A', 'objects': []}, 'gpt-4o-mini')
+        
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default', 'gpt-4') is None
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default', 'gpt-4o-mini') is not None
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'pastel') is None
+    
+    def test_cache_requires_matching_prompt_fingerprint(self):
+        """Test that objects shaped by one prompt are not reused by a service with another."""
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'modern', 'default', {'title': 'A', 'objects': []}, 'gpt-4o-mini', 'fp1')
+        
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default', 'gpt-4o-mini', 'fp2') is None
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default', 'gpt-4o-mini', 'fp1') is not None
+    
+    def test_bucket_evicts_least_recently_used(self, monkeypatch):
+        """Test that a lookup hit protects an entry from eviction in its bucket."""
+        from app.services import ai_performance_service
+        monkeypatch.setattr(ai_performance_service, '_SEMANTIC_BUCKET_SIZE', 2)
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'modern', 'default', {'title': 'A', 'objects': []})
+        service.cache_similar_objects([0.0, 1.0], 'modern', 'default', {'title': 'B', 'objects': []})
+        
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default')['title'] == 'A'
+        service.cache_similar_objects([0.6, 0.8], 'modern', 'default', {'title': 'C', 'objects': []})
+        
+        assert service.get_similar_objects([0.0, 1.0], 'modern', 'default') is None
+        assert service.get_similar_objects([1.0, 0.0], 'modern', 'default')['title'] == 'A'
+    
+    def test_other_specs_do_not_evict_a_bucket(self, monkeypatch):
+        """Test that filling one style's bucket leaves other styles' entries cached."""
+        from app.services import ai_performance_service
+        monkeypatch.setattr(ai_performance_service, '_SEMANTIC_BUCKET_SIZE', 1)
+        service = AIPerformanceService()
+        service.cache_similar_objects([1.0, 0.0], 'corporate', 'default', {'title': 'A', 'objects': []})
+        for i in range(3):
+            service.cache_similar_objects([0.0, 1.0], 'modern', 'default', {'title': str(i), 'objects': []})
+        
+        assert service.get_similar_objects([1.0, 0.0], 'corporate', 'default')['title'] == 'A'
+    
+    def test_embedding_failure_skips_cache(self):
+        """Test that embedding errors fail open instead of breaking generation."""
+        client = MagicMock()
+        client.with_options.return_value.embeddings.create.side_effect = TimeoutError('timed out')
+        
+        assert AIPerformanceService().embed_query(client, 'anything') is None
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
+
+
+class TestExactPromptCache:
+    """Test the exact-match prompt cache shared across AIPerformanceService instances."""
+    
+    @pytest.fixture(autouse=True)
+    def in_process_cache(self, monkeypatch):
+        from app.services import ai_performance_service
+        monkeypatch.setattr('app.extensions.cache_client', None)
+        ai_performance_service._exact_cache.clear()
+        yield
+        ai_performance_service._exact_cache.clear()
+    
+    def test_prompt_key_ignores_case_and_whitespace(self):
+        """Test that trivially different spellings of a prompt share a key."""
+        from app.services.ai_performance_service import prompt_key
+        
+        assert prompt_key('  Login \n Flow ', 'modern', 'default', 'gpt-4', 'fp') == prompt_key('login flow', 'modern', 'default', 'gpt-4', 'fp')
+        assert prompt_key('login flow', 'modern', 'default', 'gpt-4', 'fp') != prompt_key('login flow', 'modern', 'default', 'gpt-4o', 'fp')
+    
+    def test_prompt_key_ignores_trailing_punctuation_and_spelling_variants(self):
+        """Test that punctuation and alternate spellings of a diagram kind share a key."""
+        from app.services.ai_performance_service import prompt_key
+        
+        key = prompt_key('create a flowchart', 'modern', 'default', 'gpt-4', 'fp')
+        assert prompt_key('Create a flow chart!', 'modern', 'default', 'gpt-4', 'fp') == key
+        assert prompt_key('Create a Flow-Chart?', 'modern', 'default', 'gpt-4', 'fp') == key
+        assert prompt_key('create a chart', 'modern', 'default', 'gpt-4', 'fp') != key
+    
+    def test_prompt_key_depends_on_prompt_fingerprint(self):
+        """Test that objects generated under another prompt or schema are not reused."""
+        from app.services.ai_performance_service import prompt_fingerprint, prompt_key
+        from app.services import ai_agent_service, ai_agent_simple
+        
+        assert ai_agent_service._PROMPT_FINGERPRINT != ai_agent_simple._PROMPT_FINGERPRINT
+        assert prompt_fingerprint('prompt', {'type': 'json_object'}) != prompt_fingerprint('prompt')
+        assert prompt_key('login flow', 'modern', 'default', 'gpt-4o-mini', ai_agent_service._PROMPT_FINGERPRINT) != \
+            prompt_key('login flow', 'modern', 'default', 'gpt-4o-mini', ai_agent_simple._PROMPT_FINGERPRINT)
+    
+    def test_identical_request_hits_cache_across_instances(self):
+        """Test that objects cached by one instance are returned as a copy to another."""
+        objects_data = {'title': 'Login Flow', 'objects': [{'type': 'rectangle', 'x': 100, 'y': 100}]}
+        AIPerformanceService().cache_exact_objects('key', objects_data)
+        
+        cached = AIPerformanceService().get_exact_objects('key')
+        
+        assert cached == objects_data
+        assert cached is not objects_data
+    
+    def test_in_process_cache_evicts_least_recently_used(self, monkeypatch):
+        """Test that the in-process fallback stays bounded."""
+        monkeypatch.setattr('app.services.ai_performance_service._EXACT_CACHE_MAXSIZE', 2)
+        service = AIPerformanceService()
+        for key in ('a', 'b'):
+            service.cache_exact_objects(key, {'title': key, 'objects': []})
+        service.get_exact_objects('a')
+        service.cache_exact_objects('c', {'title': 'c', 'objects': []})
+        
+        assert service.get_exact_objects('b') is None
+        assert service.get_exact_objects('a')['title'] == 'a'
+    
+    def test_shared_cache_backend_is_used_when_configured(self, monkeypatch):
+        """Test that entries go to the configured cache client with a TTL."""
+        store = {}
+        cache_client = MagicMock()
+        cache_client.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value.encode())
+        cache_client.get.side_effect = store.get
+        monkeypatch.setattr('app.extensions.cache_client', cache_client)
+        
+        service = AIPerformanceService()
+        service.cache_exact_objects('key', {'title': 'A', 'objects': []})
+        
+        assert service.get_exact_objects('key') == {'title': 'A', 'objects': []}
+        assert cache_client.set.call_args.kwargs['ex'] == 7 * 24 * 3600
+        assert 'ai:canvas:key' in store
+
+
+class TestPatternMatching:
+    """Test keyword matching of queries against the common patterns."""
+    
+    @pytest.mark.parametrize('query, pattern', [
+        ('Draw our onboarding WORKFLOW', 'flowchart'),
+        ('Brainstorm a process for hiring', 'flowchart'),
+        ('Mind map of product ideas', 'mindmap'),
+        ('Landing page mockup', 'wireframe'),
+    ])
+    def test_query_matches_first_pattern_by_priority(self, query, pattern):
+        """Test that keywords match case-insensitively with flowchart > mindmap > wireframe priority."""
+        service = AIPerformanceService()
+        
+        assert service.get_pattern_for_query(query) == service.get_common_patterns()[pattern]
+    
+    @pytest.mark.parametrize('query', ['Zoo 123', 'A sunny beach scene'])
+    def test_query_without_keywords_returns_none(self, query):
+        """Test that queries without pattern keywords are not matched."""
+        assert AIPerformanceService().get_pattern_for_query(query) is None
@@ -0,0 +1,28 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils.cooperative import wait_for
+
+
+class TestWaitFor:
+    """Test cases for waiting on executor futures cooperatively."""
+
+    def test_returns_result_once_worker_finishes(self):
+        """Test that the caller keeps polling until the worker thread sets the result."""
+        release = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(lambda: release.wait(5) and 'done')
+            threading.Timer(0.05, release.set).start()
+
+            assert wait_for(future) == 'done'
+
+    def test_reraises_worker_exception(self):
+        """Test that an exception raised in the worker surfaces to the caller."""
+        def fail():
+            raise TimeoutError('timed out')
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with pytest.raises(TimeoutError):
+                wait_for(executor.submit(fail))
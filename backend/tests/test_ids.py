@@ -0,0 +1,32 @@
+import time
+import uuid
+from app.utils.ids import generate_uuid, generate_uuids
+
+
+class TestGenerateUUIDs:
+    """Test cases for batched UUID generation."""
+
+    def test_ids_are_canonical_uuid7_strings(self):
+        """Test that every id round-trips as a version 7, RFC 4122 UUID."""
+        ids = generate_uuids(50)
+
+        assert len(set(ids)) == 50
+        for value in ids:
+            parsed = uuid.UUID(value)
+            assert str(parsed) == value
+            assert parsed.version == 7
+            assert parsed.variant == uuid.RFC_4122
+
+    def test_ids_lead_with_creation_time(self):
+        """Test that ids embed the current millisecond and sort after earlier ones."""
+        before = time.time_ns() // 1_000_000
+        first = generate_uuid()
+        time.sleep(0.002)
+        second = generate_uuid()
+
+        assert before <= uuid.UUID(first).int >> 80 <= time.time_ns() // 1_000_000
+        assert first < second
+
+    def test_empty_batch(self):
+        """Test that a zero-sized batch yields no ids."""
+        assert generate_uuids(0) == []
@@ -0,0 +1,20 @@
+from socketio import packet
+from app.utils.json_codec import PacketJSON
+
+
+class TestPacketJSON:
+    """Test cases for the JSON module used to encode Socket.IO packets."""
+
+    def test_app_encodes_packets_with_packet_json(self, app):
+        """Test that the app's Socket.IO server encodes compactly and round-trips payloads."""
+        data = ['ai_generation_completed', {'canvas_id': 'c1', 'objects': [{'x': 1.5, 'text': 'é'}]}]
+
+        encoded = packet.Packet(packet.EVENT, data=data).encode()
+
+        assert packet.Packet.json is PacketJSON
+        assert ', ' not in encoded
+        assert packet.Packet(encoded_packet=encoded).data == data
+
+    def test_non_string_keys_fall_back_to_stdlib(self):
+        """Test that payloads orjson rejects are still encoded."""
+        assert PacketJSON.dumps({1: 'a'}, separators=(',', ':')) == '{"1":"a"}'
@@ -0,0 +1,42 @@
+import pytest
+import json
+from app.utils.json_stream import JSONArrayStreamParser
+
+
+class TestJSONArrayStreamParser:
+    """Test cases for incremental extraction of streamed array items."""
+
+    @staticmethod
+    def _feed_in_pieces(text, size):
+        parser = JSONArrayStreamParser('objects')
+        batches = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        return parser, batches
+
+    @pytest.mark.parametrize('size', [1, 5, 64])
+    def test_items_match_full_parse(self, size):
+        """Test that the streamed items equal the parsed array regardless of chunking."""
+        text = json.dumps({
+            'title': 'Flow',
+            'objects': [{'type': 'rectangle', 'label': 'a, [b] {c}'}, {'type': 'text', 'text': '"quoted"'}]
+        })
+
+        parser, batches = self._feed_in_pieces(text, size)
+
+        assert [item for batch in batches for item in batch] == json.loads(text)['objects']
+        assert parser.done
+        assert parser.text == text
+
+    def test_items_are_returned_before_the_document_ends(self):
+        """Test that an item is yielded as soon as its closing brace arrives."""
+        parser = JSONArrayStreamParser('objects')
+
+        assert parser.feed('{"objects": [{"type": "circle"') == []
+        assert parser.feed('}, {"type"') == [{'type': 'circle'}]
+        assert not parser.done
+
+    def test_missing_array_is_not_done(self):
+        """Test that a response without the key never reports completion."""
+        parser = JSONArrayStreamParser('objects')
+
+        assert parser.feed('{"title": "No objects here"}') == []
+        assert not parser.done
@@ -108,7 +108,7 @@ class TestCanvasObject:
         
         # Test set_properties
         canvas_object.set_properties({'x': 200, 'y': 200})
-        assert canvas_object.properties == '{"x": 200, "y": 200}'
+        assert canvas_object.properties == {'x': 200, 'y': 200}
 
 class TestCanvasPermission:
     """Test CanvasPermission model."""
@@ -0,0 +1,30 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.openai_client_factory import OpenAIClientFactory
+
+
+class TestOpenAIClientFactory:
+    """Test cases for the shared OpenAI client."""
+
+    def test_get_client_reuses_one_client_per_key(self):
+        """Test that repeated lookups share a client until the key changes."""
+        with patch.object(OpenAIClientFactory, 'create_client', side_effect=lambda key: MagicMock(name=key)) as create:
+            first = OpenAIClientFactory.get_client('key-a')
+
+            assert OpenAIClientFactory.get_client('key-a') is first
+            assert OpenAIClientFactory.get_client('key-b') is not first
+            assert create.call_count == 2
+
+    def test_failed_creation_is_retried(self):
+        """Test that a failed client creation is not cached."""
+        client = MagicMock()
+        with patch.object(OpenAIClientFactory, 'create_client', side_effect=[None, client]):
+            assert OpenAIClientFactory.get_client('key-a') is None
+            assert OpenAIClientFactory.get_client('key-a') is client
+
+    def test_get_client_requires_api_key(self, monkeypatch):
+        """Test that no client is built without an API key."""
+        monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+
+        assert OpenAIClientFactory.get_client() is None
+
@@ -117,6 +117,9 @@ const CanvasPage: React.FC = () => {
   
   // Stage ref for keyboard shortcuts
   const stageRef = useRef<any>(null)
+
+  // Ids of AI objects shown while their generation is still streaming, by request
+  const streamedAIObjectsRef = useRef<Map<string, string[]>>(new Map())
   
   // Mouse position for keyboard shortcuts
   const { getMousePosition } = useCanvasMousePosition(stageRef)
@@ -689,15 +692,39 @@ const CanvasPage: React.FC = () => {
     })
 
     // AI Generation events - WebSocket fallback for real-time updates
+    socketService.on('ai_object_streamed', (data: any) => {
+      // Show each object as it streams in; the completed event replaces it
+      if (data.canvas_id !== canvasId) return
+
+      const { type, ...properties } = data.object
+      const now = new Date().toISOString()
+      const streamedObject: CanvasObject = {
+        id: data.object_id,
+        canvas_id: data.canvas_id,
+        object_type: type,
+        properties,
+        z_index: 0,
+        created_by: user?.id || '',
+        created_at: now,
+        updated_at: now
+      }
+
+      const ids = streamedAIObjectsRef.current.get(data.request_id) || []
+      streamedAIObjectsRef.current.set(data.request_id, [...ids, data.object_id])
+      setObjects(prev => [...prev, streamedObject])
+    })
+
     socketService.on('ai_generation_completed', (data: any) => {
       console.log('AI Generation completed via WebSocket:', data);
+      streamedAIObjectsRef.current.delete(data.request_id)
 
       // Check if AI created objects on THIS canvas
       if (data.canvas_id === canvasId && data.objects && data.objects.length > 0) {
         console.log(`AI added ${data.objects.length} objects to current canvas via WebSocket`);
 
-        // Add objects to state
-        setObjects(prev => [...prev, ...data.objects]);
+        // Add objects to state, replacing the streamed copies (same ids, final positions)
+        const completedIds = new Set(data.objects.map((obj: CanvasObject) => obj.id))
+        setObjects(prev => [...prev.filter(obj => !completedIds.has(obj.id)), ...data.objects]);
 
         // Show success notification
         toast.success(`AI added ${data.objects.length} objects to canvas!`);
@@ -713,6 +740,13 @@ const CanvasPage: React.FC = () => {
     socketService.on('ai_generation_failed', (data: any) => {
       console.error('AI Generation failed via WebSocket:', data);
 
+      // Nothing was saved, so drop any objects streamed for this request
+      const streamedIds = streamedAIObjectsRef.current.get(data.request_id)
+      streamedAIObjectsRef.current.delete(data.request_id)
+      if (streamedIds) {
+        setObjects(prev => prev.filter(obj => !streamedIds.includes(obj.id)))
+      }
+
       // Only show error if it's for this canvas
       if (data.canvas_id === canvasId) {
         toast.error(`AI generation failed: ${data.error_message || 'Unknown error'}`);
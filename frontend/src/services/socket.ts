@@ -438,6 +438,10 @@ class SocketService {
       this.emit('ai_generation_started', data)
     })
 
+    this.socket.on('ai_object_streamed', (data) => {
+      this.emit('ai_object_streamed', data)
+    })
+
     this.socket.on('ai_generation_completed', (data) => {
       if (this.debugMode) {
         console.log('=== AI Generation Completed ===')